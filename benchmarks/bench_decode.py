@@ -0,0 +1,70 @@
+"""
+Benchmark: decode lại mỗi request (librosa.load) so với bản canonical của decoded cache
+
+Tạo một file MP3 (hoặc dùng --file), đo librosa.load mono ở sr gốc như các endpoint cũ,
+thời gian transcode một lần lúc ingest, rồi thời gian mở lại bản canonical (memmap) và
+đọc hết một lượt. Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_decode [--seconds 180] [--file path]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from src.audio_cache import DecodedAudioCache
+
+SR = 44100
+
+
+def _best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=180.0)
+    parser.add_argument("--file", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        root = Path(root)
+        audio = args.file
+        if audio is None:
+            rng = np.random.default_rng(0)
+            t = np.arange(int(args.seconds * SR)) / SR
+            y = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+            audio = root / "song.mp3"
+            sf.write(audio, np.stack([y, np.roll(y, 100)], axis=1).astype(np.float32), SR, format='MP3')
+        print(f"{audio.name}: {sf.info(str(audio)).duration:.0f}s")
+
+        base = _best_of(lambda: librosa.load(str(audio), sr=None, mono=True))
+        print(f"  {'librosa.load mono':<26} {base:7.3f}s")
+
+        cache = DecodedAudioCache(root / "cache", max_bytes=1 << 34)
+        t0 = time.perf_counter()
+        cache.frames(audio)
+        print(f"  {'transcode (ingest, 1 lần)':<26} {time.perf_counter() - t0:7.3f}s")
+        cache.load(audio, mono=True)
+
+        def read_all(mono):
+            y, _ = cache.load(audio, sr=None, mono=mono)
+            return float(np.asarray(y).sum())
+
+        for mono in (True, False):
+            elapsed = _best_of(lambda: read_all(mono))
+            label = "canonical " + ("mono" if mono else "stereo view")
+            print(f"  {label:<26} {elapsed:7.3f}s {base / elapsed:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: độ trễ tách nhạc mỗi track - Demucs cold (subprocess mỗi request) vs warm (worker thường trú)
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_demucs_worker uploads/a.mp3 uploads/b.mp3 [--repeat 2]
+
+Cần cài demucs (pip install demucs).
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from src.jobs import NULL_JOB
+from src.isolator import _separate_subprocess
+from src.separation_worker import SeparationWorker
+
+
+def bench_cold(files, repeat, work_dir):
+    timings = []
+    for _ in range(repeat):
+        for f in files:
+            out_dir = work_dir / f"cold_{uuid.uuid4().hex}"
+            t0 = time.perf_counter()
+            stems = _separate_subprocess(f, out_dir, NULL_JOB)
+            timings.append(time.perf_counter() - t0)
+            if not stems:
+                raise RuntimeError(f"Demucs subprocess failed on {f}")
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return timings
+
+
+def bench_warm(files, repeat, work_dir):
+    worker = SeparationWorker()
+    t0 = time.perf_counter()
+    worker.warm_up()
+    startup = time.perf_counter() - t0
+
+    timings = []
+    try:
+        for _ in range(repeat):
+            for f in files:
+                job_id = uuid.uuid4().hex
+                out_dir = work_dir / f"warm_{job_id}"
+                t0 = time.perf_counter()
+                worker.separate(f, out_dir, job_id)
+                timings.append(time.perf_counter() - t0)
+                shutil.rmtree(out_dir, ignore_errors=True)
+    finally:
+        worker.close()
+    return startup, timings
+
+
+def _summary(label, timings):
+    mean = sum(timings) / len(timings)
+    print(f"{label:<28} n={len(timings):<3} mean={mean:7.2f}s  min={min(timings):7.2f}s  max={max(timings):7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_demucs_"))
+    try:
+        cold = bench_cold(args.files, args.repeat, work_dir)
+        startup, warm = bench_warm(args.files, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("=" * 72)
+    _summary("cold (subprocess/track)", cold)
+    print(f"{'warm worker startup':<28} {startup:.2f}s (một lần, load model)")
+    _summary("warm (resident worker)", warm)
+    print(f"speedup per track: {sum(cold) / sum(warm):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
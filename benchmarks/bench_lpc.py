@@ -0,0 +1,111 @@
+"""
+Benchmark: engine LPC vector hoá (src/lpc.py) so với các vòng lặp Python gốc
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_lpc [--seconds 60] [--sr 44100]
+"""
+
+import argparse
+import time
+
+import librosa
+import numpy as np
+
+from src import lpc
+
+
+# --- Bản gốc (vòng lặp theo mẫu) để so sánh ---
+
+def loop_pre_emphasis(signal, alpha=0.9):
+    N = len(signal)
+    y = np.zeros((N,), np.float32)
+    for n in range(N):
+        if n == 0:
+            y[n] = signal[n] - alpha * signal[n]
+        else:
+            y[n] = signal[n] - alpha * signal[n-1]
+    return y
+
+
+def loop_hamming(signal):
+    N = len(signal)
+    w = np.zeros((N,), np.float32)
+    for n in range(N):
+        w[n] = 0.54 - 0.46 * np.cos(2 * np.pi * n / N)
+    return signal * w
+
+
+def loop_cepstrum(a, p, max_order=18):
+    c = np.zeros((max_order + 1,), dtype=np.float32)
+    m = 1
+    while m <= p:
+        c[m] = a[m]
+        k = 1
+        while k <= m - 1:
+            c[m] = c[m] + (k / m) * c[k] * a[m - k]
+            k = k + 1
+        m = m + 1
+    m = p + 1
+    while m <= max_order:
+        c[m] = 0.0
+        k = 1
+        while k <= m - 1:
+            temp = 0.0 if m - k > p else a[m - k]
+            c[m] = c[m] + (k / m) * c[k] * temp
+            k = k + 1
+        m = m + 1
+    return c
+
+
+def loop_trajectory(y, order=20, frame_length=1024, hop_length=512):
+    """Cách duy nhất để có trajectory với code cũ: gọi từng bước cho mỗi frame"""
+    out = []
+    for start in range(0, len(y) - frame_length + 1, hop_length):
+        z = loop_hamming(loop_pre_emphasis(y[start:start + frame_length], 0.7))
+        a = -librosa.lpc(z, order=order)
+        out.append(loop_cepstrum(a, order, 30))
+    return out
+
+
+def _time(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--sr", type=int, default=44100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.standard_normal(1024).astype(np.float32)
+    a = -librosa.lpc(frame, order=20)
+
+    print("Single frame (1024 samples, order 20)")
+    rows = [
+        ("pre-emphasis", lambda: loop_pre_emphasis(frame, 0.7), lambda: lpc.pre_emphasis(frame, 0.7)),
+        ("hamming window", lambda: loop_hamming(frame), lambda: frame * lpc.hamming_window(1024)),
+        ("LPC -> cepstrum", lambda: loop_cepstrum(a, 20, 30), lambda: lpc.lpc_to_cepstrum(a, 20, 30)),
+    ]
+    for name, old, new in rows:
+        t_old, t_new = _time(old, 20), _time(new, 20)
+        print(f"  {name:<18} loop {t_old * 1e3:8.3f} ms   vectorized {t_new * 1e3:8.3f} ms   x{t_old / t_new:7.1f}")
+
+    y = (0.3 * rng.standard_normal(int(args.sr * args.seconds))).astype(np.float32)
+    n_frames = len(lpc.frame_signal(y, 1024, 512))
+    print(f"\nFull trajectory ({args.seconds:.0f}s @ {args.sr}Hz, {n_frames} frames)")
+    # Vòng lặp cũ rất chậm: đo trên 1/10 số frame rồi ngoại suy
+    sub = y[:len(y) // 10]
+    t_old = _time(lambda: loop_trajectory(sub), 1) * 10
+    t_new = _time(lambda: lpc.lpc_trajectory(y, args.sr), 3)
+    print(f"  per-frame loops  {t_old:8.2f} s (ngoại suy)")
+    print(f"  batched engine   {t_new:8.3f} s   x{t_old / t_new:.0f}   ({args.seconds / t_new:.0f}x realtime)")
+
+
+if __name__ == "__main__":
+    main()
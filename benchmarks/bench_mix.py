@@ -0,0 +1,75 @@
+"""
+Benchmark: render mix tuần tự so với render song song từng track (src/effects.py)
+
+Tạo N stem tổng hợp (stereo, có pitch shift + filter + echo) rồi đo wall time của
+apply_audio_effects với workers=1 và workers=N. Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_mix [--seconds 30] [--max-tracks 5] [--workers 0]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from src.effects import apply_audio_effects
+
+SR = 44100
+
+
+def _write_stems(root, n_tracks, seconds):
+    rng = np.random.default_rng(0)
+    uploads = Path(root) / "uploads"
+    uploads.mkdir(exist_ok=True)
+    t = np.arange(int(seconds * SR)) / SR
+    for i in range(n_tracks):
+        y = 0.2 * np.sin(2 * np.pi * 110 * (i + 1) * t) + 0.05 * rng.standard_normal(len(t))
+        sf.write(uploads / f"stem{i}.wav", np.stack([y, np.roll(y, 100)], axis=1).astype(np.float32), SR,
+                 subtype='FLOAT')
+    return [{"url": f"/uploads/stem{i}.wav", "pitch": 2, "lpf": 6000, "echo": 0.3, "pan": (i % 3 - 1) * 0.5}
+            for i in range(n_tracks)]
+
+
+def _time(tracks, root, workers):
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        # Bỏ log "Effect: ..." của từng track
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            assert apply_audio_effects(tracks, Path(root) / f"mix_{workers}.wav", workers=workers)
+            return time.perf_counter() - t0
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--max-tracks", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=0, help="0 = bằng số track")
+    args = parser.parse_args()
+
+    print(f"{args.seconds:.0f}s stereo stems @ {SR}Hz, pitch shift + filter + echo, {os.cpu_count()} CPU")
+    print(f"  {'tracks':>6} {'serial':>9} {'parallel':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as root:
+        all_tracks = _write_stems(root, args.max_tracks, args.seconds)
+        # Lần đầu trả chi phí import/JIT của librosa, không tính
+        _time(all_tracks[:1], root, 1)
+        for n in range(1, args.max_tracks + 1):
+            tracks = all_tracks[:n]
+            serial = _time(tracks, root, 1)
+            parallel = _time(tracks, root, args.workers or n)
+            a, _ = sf.read(Path(root) / "mix_1.wav", dtype='int16')
+            b, _ = sf.read(Path(root) / f"mix_{args.workers or n}.wav", dtype='int16')
+            same = "identical" if np.array_equal(a, b) else "DIFFERENT"
+            print(f"  {n:>6} {serial:8.2f}s {parallel:8.2f}s {serial / parallel:7.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: các chế độ của engine pitch (src/pitch.py) - độ chính xác so với tốc độ
+
+Tín hiệu tổng hợp có f0 đã biết (glissando + vibrato, 4 hoạ âm, có đoạn lặng, nhiễu nhẹ).
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_pitch [--seconds 60] [--workers 4] [--skip-pyin]
+"""
+
+import argparse
+import os
+import time
+
+import librosa
+import numpy as np
+
+from src import pitch
+
+SR = 22050
+
+
+def synth(seconds, sr=SR, seed=0):
+    """Tín hiệu + f0 thật + nhãn có pitch theo frame (hop 512, center=True)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f = 220 * 2 ** np.sin(2 * np.pi * 0.05 * t) * 2 ** (0.02 * np.sin(2 * np.pi * 5.5 * t))
+    phase = 2 * np.pi * np.cumsum(f) / sr
+    y = sum(0.3 / k * np.sin(k * phase) for k in range(1, 5))
+    gate = (t % 10) < 8.5  # 1.5s lặng mỗi 10s
+    y = (y * gate + 0.003 * rng.standard_normal(len(t))).astype(np.float32)
+
+    frames = np.arange(1 + len(y) // pitch.HOP_LENGTH) * pitch.HOP_LENGTH
+    idx = np.minimum(frames, len(y) - 1)
+    # Frame sát biên lặng có cả hai trạng thái: bỏ khỏi phép đo voicing
+    margin = pitch.FRAME_LENGTH // 2
+    near_edge = np.array([gate[max(0, i - margin):i + margin].any() != gate[max(0, i - margin):i + margin].all()
+                          for i in idx])
+    return y, f[idx], gate[idx], near_edge
+
+
+def score(f0, truth, voiced, near_edge):
+    est = ~np.isnan(f0)
+    both = est & voiced & ~near_edge
+    cents = 1200 * np.abs(np.log2(f0[both] / truth[both]))
+    return {
+        "gpe": float(np.mean(cents > 50)) if len(cents) else 1.0,
+        "median_cents": float(np.median(cents)) if len(cents) else float("nan"),
+        "voicing": float(np.mean(est[~near_edge] == voiced[~near_edge])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--skip-pyin", action="store_true", help="bỏ các chế độ pyin (chậm)")
+    args = parser.parse_args()
+
+    y, truth, voiced, near_edge = synth(args.seconds)
+    fmin, fmax = librosa.note_to_hz('A0'), librosa.note_to_hz('C8')
+    modes = [("yin fft, 1 worker", "yin", 1), (f"yin fft, {args.workers} workers", "yin", args.workers)]
+    if not args.skip_pyin:
+        modes += [("pyin, 1 worker", "pyin", 1), (f"pyin chunked, {args.workers} workers", "pyin", args.workers)]
+
+    print(f"{args.seconds:.0f}s @ {SR}Hz, {len(truth)} frames, {os.cpu_count()} CPU")
+    print(f"  {'mode':<26} {'time':>8} {'x realtime':>11} {'GPE>50c':>8} {'median c':>9} {'voicing':>8}")
+
+    t0 = time.perf_counter()
+    f0_ref = librosa.yin(y, fmin=50, fmax=2000, sr=SR)
+    elapsed = time.perf_counter() - t0
+    s = score(f0_ref, truth, voiced, near_edge)
+    print(f"  {'librosa.yin (no voicing)':<26} {elapsed:7.2f}s {args.seconds / elapsed:10.1f}x "
+          f"{s['gpe']:8.3f} {s['median_cents']:9.2f} {'-':>8}")
+
+    for name, algorithm, workers in modes:
+        t0 = time.perf_counter()
+        f0, _ = pitch.track(y, SR, algorithm=algorithm, fmin=fmin, fmax=fmax, workers=workers)
+        elapsed = time.perf_counter() - t0
+        s = score(f0, truth, voiced, near_edge)
+        print(f"  {name:<26} {elapsed:7.2f}s {args.seconds / elapsed:10.1f}x "
+              f"{s['gpe']:8.3f} {s['median_cents']:9.2f} {s['voicing']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
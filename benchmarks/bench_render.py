@@ -0,0 +1,95 @@
+"""
+Benchmark: render PNG bằng src/render.py so với pyplot + specshow/waveshow + tight_layout
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_render [--seconds 180] [--sr 44100]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import librosa
+import librosa.display
+import numpy as np
+
+from src import render
+
+
+def pyplot_spectrogram(D, sr, path):
+    plt.figure(figsize=(10, 4))
+    librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
+    plt.colorbar(format='%+2.0f dB')
+    plt.title('Log-Frequency Spectrogram')
+    plt.tight_layout()
+    plt.savefig(path, transparent=True)
+    plt.close()
+
+
+def pyplot_waveform(y, sr, path):
+    plt.figure(figsize=(10, 3))
+    librosa.display.waveshow(y, sr=sr, alpha=0.5)
+    plt.title('Waveform Envelope')
+    plt.tight_layout()
+    plt.savefig(path, transparent=True)
+    plt.close()
+
+
+def pyplot_image(matrix, path):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.imshow(matrix, aspect='auto', origin='lower', cmap='gray')
+    ax.set_xlabel('Time Frame')
+    ax.set_ylabel('Frequency Bin')
+    ax.set_title('Detailed Spectrogram (MP3 Supported)')
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+
+def _time(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=180.0)
+    parser.add_argument("--sr", type=int, default=44100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(args.sr * args.seconds)) / args.sr
+    y = (0.3 * np.sin(2 * np.pi * 220 * t) * (1 + 0.3 * np.sin(2 * np.pi * 3 * t))
+         + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+    D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
+    detailed = rng.integers(0, 255, size=(257, 600))
+    rgba = render.apply_colormap(D[:, :1000], 'magma')
+
+    out = Path(tempfile.mkdtemp())
+    print(f"Signal {args.seconds:.0f}s @ {args.sr}Hz, spectrogram {D.shape[0]}x{D.shape[1]}")
+    rows = [
+        ("spectrogram", lambda: pyplot_spectrogram(D, args.sr, out / "a.png"),
+         lambda: render.render_spectrogram(D, args.sr, 512, out / "b.png")),
+        ("waveform", lambda: pyplot_waveform(y, args.sr, out / "c.png"),
+         lambda: render.render_waveform(y, args.sr, out / "d.png")),
+        ("detailed spectrogram", lambda: pyplot_image(detailed, out / "e.png"),
+         lambda: render.render_image(detailed, out / "f.png", 'Detailed Spectrogram', 'Time Frame', 'Frequency Bin')),
+    ]
+    for name, old, new in rows:
+        t_old, t_new = _time(old), _time(new)
+        print(f"  {name:<22} pyplot {t_old * 1e3:8.1f} ms   render {t_new * 1e3:8.1f} ms   x{t_old / t_new:5.1f}")
+
+    t_png = _time(lambda: render.encode_png(rgba), 5)
+    print(f"  encode_png {rgba.shape[1]}x{rgba.shape[0]} RGBA (không trục) {t_png * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
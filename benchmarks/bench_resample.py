@@ -0,0 +1,71 @@
+"""
+Benchmark: resample lại mỗi request (librosa.load sr=22050) so với bản đã resample trong cache
+
+Tạo một file WAV (mặc định 48 kHz, hoặc dùng --file), đo librosa.load về 22050 Hz như formants / pitch
+trước đây, rồi với mỗi mức chất lượng của audio cache: lần đầu (resample + ghi entry) và các
+lần sau (mở memmap). Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_resample [--seconds 180] [--sr 48000] [--file path]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from src.audio_cache import RESAMPLE_QUALITIES, DecodedAudioCache
+
+TARGET_SR = 22050
+
+
+def _best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=180.0)
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--file", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        root = Path(root)
+        audio = args.file
+        if audio is None:
+            rng = np.random.default_rng(0)
+            t = np.arange(int(args.seconds * args.sr)) / args.sr
+            y = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+            audio = root / "song.wav"
+            sf.write(audio, np.stack([y, np.roll(y, 100)], axis=1).astype(np.float32), args.sr)
+        info = sf.info(str(audio))
+        print(f"{audio.name}: {info.duration:.0f}s, {info.samplerate} -> {TARGET_SR} Hz")
+
+        base = _best_of(lambda: librosa.load(str(audio), sr=TARGET_SR, mono=True))
+        print(f"  {'librosa.load mỗi request':<26} {base:7.3f}s")
+
+        cache = DecodedAudioCache(root / "cache", max_bytes=1 << 34)
+        cache.frames(audio)
+        reference = None
+        for quality in RESAMPLE_QUALITIES:
+            t0 = time.perf_counter()
+            y, _ = cache.load(audio, sr=TARGET_SR, quality=quality)
+            first = time.perf_counter() - t0
+            again = _best_of(lambda: float(np.asarray(cache.load(audio, sr=TARGET_SR, quality=quality)[0]).sum()))
+            if reference is None:
+                reference = np.asarray(y)
+            err = float(np.abs(np.asarray(y) - reference).max())
+            print(f"  {quality + ' lần đầu':<26} {first:7.3f}s {base / first:7.1f}x")
+            print(f"  {quality + ' từ cache':<26} {again:7.3f}s {base / again:7.1f}x  |Δ hq| {err:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: DSP fallback tách nhạc cụ - engine mask trên một STFT (src/isolator.py) so với
+thuật toán cũ (HPSS của librosa + filtfilt + hai STFT cho center mask, giữ nguyên bên dưới)
+
+In thời gian và độ giống nhau từng stem so với bản cũ (SNR dB, tương quan). Chạy từ thư mục
+gốc của repo:
+    python -m benchmarks.bench_separation [--file uploads/x.wav] [--seconds 30]
+"""
+
+import argparse
+import time
+
+import librosa
+import numpy as np
+import scipy.ndimage
+import scipy.signal
+import soundfile as sf
+
+from src import isolator
+
+SR = 44100
+
+
+def legacy_separate(y, sr):
+    """Thuật toán DSP fallback trước khi chuyển sang mask phổ (tham chiếu để so sánh)"""
+    y_harmonic, y_percussive = librosa.effects.hpss(y, margin=(1.0, 3.0))
+    stems = {"Drums": y_percussive}
+
+    b_low, a_low = scipy.signal.butter(4, 150, btype='low', fs=sr)
+    stems["Bass"] = scipy.signal.filtfilt(b_low, a_low, y_harmonic, axis=-1)
+
+    y_mid = y_harmonic - stems["Bass"]
+    stft_l = librosa.stft(y_mid[0])
+    stft_r = librosa.stft(y_mid[1])
+    center_mask = np.minimum(np.abs(stft_l), np.abs(stft_r)) / (np.maximum(np.abs(stft_l), np.abs(stft_r)) + 1e-10)
+    stft_voc = (stft_l + stft_r) / 2 * (center_mask ** 4)
+    y_voc = librosa.istft(stft_voc, length=y.shape[1])
+    stems["Vocals"] = np.vstack((y_voc, y_voc))
+
+    y_inst = y_mid - stems["Vocals"]
+    bg, ag = scipy.signal.butter(4, [200, 4500], btype='bandpass', fs=sr)
+    stems["Guitar"] = scipy.signal.filtfilt(bg, ag, y_inst, axis=-1)
+    stems["Keyboard / Sync"] = y_inst - stems["Guitar"]
+    return {label: stems[label] for label in isolator.DSP_STEM_LABELS}
+
+
+def similarity(a, b, mix):
+    """
+    (SNR dB của a so với b, sai khác so với năng lượng mix (dB), hệ số tương quan).
+    Stem gần như rỗng (vd. guitar của file mono) có SNR vô nghĩa, cột thứ hai vẫn đọc được.
+    """
+    a, b = np.ravel(a).astype(np.float64), np.ravel(b).astype(np.float64)
+    err = max(np.sum((a - b) ** 2), 1e-30)
+    snr = 10 * np.log10(max(np.sum(b ** 2), 1e-30) / err)
+    vs_mix = 10 * np.log10(np.sum(np.asarray(mix, dtype=np.float64) ** 2) / err)
+    corr = float(np.corrcoef(a, b)[0, 1]) if np.std(a) > 0 and np.std(b) > 0 else float("nan")
+    return snr, vs_mix, corr
+
+
+def synth(seconds, sr=SR, seed=0):
+    """Mix stereo tổng hợp: kick + hi-hat, bass, giọng giữa, guitar lệch trái, pad lệch phải"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    beat = t % 0.5
+    kick = np.sin(2 * np.pi * 55 * t) * np.exp(-beat * 25)
+    hat = rng.standard_normal(len(t)) * np.exp(-((t + 0.25) % 0.5) * 80) * 0.2
+    bass = 0.3 * np.sin(2 * np.pi * 82.4 * t)
+    voice = 0.25 * np.sin(2 * np.pi * 330 * t + 3 * np.sin(2 * np.pi * 5 * t))
+    guitar = 0.2 * scipy.signal.sawtooth(2 * np.pi * 196 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t))
+    pad = 0.1 * np.sin(2 * np.pi * 6000 * t)
+    common = kick + hat + bass + voice
+    return np.stack([common + guitar + 0.3 * pad, common + 0.3 * guitar + pad]).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="file audio thật (mặc định: tín hiệu tổng hợp)")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.file:
+        y, sr = sf.read(args.file, dtype='float32', always_2d=True, frames=int(args.seconds * 48000))
+        y = y.T if y.shape[1] > 1 else np.vstack((y.T, y.T))
+        y = y[:, :int(args.seconds * sr)]
+    else:
+        y, sr = synth(args.seconds), SR
+
+    # Lần đầu trả chi phí import/JIT, không tính
+    isolator._dsp_separate(y[:, :sr], sr)
+    legacy_separate(y[:, :sr], sr)
+
+    t0 = time.perf_counter()
+    ref = legacy_separate(y, sr)
+    legacy_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = isolator._dsp_separate(y, sr)
+    new_time = time.perf_counter() - t0
+
+    mag = np.abs(librosa.stft(y[0])).astype(np.float32)
+    t0 = time.perf_counter()
+    scipy.ndimage.median_filter(mag, size=(1, isolator.DSP_HPSS_KERNEL), mode='reflect')
+    scipy.ndimage.median_filter(mag, size=(isolator.DSP_HPSS_KERNEL, 1), mode='reflect')
+    ndimage_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    isolator._median_filter(mag, isolator.DSP_HPSS_KERNEL, axis=-1)
+    isolator._median_filter(mag, isolator.DSP_HPSS_KERNEL, axis=-2)
+    median_time = time.perf_counter() - t0
+
+    print(f"{y.shape[1] / sr:.0f}s stereo @ {sr}Hz ({args.file or 'synthetic'})")
+    print(f"  legacy (hpss + filtfilt + 2 stft)   {legacy_time:6.2f}s")
+    print(f"  single-STFT mask engine             {new_time:6.2f}s  {legacy_time / new_time:5.2f}x")
+    print(f"  HPSS median filters, 1 channel: ndimage {ndimage_time:.2f}s, partition {median_time:.2f}s "
+          f"({ndimage_time / median_time:.1f}x)")
+    print(f"  {'stem':<16} {'SNR vs legacy':>14} {'err vs mix':>11} {'corr':>7}")
+    for label in isolator.DSP_STEM_LABELS:
+        snr, vs_mix, corr = similarity(new[label], ref[label], y)
+        print(f"  {label:<16} {snr:11.1f} dB {vs_mix:8.1f} dB {corr:7.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: speed/pitch đa kênh (src/vocoder.py) so với librosa gọi cho từng kênh
+
+Đo bước time/pitch riêng (librosa time_stretch + pitch_shift như effects cũ, vocoder
+mode "phase" và "wsola") rồi đo cả lượt render mix có pitch shift với từng mode.
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_vocoder [--seconds 30] [--speed 1.0] [--semitones 2] [--tracks 2]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from src import vocoder
+from src.effects import apply_audio_effects
+
+SR = 44100
+
+
+def _signal(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SR)) / SR
+    y = sum(0.2 / k * np.sin(2 * np.pi * 220 * k * t) for k in range(1, 6)) + 0.02 * rng.standard_normal(len(t))
+    return np.stack([y, np.roll(y, 300)]).astype(np.float32)
+
+
+def _librosa_time_pitch(y, speed, semitones):
+    """Đường cũ của effects: từng kênh qua librosa, pitch shift = stretch + resample riêng"""
+    out = []
+    for ch in y:
+        if abs(speed - 1.0) > 0.01:
+            ch = librosa.effects.time_stretch(ch, rate=speed)
+        if abs(semitones) > 0.1:
+            ch = librosa.effects.pitch_shift(ch, sr=SR, n_steps=semitones)
+        out.append(ch)
+    return np.stack(out)
+
+
+def _best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _time_mix(root, tracks):
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            assert apply_audio_effects(tracks, Path(root) / "mix.wav", workers=1)
+            return time.perf_counter() - t0
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--semitones", type=float, default=2.0)
+    parser.add_argument("--tracks", type=int, default=2)
+    args = parser.parse_args()
+
+    y = _signal(args.seconds)
+    print(f"{args.seconds:.0f}s stereo @ {SR}Hz, speed {args.speed}x, pitch {args.semitones:+g} st, "
+          f"{os.cpu_count()} CPU")
+
+    # Lần đầu trả chi phí import/JIT, không tính
+    _librosa_time_pitch(y[:, :SR], args.speed, args.semitones)
+    vocoder.time_pitch(y[:, :SR], SR, args.speed, args.semitones)
+
+    print("  time/pitch only")
+    base = _best_of(lambda: _librosa_time_pitch(y, args.speed, args.semitones))
+    print(f"    {'librosa per channel':<22} {base:7.2f}s")
+    for mode in vocoder.MODES:
+        elapsed = _best_of(lambda: vocoder.time_pitch(y, SR, args.speed, args.semitones, mode=mode))
+        print(f"    {'vocoder ' + mode:<22} {elapsed:7.2f}s {base / elapsed:6.2f}x")
+
+    print(f"  full mix render, {args.tracks} tracks (filter + echo)")
+    with tempfile.TemporaryDirectory() as root:
+        uploads = Path(root) / "uploads"
+        uploads.mkdir()
+        for i in range(args.tracks):
+            sf.write(uploads / f"stem{i}.wav", _signal(args.seconds, seed=i).T, SR, subtype='FLOAT')
+        for mode in vocoder.MODES:
+            tracks = [{"url": f"/uploads/stem{i}.wav", "speed": args.speed, "pitch": args.semitones,
+                       "lpf": 6000, "echo": 0.3, "time_pitch_mode": mode} for i in range(args.tracks)]
+            print(f"    {'vocoder ' + mode:<22} {_time_mix(root, tracks):7.2f}s")
+        print(f"    {'(librosa time/pitch)':<22} {base * args.tracks:7.2f}s  chỉ riêng bước time/pitch của đường cũ")
+
+
+if __name__ == "__main__":
+    main()
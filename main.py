@@ -1,10 +1,11 @@
 import os
-import shutil
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, Request, File, UploadFile, HTTPException
+from fastapi import FastAPI, Request, File, UploadFile, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 import librosa
 import librosa.display
 import matplotlib
@@ -14,10 +15,24 @@ import numpy as np
 
 # Import custom modules
 from src.isolator import isolate_rock_instruments
-from src.effects import apply_audio_effects
+from src.effects import (discard_rendered, master_samplerate, mix_rendered, prepare_stream_mix, render_track,
+                         stream_mix, validate_tracks)
+from src import mix_stream
 from src.analyzer import analyze_audio_features
-from src.voice_processing import InstrumentVoiceProcessor
+from src.executor import PoolBusyError, call_processor, get_pool, run_in_pool
+from src.jobs import JobStore, JobManager, COMPLETED
+from src.separation_worker import shutdown_worker
+from src.spectrogram_tiles import TILE_SIZE, ensure_tiles, get_tile
+from src.ingest import prepare_upload, store_upload
+from src.result_cache import get_result_cache
+from src.streaming_vad import iter_vad_segments
+from src.audio_cache import DEFAULT_RESAMPLE_QUALITY, RESAMPLE_QUALITIES
+from src.pitch import ALGORITHMS as PITCH_ALGORITHMS
+from src.vocoder import MODES as TIME_PITCH_MODES
+import threading
+import time
 import uuid
+import weakref
 
 # Resolve NoBackendError for librosa by providing static ffmpeg
 try:
@@ -26,7 +41,18 @@ try:
 except ImportError:
     print("static-ffmpeg not found, please install it.")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Khởi động worker ở nền để request đầu tiên không phải chờ import librosa
+    asyncio.get_running_loop().run_in_executor(None, get_pool().warm_up)
+    # Chạy lại các job tách nhạc còn dở từ lần chạy trước
+    job_manager.resume()
+    yield
+    job_manager.shutdown()
+    shutdown_worker()
+    get_pool().shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Directory setup
 UPLOAD_DIR = Path("uploads")
@@ -35,22 +61,154 @@ STATIC_DIR = Path("static")
 SPECTROGRAM_DIR = STATIC_DIR / "spectrograms"
 SPECTROGRAM_DIR.mkdir(parents=True, exist_ok=True)
 
+# Số điểm tối đa cho một lần truy vấn waveform
+MAX_WAVEFORM_POINTS = 20000
+
+# Mix stream: POST /process/mix {"stream": true} cấp token, GET /process/mix/stream/{token} phát
+MIX_STREAM_TTL = 600  # giây
+MIX_STREAM_MAX_TOKENS = 256  # token cũ nhất bị bỏ khi vượt
+# Số stream được phát đồng thời (mỗi stream giữ một thread của API process trong lúc phát)
+MIX_STREAM_WORKERS = int(os.environ.get("MIX_STREAM_WORKERS", 2))
+_mix_streams = {}
+_mix_stream_slots = threading.BoundedSemaphore(MIX_STREAM_WORKERS)
+
+def _prune_mix_streams():
+    now = time.monotonic()
+    for token in [t for t, entry in _mix_streams.items() if now - entry["created"] > MIX_STREAM_TTL]:
+        del _mix_streams[token]
+    while len(_mix_streams) >= MIX_STREAM_MAX_TOKENS:
+        del _mix_streams[next(iter(_mix_streams))]
+
+class _StreamSlot:
+    """Một chỗ trong _mix_stream_slots, trả lại đúng một lần (hết stream, lỗi, hoặc generator bị bỏ)"""
+
+    def __init__(self):
+        if not _mix_stream_slots.acquire(blocking=False):
+            raise PoolBusyError()
+        self._lock = threading.Lock()
+        self._held = True
+
+    def release(self):
+        with self._lock:
+            if self._held:
+                self._held = False
+                _mix_stream_slots.release()
+
+def _hold_slot(slot, blocks):
+    try:
+        yield from blocks
+    finally:
+        blocks.close()
+        slot.release()
+
+def _run_isolation_job(params, job):
+    file_path = UPLOAD_DIR / params["filename"]
+    if not file_path.exists():
+        raise FileNotFoundError(f"File not found: {params['filename']}")
+    stems = isolate_rock_instruments(file_path, UPLOAD_DIR, job=job)
+    if not stems:
+        raise RuntimeError("No stems were produced")
+    return {"stems": stems}
+
+job_manager = JobManager(JobStore(), runners={"isolation": _run_isolation_job})
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 templates = Jinja2Templates(directory="templates")
 
+@app.exception_handler(PoolBusyError)
+async def pool_busy_handler(request: Request, exc: PoolBusyError):
+    return JSONResponse(
+        content={"error": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "title": "Instrumental Sound Processing"})
 
+async def _cached(method, file_path, params, run, artifacts=None):
+    """
+    Tra result cache (hash nội dung + method + tham số + phiên bản thuật toán) trước khi
+    đẩy việc vào process pool. Trả về (kết quả, cache_hit).
+    """
+    cache = get_result_cache()
+    key = await asyncio.to_thread(cache.key_for, file_path, method, params)
+    hit = await asyncio.to_thread(cache.get, key)
+    if hit is not None:
+        return hit, True
+    value = await run()
+    await asyncio.to_thread(cache.put, key, method, value, artifacts(value) if artifacts else ())
+    return value, False
+
+def _upload_path(filename):
+    """File trong uploads/ của filename: 400 nếu tên trỏ ra ngoài uploads/, 404 nếu không phải file đã upload"""
+    file_path = (UPLOAD_DIR / filename).resolve()
+    if file_path.parent != UPLOAD_DIR.resolve() or file_path.name.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+def _parse_region(data):
+    """start/end (giây) của đoạn cần phân tích trong body; None = từ đầu / tới hết file"""
+    try:
+        start = None if data.get("start") is None else float(data["start"])
+        end = None if data.get("end") is None else float(data["end"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="start and end must be numbers (seconds)")
+    if start is not None and start < 0:
+        raise HTTPException(status_code=400, detail="start must not be negative")
+    if end is not None and end <= (start or 0.0):
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    return start, end
+
+def _region_params(region, **params):
+    """Tham số khoá result cache: chỉ thêm start/end khi có để khoá của cả file không đổi"""
+    start, end = region
+    if start is not None:
+        params["start"] = start
+    if end is not None:
+        params["end"] = end
+    return params
+
+def _parse_quality(data):
+    """Mức resample ("hq" | "fast") trong body, mặc định DEFAULT_RESAMPLE_QUALITY"""
+    quality = data.get("quality") or DEFAULT_RESAMPLE_QUALITY
+    if quality not in RESAMPLE_QUALITIES:
+        raise HTTPException(status_code=400, detail=f"quality must be one of {', '.join(RESAMPLE_QUALITIES)}")
+    return quality
+
+def _quality_params(quality, params):
+    """Khoá result cache: chỉ thêm quality khi khác "hq" để khoá cũ vẫn dùng được"""
+    if quality != "hq":
+        params["quality"] = quality
+    return params
+
+def _plot_artifact(name):
+    return [SPECTROGRAM_DIR / name]
+
+def _url_artifacts(*keys):
+    """Artifact từ các URL /static/... trong kết quả"""
+    return lambda value: [Path(value[k].lstrip("/")) for k in keys if value.get(k)]
+
+async def _prepare_upload(file_path):
+    """Transcode sang bản canonical + dựng peak sau khi upload để request đầu tiên không phải decode"""
+    try:
+        await run_in_pool(prepare_upload, file_path)
+    except Exception as e:
+        print(f"WARNING: could not prepare {file_path}: {e}")
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     try:
-        file_location = UPLOAD_DIR / file.filename
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-        return JSONResponse(content={"filename": file.filename, "message": "File uploaded successfully"})
+        stored = await store_upload(file, UPLOAD_DIR)
+        file_location = UPLOAD_DIR / stored["filename"]
+        if not stored["duplicate"]:
+            background_tasks.add_task(_prepare_upload, file_location)
+        return JSONResponse(content=dict(stored, message="File uploaded successfully"))
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
@@ -65,10 +223,16 @@ async def perform_audio_analysis(request: Request):
     file_path = UPLOAD_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
+    region = _parse_region(data)
 
     try:
-        analysis_results = analyze_audio_features(file_path, SPECTROGRAM_DIR)
-        return JSONResponse(content=analysis_results)
+        analysis_results, hit = await _cached(
+            "analyze_audio_features", file_path, _region_params(region),
+            lambda: run_in_pool(analyze_audio_features, file_path, SPECTROGRAM_DIR, *region),
+            artifacts=_url_artifacts("spectrogram_url", "waveform_url"))
+        return JSONResponse(content=dict(analysis_results, cache_hit=hit))
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -94,7 +258,12 @@ async def isolate_instruments(request: Request):
         raise HTTPException(status_code=404, detail="File not found")
 
     try:
-        response_stems = isolate_rock_instruments(file_path, UPLOAD_DIR)
+        # Chạy qua job manager để dùng chung Demucs worker thường trú với /jobs/isolation
+        job_id = job_manager.submit("isolation", {"filename": filename})
+        job = await asyncio.to_thread(job_manager.wait, job_id)
+        if job["status"] != COMPLETED:
+            raise RuntimeError(job["error"] or f"Job {job['status']}")
+        response_stems = job["result"]["stems"]
         
         return JSONResponse(content={
             "message": "Rock Instruments isolation complete", 
@@ -107,6 +276,71 @@ async def isolate_instruments(request: Request):
         traceback.print_exc()
         return JSONResponse(content={"error": f"Separation failed: {error_msg}"}, status_code=500)
 
+# Job API: tách nhạc chạy nền, client poll tiến độ thay vì giữ HTTP request hàng phút
+def _job_status(job):
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+@app.post("/jobs/isolation")
+async def submit_isolation_job(request: Request):
+    data = await request.json()
+    filename = data.get("filename")
+    if not filename:
+        raise HTTPException(status_code=400, detail="Filename is required")
+    
+    file_path = UPLOAD_DIR / filename
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    job_id = job_manager.submit("isolation", {"filename": filename})
+    return JSONResponse(content={"job_id": job_id, "status": "queued"}, status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=_job_status(job))
+
+@app.get("/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content={
+        "job_id": job_id,
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"]
+    })
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != COMPLETED:
+        return JSONResponse(content={**_job_status(job), "error": job["error"] or f"Job is {job['status']}"},
+                            status_code=409)
+    return JSONResponse(content={"job_id": job_id, "status": job["status"], **job["result"]})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_manager.cancel(job_id):
+        return JSONResponse(content={"error": f"Job already {job['status']}"}, status_code=409)
+    return JSONResponse(content={"job_id": job_id, "status": "cancelled"})
+
 @app.post("/process/mix")
 async def mix_stems(request: Request):
     data = await request.json()
@@ -114,13 +348,51 @@ async def mix_stems(request: Request):
     print(f"DEBUG: Received mix request with {len(tracks) if tracks else 0} tracks")
     if not tracks:
         raise HTTPException(status_code=400, detail="No tracks provided for mixing")
+    modes = {t.get("time_pitch_mode", "phase") for t in tracks}
+    if not modes <= set(TIME_PITCH_MODES):
+        raise HTTPException(status_code=400, detail=f"time_pitch_mode must be one of {list(TIME_PITCH_MODES)}")
+    if data.get("preview"):
+        # Preview: speed/pitch bằng WSOLA (nhanh, chất lượng thấp hơn phase vocoder)
+        tracks = [{**t, "time_pitch_mode": "wsola"} for t in tracks]
+
+    if data.get("stream"):
+        # Stream: trả URL ngay, audio được render + gửi theo block khi client mở URL đó
+        fmt = data.get("format", "wav")
+        if fmt not in mix_stream.FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {list(mix_stream.FORMATS)}")
+        if not mix_stream.format_available(fmt):
+            raise HTTPException(status_code=400, detail=f"format '{fmt}' requires ffmpeg on the server")
+        try:
+            validate_tracks(tracks)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        _prune_mix_streams()
+        token = uuid.uuid4().hex
+        _mix_streams[token] = {"tracks": tracks, "format": fmt, "created": time.monotonic()}
+        return JSONResponse(content={
+            "message": "Mix stream ready",
+            "stream_url": f"/process/mix/stream/{token}",
+            "format": fmt,
+        })
     
     try:
         mix_filename = f"mix_{uuid.uuid4().hex[:8]}.wav"
         output_path = UPLOAD_DIR / mix_filename
         print(f"DEBUG: Output path will be {output_path}")
         
-        success = apply_audio_effects(tracks, output_path)
+        # Mỗi track render chuỗi hiệu ứng trong một worker của pool (song song), kết quả
+        # trả về qua file memmap; bước cộng + chuẩn hoá chạy sau theo thứ tự track cố định
+        master_sr = await run_in_pool(master_samplerate, tracks)
+        results = await asyncio.gather(
+            *(run_in_pool(render_track, i, stem, master_sr) for i, stem in enumerate(tracks)),
+            return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            discard_rendered(results)
+            raise errors[0]
+        success = await run_in_pool(mix_rendered, results, output_path)
         
         if success:
             print(f"DEBUG: Mix successful: {output_path}")
@@ -129,10 +401,48 @@ async def mix_stems(request: Request):
                 "mix_url": f"/uploads/{mix_filename}"
             })
         else:
-            print("DEBUG: apply_audio_effects returned False")
+            print("DEBUG: mix_rendered returned False")
             return JSONResponse(content={"error": "Failed to create mix - no audio generated"}, status_code=500)
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": f"Mixing failed: {str(e)}"}, status_code=500)
+
+@app.get("/process/mix/stream/{token}")
+async def mix_stream_audio(token: str):
+    """Phát mix theo block (chunked): block đầu tiên ra ngay sau khi cộng, limiter thay cho chuẩn hoá"""
+    entry = _mix_streams.get(token)
+    if entry is None or time.monotonic() - entry["created"] > MIX_STREAM_TTL:
+        raise HTTPException(status_code=404, detail="Mix stream not found or expired")
+
+    try:
+        # Speed/pitch (cần cả track) render trong process pool, chịu giới hạn hàng đợi như các
+        # endpoint khác; lúc phát chỉ còn đọc cache stage + hiệu ứng theo block
+        if not await run_in_pool(prepare_stream_mix, entry["tracks"]):
+            return JSONResponse(content={"error": "Failed to create mix - no audio generated"}, status_code=500)
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        return JSONResponse(content={"error": f"Mixing failed: {str(e)}"}, status_code=500)
+
+    slot = _StreamSlot()
+    try:
+        opened = await asyncio.to_thread(stream_mix, entry["tracks"])
     except Exception as e:
+        slot.release()
         return JSONResponse(content={"error": f"Mixing failed: {str(e)}"}, status_code=500)
+    if opened is None:
+        slot.release()
+        return JSONResponse(content={"error": "Failed to create mix - no audio generated"}, status_code=500)
+
+    sr, n_frames, blocks = opened
+    fmt = entry["format"]
+    blocks = _hold_slot(slot, blocks)
+    # Client ngắt trước khi generator chạy thì finally không chạy: trả chỗ khi generator bị thu hồi
+    weakref.finalize(blocks, slot.release)
+    return StreamingResponse(mix_stream.encode_stream(sr, n_frames, blocks, fmt),
+                             media_type=mix_stream.media_type(fmt),
+                             headers={"Cache-Control": "no-store"})
 
 # Voice Processing Endpoints
 @app.post("/analyze/lpc")
@@ -146,19 +456,38 @@ async def analyze_lpc(request: Request):
     file_path = UPLOAD_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
+
+    # mode: "frame" (một frame như trước, mặc định), "trajectory" hoặc "both"
+    mode = data.get("mode", "frame")
+    if mode not in ("frame", "trajectory", "both"):
+        raise HTTPException(status_code=400, detail="mode must be 'frame', 'trajectory' or 'both'")
+    max_frames = data.get("max_frames", 500)
+    if isinstance(max_frames, bool) or not isinstance(max_frames, int) or max_frames < 1:
+        raise HTTPException(status_code=400, detail="max_frames must be a positive integer")
+    region = _parse_region(data)
+    start, end = region
     
     try:
-        processor = InstrumentVoiceProcessor()
-        lpc_results = processor.lpc_analysis(file_path)
+        lpc_results, lpc_hit = await _cached(
+            "lpc_analysis", file_path, _region_params(region, mode=mode, max_frames=max_frames),
+            lambda: run_in_pool(call_processor, "lpc_analysis", file_path, mode=mode, max_frames=max_frames,
+                                start=start, end=end))
         
         # Tạo autocorrelation plot
-        autocorr_img = processor.generate_autocorrelation_plot(file_path, SPECTROGRAM_DIR)
+        autocorr_img, plot_hit = await _cached(
+            "generate_autocorrelation_plot", file_path, _region_params(region),
+            lambda: run_in_pool(call_processor, "generate_autocorrelation_plot", file_path, SPECTROGRAM_DIR,
+                                start=start, end=end),
+            artifacts=_plot_artifact)
         
         return JSONResponse(content={
             "message": "LPC analysis complete",
             "lpc_data": lpc_results,
-            "autocorrelation_plot": f"/static/spectrograms/{autocorr_img}"
+            "autocorrelation_plot": f"/static/spectrograms/{autocorr_img}",
+            "cache_hit": lpc_hit and plot_hit
         })
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -176,13 +505,25 @@ async def analyze_waveform(request: Request):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     
+    start, end = _parse_region(data)
+    try:
+        points = int(data.get("points", 600))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="points must be a number")
+    if points < 1 or points > MAX_WAVEFORM_POINTS:
+        raise HTTPException(status_code=400, detail=f"points must be between 1 and {MAX_WAVEFORM_POINTS}")
+    
     try:
-        processor = InstrumentVoiceProcessor()
-        waveform_data = processor.generate_waveform_data(file_path)
+        waveform_data, hit = await _cached(
+            "generate_waveform_data", file_path, {"points": points, "start": start, "end": end},
+            lambda: run_in_pool(call_processor, "generate_waveform_data", file_path, points, start, end))
         return JSONResponse(content={
             "message": "Waveform data generated",
-            "waveform": waveform_data
+            "waveform": waveform_data,
+            "cache_hit": hit
         })
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -200,18 +541,74 @@ async def analyze_detailed_spectrogram(request: Request):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     
+    region = _parse_region(data)
+    start, end = region
+    
     try:
-        processor = InstrumentVoiceProcessor()
-        spec_img = processor.generate_detailed_spectrogram(file_path, SPECTROGRAM_DIR)
+        spec_img, hit = await _cached(
+            "generate_detailed_spectrogram", file_path, _region_params(region),
+            lambda: run_in_pool(call_processor, "generate_detailed_spectrogram", file_path, SPECTROGRAM_DIR,
+                                start=start, end=end),
+            artifacts=_plot_artifact)
         return JSONResponse(content={
             "message": "Detailed spectrogram generated",
-            "spectrogram_url": f"/static/spectrograms/{spec_img}"
+            "spectrogram_url": f"/static/spectrograms/{spec_img}",
+            "cache_hit": hit
         })
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.post("/analyze/spectrogram_tiles")
+async def analyze_spectrogram_tiles(request: Request):
+    """Dựng (một lần) tile pyramid spectrogram của cả track, trả về metadata + URL tile"""
+    data = await request.json()
+    filename = data.get("filename")
+    if not filename:
+        raise HTTPException(status_code=400, detail="Filename is required")
+    
+    file_path = _upload_path(filename)
+    
+    try:
+        meta = await run_in_pool(ensure_tiles, file_path)
+        return JSONResponse(content={
+            "message": "Spectrogram tiles ready",
+            "tiles": meta,
+            "tile_url": f"/tiles/{filename}/{{zoom}}/{{x}}/{{y}}.png",
+            "raw_tile_url": f"/tiles/{filename}/{{zoom}}/{{x}}/{{y}}.f32"
+        })
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/tiles/{filename}/{zoom}/{x}/{tile}")
+async def spectrogram_tile(filename: str, zoom: int, x: int, tile: str):
+    """Một tile spectrogram: <y>.png (ảnh) hoặc <y>.f32 (dB float32 little-endian, hàng 0 = tần số thấp)"""
+    stem, _, fmt = tile.partition(".")
+    if fmt not in ("png", "f32") or not stem.isdigit():
+        raise HTTPException(status_code=400, detail="Tile must be <y>.png or <y>.f32")
+    
+    file_path = _upload_path(filename)
+    
+    try:
+        content = await asyncio.to_thread(get_tile, file_path, zoom, x, int(stem), fmt)
+    except LookupError as e:
+        # IndexError (tile ngoài phạm vi) cũng là LookupError
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    # Nội dung tile chỉ phụ thuộc vào nội dung file (tên file = hash) nên cache lâu dài được
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+    if fmt == "png":
+        return Response(content=content, media_type="image/png", headers=headers)
+    headers["X-Tile-Shape"] = f"{TILE_SIZE},{TILE_SIZE}"
+    return Response(content=content, media_type="application/octet-stream", headers=headers)
+
 @app.post("/analyze/formants")
 async def analyze_formants(request: Request):
     """Phân tích formants (đỉnh phổ) của nhạc cụ"""
@@ -224,13 +621,22 @@ async def analyze_formants(request: Request):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     
+    region = _parse_region(data)
+    start, end = region
+    quality = _parse_quality(data)
+    
     try:
-        processor = InstrumentVoiceProcessor()
-        formants = processor.analyze_formants(file_path)
+        formants, hit = await _cached(
+            "analyze_formants", file_path, _quality_params(quality, _region_params(region)),
+            lambda: run_in_pool(call_processor, "analyze_formants", file_path, start=start, end=end,
+                                quality=quality))
         return JSONResponse(content={
             "message": "Formant analysis complete",
-            "formants": formants
+            "formants": formants,
+            "cache_hit": hit
         })
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -248,13 +654,31 @@ async def analyze_pitch(request: Request):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     
+    algorithm = data.get("algorithm", "pyin")
+    if algorithm not in PITCH_ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"algorithm must be one of {', '.join(PITCH_ALGORITHMS)}")
+    try:
+        max_points = None if data.get("max_points") is None else int(data["max_points"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="max_points must be a number")
+    if max_points is not None and max_points < 1:
+        raise HTTPException(status_code=400, detail="max_points must be positive")
+    region = _parse_region(data)
+    quality = _parse_quality(data)
+    
     try:
-        processor = InstrumentVoiceProcessor()
-        pitch_data = processor.pitch_tracking(file_path)
+        pitch, hit = await _cached(
+            "pitch_tracking", file_path,
+            _quality_params(quality, _region_params(region, algorithm=algorithm, max_points=max_points)),
+            lambda: run_in_pool(call_processor, "pitch_tracking", file_path, algorithm, max_points, *region,
+                                quality=quality))
         return JSONResponse(content={
             "message": "Pitch tracking complete",
-            "pitch_data": pitch_data
+            "pitch": pitch,
+            "cache_hit": hit
         })
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -277,11 +701,15 @@ async def analyze_vad(request: Request):
 
     if not file_path.exists():
         return JSONResponse(content={"error": f"Không tìm thấy tệp tin: {filename}"}, status_code=404)
+    region = _parse_region(data)
         
     try:
-        processor = InstrumentVoiceProcessor()
-        vad_results = processor.analyze_vad(file_path)
-        return JSONResponse(content=vad_results)
+        vad_results, hit = await _cached(
+            "analyze_vad", file_path, _region_params(region),
+            lambda: run_in_pool(call_processor, "analyze_vad", file_path, *region))
+        return JSONResponse(content=dict(vad_results, cache_hit=hit))
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -289,6 +717,66 @@ async def analyze_vad(request: Request):
             f.write(f"ERROR in analyze_vad:\n{error_trace}\n")
         return JSONResponse(content={"error": f"Lỗi xử lý VAD: {str(e)}"}, status_code=500)
 
+@app.websocket("/ws/vad")
+async def vad_stream(websocket: WebSocket):
+    """
+    VAD dạng stream: client gửi {"filename": ..., "start"?, "end"?} (giây, như /analyze/vad),
+    server đẩy từng đoạn ngay khi đóng
+    ({"type": "segment", start, end, duration}) rồi {"type": "done", ...} hoặc {"type": "error", ...}
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce(file_path, start, end):
+        # Chạy trong thread riêng: đọc file theo block, đẩy đoạn về event loop
+        gen = iter_vad_segments(file_path, stop_event=stop, start=start, end=end)
+        try:
+            while True:
+                try:
+                    seg = next(gen)
+                except StopIteration as done:
+                    summary = done.value
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, dict(seg, type="segment"))
+            loop.call_soon_threadsafe(queue.put_nowait, dict(summary, type="done"))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, {"type": "error", "error": f"Lỗi xử lý VAD: {e}"})
+
+    try:
+        data = await websocket.receive_json()
+        filename = data.get("filename")
+        file_path = UPLOAD_DIR / filename if filename else None
+        if file_path is None or not file_path.exists():
+            await websocket.send_json({"type": "error", "error": f"Không tìm thấy tệp tin: {filename}"})
+            await websocket.close()
+            return
+        try:
+            start, end = _parse_region(data)
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "error": e.detail})
+            await websocket.close()
+            return
+
+        worker = threading.Thread(target=produce, args=(file_path, start, end), daemon=True)
+        worker.start()
+        total = 0
+        while True:
+            message = await queue.get()
+            if message["type"] == "segment":
+                total += 1
+            elif message["type"] == "done":
+                message["total_segments"] = total
+            await websocket.send_json(message)
+            if message["type"] != "segment":
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stop.set()
+
 @app.post("/analyze/cutoff")
 async def analyze_cutoff(request: Request):
     """Xác định tần số cắt"""
@@ -303,11 +791,15 @@ async def analyze_cutoff(request: Request):
     
     if not file_path.exists():
         return JSONResponse(content={"error": f"Không tìm thấy tệp tin: {filename}"}, status_code=404)
+    region = _parse_region(data)
         
     try:
-        processor = InstrumentVoiceProcessor()
-        cutoff_results = processor.analyze_cutoff(file_path)
-        return JSONResponse(content=cutoff_results)
+        cutoff_results, hit = await _cached(
+            "analyze_cutoff", file_path, _region_params(region),
+            lambda: run_in_pool(call_processor, "analyze_cutoff", file_path, *region))
+        return JSONResponse(content=dict(cutoff_results, cache_hit=hit))
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -329,11 +821,15 @@ async def analyze_features(request: Request):
         
     if not file_path.exists():
         return JSONResponse(content={"error": f"Không tìm thấy tệp tin: {filename}"}, status_code=404)
+    region = _parse_region(data)
         
     try:
-        processor = InstrumentVoiceProcessor()
-        features = processor.extract_acoustic_features(file_path)
-        return JSONResponse(content=features)
+        features, hit = await _cached(
+            "extract_acoustic_features", file_path, _region_params(region),
+            lambda: run_in_pool(call_processor, "extract_acoustic_features", file_path, *region))
+        return JSONResponse(content=dict(features, cache_hit=hit))
+    except PoolBusyError:
+        raise
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -1,10 +1,14 @@
+import uuid
+
 import librosa
 import numpy as np
-import matplotlib.pyplot as plt
-import librosa.display
 from pathlib import Path
 
-def analyze_audio_features(file_path, spectrogram_dir):
+from .audio_cache import load_region
+from .features import get_plane
+from .render import render_spectrogram, render_waveform
+
+def analyze_audio_features(file_path, spectrogram_dir, start=None, end=None):
     """
     Performs comprehensive audio analysis:
     1. Basic Info (Duration, SR)
@@ -12,44 +16,43 @@ def analyze_audio_features(file_path, spectrogram_dir):
     3. Key Detection
     4. Spectrogram Generation
     5. Waveform Generation
+
+    start, end: chỉ phân tích đoạn [start, end) giây (mặc định cả file)
     """
-    y, sr = librosa.load(file_path, sr=None)
+    y, sr = load_region(file_path, start, end)
     duration = librosa.get_duration(y=y, sr=sr)
+    # STFT một lần, dùng chung cho onset (BPM), chroma (key) và spectrogram
+    plane = get_plane(file_path, start=start, end=end)
     
     # 1. BPM Detection
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-    bpm = round(float(tempo), 2)
+    tempo, _ = librosa.beat.beat_track(onset_envelope=plane.onset_strength(), sr=sr,
+                                       hop_length=plane.hop_length)
+    # librosa >= 0.10 trả tempo dạng mảng 1 phần tử
+    bpm = round(float(np.atleast_1d(tempo)[0]), 2)
     
-    # 2. Key Detection (Chroma-based)
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
+    # 2. Key Detection (Chroma-based, chroma_stft trên cùng STFT thay cho CQT riêng)
+    chroma = plane.chroma()
     chroma_avg = np.mean(chroma, axis=1)
     keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
     key_idx = np.argmax(chroma_avg)
     detected_key = keys[key_idx]
     
-    # 3. Spectrogram
-    plt.figure(figsize=(10, 4))
-    D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-    librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
-    plt.colorbar(format='%+2.0f dB')
-    plt.title('Log-Frequency Spectrogram')
-    plt.tight_layout()
-    
-    spec_filename = f"{Path(file_path).name}_spec.png"
+    # 3. Spectrogram (render trực tiếp bằng LUT + Agg, không qua pyplot)
+    D = plane.db()
+    # Mỗi lần render một tên riêng: ảnh là artifact của đúng một entry result cache,
+    # entry khác (đoạn khác, phiên bản thuật toán khác) không ghi đè hay xoá nhầm
+    name = Path(file_path).name
+    if start is not None or end is not None:
+        name += f"_{start or 0:g}-{'end' if end is None else format(end, 'g')}"
+    name += f"_{uuid.uuid4().hex}"
+    spec_filename = f"{name}_spec.png"
     spec_path = spectrogram_dir / spec_filename
-    plt.savefig(spec_path, transparent=True)
-    plt.close()
+    render_spectrogram(D, sr, plane.hop_length, spec_path, title='Log-Frequency Spectrogram')
     
     # 4. Waveform
-    plt.figure(figsize=(10, 3))
-    librosa.display.waveshow(y, sr=sr, alpha=0.5)
-    plt.title('Waveform Envelope')
-    plt.tight_layout()
-    
-    wave_filename = f"{Path(file_path).name}_wave.png"
+    wave_filename = f"{name}_wave.png"
     wave_path = spectrogram_dir / wave_filename
-    plt.savefig(wave_path, transparent=True)
-    plt.close()
+    render_waveform(y, sr, wave_path, title='Waveform Envelope')
     
     return {
         "bpm": bpm,
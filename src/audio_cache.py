@@ -0,0 +1,407 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+import librosa
+
+from .decoder import mp3_seek_index, open_blocks, read_region, sample_range, write_frames
+
+# Thư mục cache không nằm trong uploads/ vì uploads/ được mount ra ngoài qua StaticFiles
+CACHE_ROOT = Path(os.environ.get("AUDIO_CACHE_DIR", "cache"))
+DECODED_DIR = CACHE_ROOT / "decoded"
+SEEK_DIR = CACHE_ROOT / "seek"
+MAX_CACHE_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# Mức chất lượng resample -> res_type của librosa.resample. "hq" (soxr_hq, mặc định của librosa)
+# cho phân tích; "fast" (soxr_lq, filter ngắn hơn) cho preview. polyphase của scipy chậm hơn cả
+# soxr_hq nên không dùng. Phần đắt là decode + resample mỗi request, cache bỏ được cả hai
+RESAMPLE_QUALITIES = {"hq": "soxr_hq", "fast": "soxr_lq"}
+DEFAULT_RESAMPLE_QUALITY = os.environ.get("AUDIO_RESAMPLE_QUALITY", "hq")
+
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path):
+    """
+    SHA-256 của nội dung file (hex).
+    Kết quả được ghi nhớ theo (path, size, mtime) để không phải hash lại mỗi request.
+    """
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def resample(y, orig_sr, target_sr, quality=None):
+    """librosa.resample theo mức chất lượng (xem RESAMPLE_QUALITIES)"""
+    quality = quality or DEFAULT_RESAMPLE_QUALITY
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"Unknown resample quality '{quality}', expected one of {tuple(RESAMPLE_QUALITIES)}")
+    return librosa.resample(np.asarray(y, dtype=np.float32), orig_sr=orig_sr, target_sr=target_sr,
+                            res_type=RESAMPLE_QUALITIES[quality])
+
+
+def remember_digest(path, digest):
+    """Ghi nhớ digest đã tính sẵn (vd. hash trong lúc upload) để file_digest không phải đọc lại file"""
+    path = Path(path)
+    st = path.stat()
+    with _digest_lock:
+        _digest_memo[(str(path.resolve()), st.st_size, st.st_mtime_ns)] = digest
+
+
+class NpyCache:
+    """
+    Kho mảng .npy memory-map trên đĩa với ngân sách dung lượng và LRU theo mtime
+
+    Mỗi entry là một file .npy kèm sidecar .json (metadata tuỳ ý). Khi đọc lại, mảng được
+    memory-map ở chế độ read-only nên nhiều request/process dùng chung page cache.
+    Khi tổng dung lượng vượt max_bytes, các entry ít dùng nhất (theo mtime) bị xoá.
+    """
+
+    def __init__(self, cache_dir, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, key):
+        return self.cache_dir / f"{key}.npy", self.cache_dir / f"{key}.json"
+
+    def _read(self, key):
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arr = np.load(data_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # Cập nhật mtime để đánh dấu "vừa dùng" cho LRU
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+        return arr, meta
+
+    def _write(self, key, arr, meta):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_data = self.cache_dir / f".{key}.{uuid.uuid4().hex}.npy"
+        try:
+            np.save(tmp_data, arr)
+            self._publish(key, tmp_data, dict(meta, shape=list(arr.shape), dtype=str(arr.dtype)))
+        except BaseException:
+            self._discard_tmp(tmp_data)
+            raise
+
+    @staticmethod
+    def _discard_tmp(tmp_data):
+        """Xoá file tạm (data + meta) của một lần ghi hỏng - evict() bỏ qua dotfile nên không tự dọn"""
+        tmp_data.unlink(missing_ok=True)
+        tmp_data.with_suffix(".json").unlink(missing_ok=True)
+
+    def _publish(self, key, tmp_data, meta):
+        data_path, meta_path = self._paths(key)
+        tmp_meta = tmp_data.with_suffix(".json")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # Ghi meta trước, data sau: entry chỉ được coi là hợp lệ khi cả hai tồn tại
+        os.replace(tmp_meta, meta_path)
+        os.replace(tmp_data, data_path)
+
+    def data_path(self, key):
+        """File .npy của key (có thể chưa / không còn tồn tại)"""
+        return self._paths(key)[0]
+
+    def get(self, key):
+        """(memmap read-only, meta) của key, None nếu chưa có"""
+        return self._read(key)
+
+    def create(self, key, shape, dtype=np.float32):
+        """
+        Entry ghi dần qua memmap (cho mảng không muốn giữ cả trong RAM).
+        Chỉ hiện ra với reader sau khi commit(meta); abort() xoá file tạm.
+        """
+        return PendingEntry(self, key, shape, dtype)
+
+    def get_or_compute(self, key, compute):
+        """
+        Trả về (memmap read-only, meta) của key; nếu chưa có thì gọi compute() -> (arr, meta),
+        lưu lại rồi đọc ra qua memmap. Lỗi ghi đĩa không làm hỏng request: trả thẳng mảng vừa tính.
+        """
+        hit = self._read(key)
+        if hit is not None:
+            return hit
+
+        arr, meta = compute()
+        try:
+            self._write(key, arr, meta)
+            self.evict(keep=key)
+        except OSError as e:
+            print(f"WARNING audio_cache: could not store {key}: {e}")
+            return arr, meta
+
+        hit = self._read(key)
+        return hit if hit is not None else (arr, meta)
+
+    def size_bytes(self):
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*.npy"))
+
+    def evict(self, keep=None):
+        """Xoá entry cũ nhất cho tới khi tổng dung lượng <= max_bytes"""
+        entries = []
+        for p in self.cache_dir.glob("*.npy"):
+            if p.name.startswith("."):
+                continue  # file tạm đang ghi
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and p.stem == keep:
+                continue
+            try:
+                p.unlink()
+                p.with_suffix(".json").unlink(missing_ok=True)
+                total -= size
+            except OSError:
+                # File đang được memory-map (Windows) - bỏ qua, lần sau sẽ xoá
+                continue
+
+
+class PendingEntry:
+    """Entry đang ghi của NpyCache: .array là memmap (ghi được) trên file tạm trong thư mục cache"""
+
+    def __init__(self, cache, key, shape, dtype=np.float32):
+        cache.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache
+        self.key = key
+        self.tmp_data = cache.cache_dir / f".{key}.{uuid.uuid4().hex}.npy"
+        self.array = np.lib.format.open_memmap(self.tmp_data, mode='w+', dtype=dtype, shape=tuple(shape))
+
+    def commit(self, meta):
+        shape, dtype = list(self.array.shape), str(self.array.dtype)
+        self.array.flush()
+        self.array = None
+        self.cache._publish(self.key, self.tmp_data, dict(meta, shape=shape, dtype=dtype))
+        self.cache.evict(keep=self.key)
+
+    def abort(self):
+        self.array = None
+        self.cache._discard_tmp(self.tmp_data)
+
+
+class DecodedAudioCache(NpyCache):
+    """
+    Cache PCM đã decode, khoá theo (hash nội dung, sample rate, mono/stereo, mức resample)
+
+    Gốc của mọi entry là bản canonical {digest}_frames: float32 (frames, channels) ở sample
+    rate gốc, decode đúng một lần (lúc ingest hoặc lần đọc đầu tiên, xem src/decoder.py).
+    load() trả về layout giống librosa.load: (n,) hoặc (channels, n). Ở sample rate gốc,
+    file một kênh và bản đa kênh chỉ là view của memmap canonical (không copy, không thêm
+    file); downmix mono / resample được tính từ canonical và lưu thành entry riêng,
+    sidecar .json chứa sample rate. Mỗi (sample rate, mức chất lượng) chỉ resample một lần.
+    """
+
+    def __init__(self, cache_dir=DECODED_DIR, max_bytes=MAX_CACHE_BYTES):
+        super().__init__(cache_dir, max_bytes)
+
+    def key(self, digest, sr=None, mono=True, quality=None):
+        rate = "native" if sr is None else str(int(sr))
+        layout = "mono" if mono else "multi"
+        key = f"{digest}_{rate}_{layout}"
+        # Entry "hq" giữ khoá cũ (đã có trên đĩa từ trước khi có mức chất lượng)
+        quality = quality or DEFAULT_RESAMPLE_QUALITY
+        if sr is not None and quality != "hq":
+            key += f"_{quality}"
+        return key
+
+    def frames_key(self, digest):
+        return f"{digest}_frames"
+
+    def frames(self, path, digest=None):
+        """
+        Bản canonical của file (tạo nếu chưa có).
+
+        Returns:
+            (frames, sr): frames là np.memmap float32 read-only (n, channels)
+        """
+        key = self.frames_key(digest or file_digest(path))
+        hit = self._read(key)
+        if hit is None:
+            tmp_data = self.cache_dir / f".{key}.{uuid.uuid4().hex}.npy"
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                sr, n, channels = write_frames(path, tmp_data)
+                self._publish(key, tmp_data, {"sr": sr, "shape": [n, channels], "dtype": "float32"})
+                self.evict(keep=key)
+            except OSError as e:
+                self._discard_tmp(tmp_data)
+                print(f"WARNING audio_cache: could not store {key}: {e}")
+                sr, channels, blocks = open_blocks(path)
+                data = np.concatenate([np.zeros((0, channels), dtype=np.float32)] + list(blocks))
+                return data, int(sr)
+            except BaseException:
+                # Lỗi decode (RuntimeError của soundfile, ffmpeg...): không fallback, chỉ dọn file tạm
+                self._discard_tmp(tmp_data)
+                raise
+            hit = self._read(key)
+            if hit is None:
+                raise OSError(f"decoded cache entry {key} disappeared right after commit")
+        arr, meta = hit
+        return arr, int(meta["sr"])
+
+    def load(self, path, sr=None, mono=True, quality=None):
+        """
+        Tương đương librosa.load(path, sr=sr, mono=mono) nhưng chỉ decode một lần cho mỗi nội dung file.
+        quality: mức resample khi sr khác sample rate gốc ("hq" | "fast", mặc định DEFAULT_RESAMPLE_QUALITY)
+
+        Returns:
+            (y, sr): y là np.memmap float32 read-only, cần .copy() nếu muốn sửa in-place
+        """
+        digest = file_digest(path)
+        frames, native_sr = self.frames(path, digest)
+        if sr is not None and int(sr) == native_sr:
+            sr = None
+        if sr is None and frames.shape[1] == 1:
+            return frames[:, 0], native_sr
+        if sr is None and not mono:
+            return frames.T, native_sr
+
+        def derive():
+            y = frames.T
+            if mono:
+                y = np.mean(y, axis=0)
+            elif y.shape[0] == 1:
+                y = y[0]
+            meta = {"sr": int(sr or native_sr)}
+            if sr is not None:
+                y = resample(y, native_sr, sr, quality)
+                meta["quality"] = quality or DEFAULT_RESAMPLE_QUALITY
+            return np.ascontiguousarray(y, dtype=np.float32), meta
+
+        y, meta = self.get_or_compute(self.key(digest, sr, mono, quality), derive)
+        return y, int(meta["sr"])
+
+    def region(self, path, start=None, end=None, sr=None, mono=True, quality=None):
+        """
+        Đoạn [start, end) giây, layout như load(). Bản ở sample rate sr đã có trong cache thì cắt
+        thẳng entry đó; có bản canonical thì cắt memmap; chưa có thì decoder đọc riêng đoạn đó
+        (seek, MP3 qua seek index) - không decode cả file và không tạo bản canonical.
+        Downmix / resample chỉ làm trên đoạn, không cache.
+
+        Returns:
+            (y, sr): y là mảng float32 trong RAM
+        """
+        digest = file_digest(path)
+        if sr is not None:
+            derived = self.get(self.key(digest, sr, mono, quality))
+            if derived is not None:
+                y, meta = derived
+                a, b = sample_range(start, end, int(meta["sr"]), y.shape[-1])
+                return np.ascontiguousarray(y[..., a:b], dtype=np.float32), int(meta["sr"])
+        hit = self.get(self.frames_key(digest))
+        if hit is not None:
+            frames, meta = hit
+            native_sr = int(meta["sr"])
+            a, b = sample_range(start, end, native_sr, len(frames))
+            data = np.asarray(frames[a:b])
+        else:
+            data, native_sr = read_region(path, start, end, seek_index=get_seek_index(path, digest))
+        y = data.T
+        if mono:
+            y = np.mean(y, axis=0)
+        elif y.shape[0] == 1:
+            y = y[0]
+        if sr is not None and int(sr) != native_sr:
+            y = resample(y, native_sr, sr, quality)
+            native_sr = int(sr)
+        return np.ascontiguousarray(y, dtype=np.float32), native_sr
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = DecodedAudioCache()
+        return _default_cache
+
+
+def set_cache(cache):
+    """Thay decoded cache dùng chung của process (vd. worker batch dùng thư mục riêng)"""
+    global _default_cache
+    with _default_lock:
+        _default_cache = cache
+
+
+def load_audio(path, sr=None, mono=True, quality=None):
+    """Load audio qua cache dùng chung (drop-in cho librosa.load); quality: mức resample ("hq" | "fast")"""
+    return get_cache().load(path, sr=sr, mono=mono, quality=quality)
+
+
+def load_region(path, start=None, end=None, sr=None, mono=True, quality=None):
+    """load_audio cho đoạn [start, end) giây; không có start/end thì là load_audio của cả file"""
+    if start is None and end is None:
+        return load_audio(path, sr=sr, mono=mono, quality=quality)
+    return get_cache().region(path, start, end, sr=sr, mono=mono, quality=quality)
+
+
+_seek_cache = None
+
+
+def get_seek_index(path, digest=None):
+    """
+    Seek index MP3 của file (cache/seek/<hash>, dựng một lần, chỉ đọc header frame),
+    None với định dạng khác. Index rỗng được lưu để lần sau không phải thử lại.
+    """
+    global _seek_cache
+    if Path(path).suffix.lower() != ".mp3":
+        return None
+    with _default_lock:
+        if _seek_cache is None:
+            _seek_cache = NpyCache(SEEK_DIR, MAX_CACHE_BYTES)
+        cache = _seek_cache
+
+    def build():
+        try:
+            index = mp3_seek_index(path)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"DEBUG audio_cache: could not index {path}: {e}")
+            index = None
+        if index is None:
+            return np.zeros(0, dtype=np.uint64), {}
+        return index
+
+    offsets, meta = cache.get_or_compute(digest or file_digest(path), build)
+    return (offsets, meta) if len(offsets) else None
+
+
+def load_frames(path, digest=None):
+    """Bản canonical (memmap (n, channels), sr) qua cache dùng chung, decode nếu chưa có"""
+    return get_cache().frames(path, digest)
@@ -0,0 +1,366 @@
+"""
+Chạy phân tích hàng loạt trên cả thư mục audio (không qua HTTP)
+
+    python -m src.batch <thư mục> [--output results.jsonl] [--stages features,cutoff]
+                        [--workers N] [--timeout 300] [--format jsonl|parquet]
+
+Mỗi file được phân tích trong một process của pool; kết quả ghi dần ra JSONL (một dòng /
+file, flush ngay) hoặc Parquet (mỗi lô một file part-*.parquet, cần pyarrow). Chạy lại cùng
+lệnh sau khi bị crash sẽ bỏ qua các file đã có trong output. Cuối cùng in tóm tắt
+throughput: files/s, audio-seconds/s và thời gian theo từng stage.
+
+Worker batch dùng decoded / STFT cache riêng (mặc định cache/batch, --cache-dir, giới hạn
+BATCH_CACHE_BYTES mỗi loại) để một lượt quét cả catalog không đẩy entry nóng của server ra
+khỏi cache/decoded.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .executor import _warm_worker
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aiff", ".aif"}
+DEFAULT_STAGES = ("features", "cutoff")
+DEFAULT_TIMEOUT = 300
+# Số lần thử một file khi worker process chết giữa chừng
+MAX_ATTEMPTS = 2
+BATCH_CACHE_BYTES = int(os.environ.get("BATCH_CACHE_BYTES", 512 * 1024 ** 2))
+
+
+class FileTimeout(Exception):
+    pass
+
+
+# --- Các stage phân tích (chạy trong worker) ---
+
+def _processor():
+    from .voice_processing import InstrumentVoiceProcessor
+    return InstrumentVoiceProcessor()
+
+
+def _stage_overview(path, options):
+    from .analyzer import analyze_audio_features
+    spectrogram_dir = Path(options.get("spectrogram_dir") or "static/spectrograms")
+    spectrogram_dir.mkdir(parents=True, exist_ok=True)
+    return analyze_audio_features(path, spectrogram_dir)
+
+
+STAGES = {
+    "features": lambda path, options: _processor().extract_acoustic_features(path),
+    "cutoff": lambda path, options: _processor().analyze_cutoff(path),
+    "vad": lambda path, options: _processor().analyze_vad(path),
+    "formants": lambda path, options: _processor().analyze_formants(path),
+    "lpc": lambda path, options: _processor().lpc_analysis(path, mode="frame"),
+    "pitch": lambda path, options: _processor().pitch_tracking(path, algorithm="yin", max_points=1000),
+    "overview": _stage_overview,
+}
+
+
+def _init_worker(cache_dir=None, max_bytes=BATCH_CACHE_BYTES, workers=None):
+    """Initializer của worker batch: import sẵn như pool của server, cache trỏ sang thư mục riêng"""
+    _warm_worker(workers)
+    from .audio_cache import CACHE_ROOT, DecodedAudioCache, NpyCache, set_cache
+    from .features import set_stft_cache
+    root = Path(cache_dir) if cache_dir else CACHE_ROOT / "batch"
+    set_cache(DecodedAudioCache(root / "decoded", max_bytes))
+    set_stft_cache(NpyCache(root / "stft", max_bytes))
+
+
+def _on_alarm(signum, frame):
+    raise FileTimeout()
+
+
+def analyze_file(path, rel_path, stages, timeout=None, options=None):
+    """
+    Phân tích một file qua các stage, trả về bản ghi dạng dict (không bao giờ ném lỗi).
+    timeout dùng SIGALRM nên chỉ có hiệu lực trên Unix; trên Windows chạy không giới hạn.
+    """
+    from .audio_cache import load_audio
+
+    options = options or {}
+    record = {"path": rel_path, "status": "ok", "duration": None, "stage_times": {}, "results": {}, "error": None}
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    t_start = time.perf_counter()
+    stage = "load"
+    try:
+        # Decode một lần vào decoded cache (của batch, xem _init_worker), các stage sau đọc lại qua memmap
+        y, sr = load_audio(path, sr=None, mono=True)
+        record["duration"] = len(y) / sr if sr else 0.0
+        record["stage_times"]["load"] = time.perf_counter() - t_start
+
+        for stage in stages:
+            t0 = time.perf_counter()
+            record["results"][stage] = STAGES[stage](path, options)
+            record["stage_times"][stage] = time.perf_counter() - t0
+    except FileTimeout:
+        record["status"] = "timeout"
+        record["error"] = f"timed out after {timeout}s in stage '{stage}'"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{stage}: {type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    record["elapsed"] = time.perf_counter() - t_start
+    return record
+
+
+# --- Output + checkpoint ---
+
+class JsonlWriter:
+    """Một dòng JSON / file, flush + fsync sau mỗi bản ghi; chính file output là checkpoint"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = None
+
+    def completed(self):
+        if not self.path.exists():
+            return set()
+        done = set()
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            # Dòng cuối bị cắt dở do crash: bỏ đi trước khi ghi tiếp
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+            for line in data[:end].splitlines():
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    continue
+        return done
+
+    def write(self, record):
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps(record, ensure_ascii=False, default=float) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+class ParquetWriter:
+    """
+    Ghi theo lô: mỗi lô rows_per_part bản ghi thành một file part-NNNNN.parquet (ghi tmp rồi rename),
+    nên các part đã có là checkpoint. Kết quả từng stage lưu dạng chuỗi JSON để schema cố định.
+    """
+
+    def __init__(self, path, rows_per_part=256):
+        try:
+            import pyarrow  # noqa: F401 - báo lỗi sớm nếu chưa cài
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow), or use --format jsonl")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.rows_per_part = rows_per_part
+        self._rows = []
+
+    def _parts(self):
+        return sorted(self.path.glob("part-*.parquet"))
+
+    def completed(self):
+        import pyarrow.parquet as pq
+        done = set()
+        for part in self._parts():
+            done.update(pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return done
+
+    def write(self, record):
+        row = dict(record)
+        row["stage_times"] = json.dumps(record["stage_times"])
+        row["results"] = json.dumps(record["results"], ensure_ascii=False, default=float)
+        self._rows.append(row)
+        if len(self._rows) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        index = len(self._parts())
+        final = self.path / f"part-{index:05d}.parquet"
+        tmp = self.path / f".part-{index:05d}.tmp"
+        pq.write_table(pa.Table.from_pylist(self._rows), tmp)
+        os.replace(tmp, final)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+
+def open_writer(output, fmt=None):
+    fmt = fmt or ("parquet" if Path(output).suffix in ("", ".parquet") else "jsonl")
+    if fmt == "parquet":
+        return ParquetWriter(output)
+    return JsonlWriter(output)
+
+
+# --- Runner ---
+
+def find_audio_files(root):
+    root = Path(root)
+    return sorted(p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS)
+
+
+class Throughput:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.stage_totals = {}
+
+    def add(self, record):
+        self.files += 1
+        if record["status"] != "ok":
+            self.failed += 1
+        self.audio_seconds += record.get("duration") or 0.0
+        for stage, seconds in record["stage_times"].items():
+            self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + seconds
+
+    def summary(self):
+        wall = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "wall_seconds": wall,
+            "files_per_second": self.files / wall,
+            "audio_seconds": self.audio_seconds,
+            "audio_seconds_per_second": self.audio_seconds / wall,
+            "stage_seconds": self.stage_totals,
+        }
+
+
+def run_batch(root, output, stages=DEFAULT_STAGES, workers=None, timeout=DEFAULT_TIMEOUT,
+              fmt=None, options=None, log_every=50, cache_dir=None, cache_bytes=BATCH_CACHE_BYTES):
+    """
+    Phân tích mọi file audio dưới root, bỏ qua file đã có trong output. Trả về dict tóm tắt.
+    cache_dir: thư mục decoded / STFT cache của worker (mặc định cache/batch, không dùng chung với server)
+    """
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+
+    root = Path(root)
+    writer = open_writer(output, fmt)
+    done = writer.completed()
+    files = [p for p in find_audio_files(root) if p.relative_to(root).as_posix() not in done]
+    print(f"Batch: {len(files)} file(s) to analyze, {len(done)} already done, stages={','.join(stages)}")
+
+    stats = Throughput()
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    queue = deque(p.relative_to(root).as_posix() for p in files)
+    attempts = {}
+    in_flight = {}
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir, cache_bytes, workers))
+
+    executor = new_executor()
+
+    def record_result(record):
+        writer.write(record)
+        stats.add(record)
+        if log_every and stats.files % log_every == 0:
+            s = stats.summary()
+            print(f"  {s['files']} done ({s['failed']} failed), {s['files_per_second']:.2f} files/s, "
+                  f"{s['audio_seconds_per_second']:.1f} audio-s/s")
+
+    try:
+        while queue or in_flight:
+            # Chỉ giữ ~2 file / worker trong hàng đợi để không tạo hàng chục nghìn future
+            while queue and len(in_flight) < workers * 2:
+                rel = queue.popleft()
+                future = executor.submit(analyze_file, str(root / rel), rel, tuple(stages), timeout, options)
+                in_flight[future] = rel
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = []
+            for future in finished:
+                rel = in_flight.pop(future)
+                try:
+                    record_result(future.result())
+                except BrokenProcessPool:
+                    broken.append(rel)
+            if not broken:
+                continue
+
+            # Một worker chết (OOM, segfault trong decoder...) kéo theo mọi file đang chạy:
+            # dựng lại pool và thử lại các file đó, quá MAX_ATTEMPTS thì ghi lỗi
+            broken.extend(in_flight.values())
+            in_flight.clear()
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = new_executor()
+            for rel in broken:
+                attempts[rel] = attempts.get(rel, 0) + 1
+                if attempts[rel] < MAX_ATTEMPTS:
+                    queue.appendleft(rel)
+                else:
+                    record_result({"path": rel, "status": "error", "duration": None, "stage_times": {},
+                                   "results": {}, "error": "worker process died", "elapsed": None})
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+    return stats.summary()
+
+
+def _print_summary(summary):
+    print("--- Batch summary ---")
+    print(f"Files:        {summary['files']} ({summary['failed']} failed)")
+    print(f"Wall time:    {summary['wall_seconds']:.1f}s")
+    print(f"Throughput:   {summary['files_per_second']:.2f} files/s, "
+          f"{summary['audio_seconds_per_second']:.1f} audio-seconds/s")
+    for stage, seconds in summary["stage_seconds"].items():
+        print(f"  {stage:<10} {seconds:9.1f}s total, {seconds / max(summary['files'], 1):7.3f}s / file")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch audio analysis over a directory")
+    parser.add_argument("root", help="Thư mục chứa file audio (quét đệ quy)")
+    parser.add_argument("--output", "-o", default="batch_results.jsonl",
+                        help="File .jsonl, hoặc thư mục / .parquet cho output Parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=None)
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES),
+                        help=f"Danh sách stage, chọn trong: {','.join(STAGES)}")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Giây / file (0 = không giới hạn)")
+    parser.add_argument("--spectrogram-dir", default=None, help="Nơi lưu PNG của stage 'overview'")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Decoded / STFT cache của batch (mặc định cache/batch, tách khỏi cache của server)")
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    try:
+        summary = run_batch(args.root, args.output, stages=stages, workers=args.workers,
+                            timeout=args.timeout or None, fmt=args.format,
+                            options={"spectrogram_dir": args.spectrogram_dir}, cache_dir=args.cache_dir)
+    except (ValueError, ImportError) as e:
+        print(f"ERROR: {e}")
+        return 2
+    _print_summary(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
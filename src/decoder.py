@@ -0,0 +1,364 @@
+"""
+Decode audio theo block + ghi định dạng canonical đọc nhanh
+
+Backend được chọn theo thứ tự:
+- soundfile: WAV/FLAC/OGG, MP3 với libsndfile >= 1.1 (đọc thẳng, seek được)
+- pipe f32le từ ffmpeg: định dạng libsndfile không đọc được (M4A/AAC/WMA...), sample rate
+  và số kênh gốc lấy từ ffprobe
+- librosa (audioread): khi không có ffmpeg/ffprobe trong PATH
+
+Định dạng canonical là file .npy float32 (frames, channels) ở sample rate gốc: header
+128 byte + frame xen kẽ, np.load(mmap_mode='r') là đọc được, không decode lại, seek tức thì.
+Số frame chỉ biết khi decode xong (MP3, pipe) nên header được ghi lại ở cuối; header .npy
+của mảng 2 chiều float32 luôn dài đúng 128 byte nên dữ liệu không phải dời.
+
+read_region() chỉ decode đoạn [start, end): soundfile seek, ffmpeg -ss, hoặc với MP3 có seek
+index (mp3_seek_index: byte offset của từng frame MPEG) thì chỉ đưa vào decoder các frame
+chứa đoạn đó cộng vài frame mồi (bit reservoir + overlap của MDCT), không phải quét từ đầu file.
+"""
+
+import io
+import json
+import shutil
+import subprocess
+
+import numpy as np
+import soundfile as sf
+
+BLOCK_SIZE = 65536
+NPY_HEADER_BYTES = 128
+
+# MPEG audio Layer III: bitrate (kbps) theo chỉ số, sample rate theo bit version
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG-1
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),      # MPEG-2 / 2.5
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+MP3_DECODER_DELAY = 529   # mẫu trễ của decoder mà mpg123 bỏ đi khi có thông tin gapless
+MP3_GRANULE = 576         # mẫu mỗi granule (MPEG-1: 2 granule/frame, MPEG-2/2.5: 1)
+MP3_PRIME_GRANULES = 6    # granule mồi tối thiểu trước đoạn cần đọc (reservoir + overlap MDCT + delay)
+MP3_TAIL_FRAMES = 2
+MP3_TOLERANCE = 1e-6
+
+
+def _soundfile_blocks(path, blocksize, start=None, end=None):
+    f = sf.SoundFile(str(path))  # RuntimeError nếu libsndfile không đọc được
+    a, b = sample_range(start, end, f.samplerate, f.frames)
+
+    def gen():
+        with f:
+            if a:
+                f.seek(a)
+            pos = a
+            while pos < b:
+                block = f.read(min(blocksize, b - pos), dtype='float32', always_2d=True)
+                if not len(block):
+                    break
+                pos += len(block)
+                yield block
+
+    return f.samplerate, f.channels, gen()
+
+
+def probe(path):
+    """(sample rate, số kênh) của audio stream đầu tiên qua ffprobe, None nếu không probe được"""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        return None
+    try:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=sample_rate,channels", "-of", "json", str(path)],
+            capture_output=True, check=True, timeout=30,
+        ).stdout
+        stream = json.loads(out)["streams"][0]
+        return int(stream["sample_rate"]), int(stream["channels"])
+    except (subprocess.SubprocessError, OSError, ValueError, KeyError, IndexError):
+        return None
+
+
+def _ffmpeg_cmd(ffmpeg, path, start=None, end=None):
+    cmd = [ffmpeg, "-nostdin", "-v", "error"]
+    if start:
+        cmd += ["-ss", f"{float(start):.6f}"]
+    cmd += ["-i", str(path), "-map", "0:a:0"]
+    if end is not None:
+        cmd += ["-t", f"{max(0.0, float(end) - float(start or 0.0)):.6f}"]
+    return cmd
+
+
+def _ffmpeg_blocks(path, blocksize, start=None, end=None):
+    ffmpeg = shutil.which("ffmpeg")
+    info = probe(path) if ffmpeg is not None else None
+    if info is None:
+        return None
+    sr, channels = info
+
+    def gen():
+        proc = subprocess.Popen(
+            _ffmpeg_cmd(ffmpeg, path, start, end) + ["-ac", str(channels), "-ar", str(sr), "-f", "f32le", "-"],
+            stdout=subprocess.PIPE,
+        )
+        try:
+            frame_bytes = 4 * channels
+            nbytes = blocksize * frame_bytes
+            pending = b""
+            while True:
+                chunk = proc.stdout.read(nbytes)
+                if not chunk:
+                    break
+                chunk = pending + chunk
+                usable = len(chunk) - len(chunk) % frame_bytes
+                pending = chunk[usable:]
+                yield np.frombuffer(chunk[:usable], dtype='<f4').reshape(-1, channels)
+            if proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg could not decode {path}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+
+    return sr, channels, gen()
+
+
+def _librosa_blocks(path, blocksize, start=None, end=None):
+    import librosa
+
+    offset = max(0.0, float(start or 0.0))
+    duration = None if end is None else max(0.0, float(end) - offset)
+    y, sr = librosa.load(str(path), sr=None, mono=False, offset=offset, duration=duration)
+    frames = np.ascontiguousarray(np.atleast_2d(y).T, dtype=np.float32)
+
+    def gen():
+        for start in range(0, len(frames), blocksize):
+            yield frames[start:start + blocksize]
+
+    return int(sr), frames.shape[1], gen()
+
+
+def open_blocks(path, blocksize=BLOCK_SIZE, start=None, end=None):
+    """
+    Mở file để decode theo block ở sample rate và số kênh gốc.
+    start, end (giây): chỉ đoạn [start, end) - soundfile seek / ffmpeg -ss rồi vẫn đọc theo block
+    (bộ nhớ cố định); riêng fallback librosa đọc cả đoạn một lần.
+
+    Returns:
+        (sr, channels, generator các block (n, channels) float32)
+    """
+    try:
+        return _soundfile_blocks(path, blocksize, start, end)
+    except RuntimeError:
+        pass
+    piped = _ffmpeg_blocks(path, blocksize, start, end)
+    if piped is not None:
+        return piped
+    print(f"DEBUG decoder: no soundfile/ffmpeg decoder for {path}, falling back to librosa")
+    return _librosa_blocks(path, blocksize, start, end)
+
+
+def _write_npy_header(f, frames, channels):
+    f.seek(0)
+    np.lib.format.write_array_header_1_0(
+        f, {"descr": "<f4", "fortran_order": False, "shape": (int(frames), int(channels))})
+    if f.tell() != NPY_HEADER_BYTES:
+        raise ValueError(f"Unexpected .npy header size {f.tell()}")
+
+
+def write_frames(path, dest, blocksize=BLOCK_SIZE):
+    """
+    Decode path một lượt theo block vào dest (.npy float32 (frames, channels)).
+
+    Returns:
+        (sr, frames, channels)
+    """
+    sr, channels, blocks = open_blocks(path, blocksize)
+    frames = 0
+    with open(dest, "wb") as f:
+        _write_npy_header(f, 0, channels)
+        for block in blocks:
+            f.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+            frames += len(block)
+        _write_npy_header(f, frames, channels)
+    return int(sr), frames, channels
+
+
+def sample_range(start, end, sr, n):
+    """[a, b) mẫu của đoạn [start, end) giây, kẹp trong [0, n]; None = từ đầu / tới hết"""
+    a = 0 if start is None else int(round(max(0.0, float(start)) * sr))
+    b = n if end is None else int(round(max(0.0, float(end)) * sr))
+    a = min(a, n)
+    return a, max(a, min(b, n))
+
+
+def _mp3_header(h):
+    """(version, frame bytes, samples/frame, sample rate, channels) của header 32 bit, None nếu không phải Layer III"""
+    if (h >> 21) & 0x7FF != 0x7FF:
+        return None
+    version, layer = (h >> 19) & 3, (h >> 17) & 3
+    bitrate_idx, rate_idx, padding = (h >> 12) & 15, (h >> 10) & 3, (h >> 9) & 1
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    sr = MP3_SAMPLE_RATES[version][rate_idx]
+    bitrate = MP3_BITRATES[1 if version == 3 else 2][bitrate_idx] * 1000
+    spf = 1152 if version == 3 else 576
+    size = spf // 8 * bitrate // sr + padding
+    channels = 1 if (h >> 6) & 3 == 3 else 2
+    return version, size, spf, sr, channels
+
+
+def _id3v2_size(head):
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def _mp3_gapless(frame, version, channels):
+    """(có frame Xing/Info không, số mẫu mpg123 bỏ ở đầu) từ frame đầu tiên"""
+    side_info = (32 if channels == 2 else 17) if version == 3 else (17 if channels == 2 else 9)
+    pos = 4 + side_info
+    tag = frame[pos:pos + 4]
+    if tag not in (b"Xing", b"Info"):
+        return False, 0
+    flags = int.from_bytes(frame[pos + 4:pos + 8], "big")
+    lame = pos + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+    delay_bytes = frame[lame + 21:lame + 24]
+    if len(delay_bytes) < 3 or not frame[lame:lame + 4].strip(b"\0"):
+        return True, 0
+    enc_delay = (delay_bytes[0] << 4) | (delay_bytes[1] >> 4)
+    return True, enc_delay + MP3_DECODER_DELAY
+
+
+def mp3_seek_index(path):
+    """
+    Seek index của file MP3: byte offset của từng frame MPEG (chỉ đọc header, nhảy qua phần
+    dữ liệu) + thông tin để đổi chỉ số mẫu sang frame.
+
+    Returns:
+        (offsets uint64 (n_frames + 1,) - phần tử cuối là byte kết thúc frame cuối, meta) hoặc None
+    """
+    offsets = []
+    with open(path, "rb") as f:
+        pos = _id3v2_size(f.read(10))
+        f.seek(pos)
+        head = f.read(4)
+        first = _mp3_header(int.from_bytes(head, "big")) if len(head) == 4 else None
+        if first is None:
+            return None
+        version, _, spf, sr, channels = first
+        while len(head) == 4:
+            info = _mp3_header(int.from_bytes(head, "big"))
+            if info is None or info[0] != version or info[3] != sr:
+                break  # tag cuối file (ID3v1/APE) hoặc dữ liệu hỏng
+            offsets.append(pos)
+            pos += info[1]
+            f.seek(pos)
+            head = f.read(4)
+        if not offsets:
+            return None
+        offsets.append(pos)
+        f.seek(offsets[0])
+        has_info, skip = _mp3_gapless(f.read(offsets[1] - offsets[0]), version, channels)
+    meta = {"sample_rate": sr, "channels": channels, "samples_per_frame": spf,
+            "first_frame": int(has_info), "skip": skip,
+            "reservoir": 511 if version == 3 else 255}
+    offsets = np.asarray(offsets, dtype=np.uint64)
+    if not _verify_mp3_index(path, offsets, meta):
+        print(f"DEBUG decoder: MP3 seek index of {path} does not match libsndfile, not using it")
+        return None
+    return offsets, meta
+
+
+def _verify_mp3_index(path, offsets, meta):
+    """Đối chiếu vài frame (1/4, 1/2, 3/4 file) với soundfile seek (encoder lạ có thể ghi gapless khác)"""
+    spf = meta["samples_per_frame"]
+    with sf.SoundFile(str(path)) as f:
+        for q in (1, 2, 3):
+            a = min((len(offsets) * q // 4) * spf, max(0, f.frames - spf))
+            f.seek(a)
+            expected = f.read(spf, dtype='float32', always_2d=True)
+            if len(expected) == 0:
+                return False
+            got = read_mp3_region(path, offsets, meta, a, a + len(expected))
+            # Quá gần đầu file để kiểm tra: bỏ qua (read_mp3_region sẽ nhường cho soundfile seek)
+            if got is not None and not np.allclose(got, expected, rtol=0, atol=MP3_TOLERANCE):
+                return False
+    return True
+
+
+def read_mp3_region(path, offsets, meta, a, b):
+    """
+    Mẫu [a, b) (chỉ số trong bản decode đầy đủ) chỉ từ các frame cần thiết, None nếu đoạn quá
+    gần đầu file (soundfile seek ở đó đã rẻ) hoặc decoder trả thiếu mẫu. Khớp bản decode đầy đủ
+    tới sai số làm tròn float32 (~1e-7, filterbank tổng hợp của mpg123 bắt đầu ở pha khác).
+    """
+    spf, first, skip = meta["samples_per_frame"], meta["first_frame"], meta["skip"]
+    n_frames = len(offsets) - 1
+    granules = spf // MP3_GRANULE
+    target = first + (a + skip) // spf
+    # Các frame mồi phải decode sạch (IMDCT overlap + filterbank), nên bit reservoir được tính
+    # trước frame mồi đầu tiên: lùi thêm cho tới khi đủ số byte main_data_begin tối đa
+    prime = target - -(-MP3_PRIME_GRANULES // granules)
+    k = prime - 1
+    while k > first and int(offsets[prime]) - int(offsets[k]) < meta["reservoir"]:
+        k -= 1
+    if k <= first:
+        return None
+    last = min(n_frames, first + -(-(b + skip) // spf) + MP3_TAIL_FRAMES)
+    with open(path, "rb") as f:
+        f.seek(int(offsets[k]))
+        chunk = f.read(int(offsets[last]) - int(offsets[k]))
+    data, _ = sf.read(io.BytesIO(chunk), dtype='float32', always_2d=True)
+    # Mẫu j của đoạn decode ứng với mẫu (k - first) * spf + j - skip của bản đầy đủ
+    lo = a + skip - (k - first) * spf
+    if lo < MP3_PRIME_GRANULES * MP3_GRANULE or lo + (b - a) > len(data):
+        return None
+    return data[lo:lo + b - a]
+
+
+def _ffmpeg_region(path, start, end):
+    ffmpeg = shutil.which("ffmpeg")
+    info = probe(path) if ffmpeg is not None else None
+    if info is None:
+        return None
+    sr, channels = info
+    out = subprocess.run(_ffmpeg_cmd(ffmpeg, path, start, end) + ["-ac", str(channels), "-ar", str(sr), "-f", "f32le", "-"],
+                         capture_output=True, check=True).stdout
+    usable = len(out) - len(out) % (4 * channels)
+    return np.frombuffer(out[:usable], dtype='<f4').reshape(-1, channels), sr
+
+
+def read_region(path, start=None, end=None, seek_index=None):
+    """
+    Chỉ decode đoạn [start, end) giây ở sample rate và số kênh gốc.
+
+    Args:
+        seek_index: kết quả mp3_seek_index(path) nếu có (đọc MP3 không phải quét từ đầu file)
+
+    Returns:
+        (frames (n, channels) float32, sr)
+    """
+    try:
+        f = sf.SoundFile(str(path))
+    except RuntimeError:
+        f = None
+    if f is not None:
+        with f:
+            sr = f.samplerate
+            a, b = sample_range(start, end, sr, f.frames)
+            if seek_index is not None and b > a:
+                data = read_mp3_region(path, *seek_index, a, b)
+                if data is not None:
+                    return data, sr
+            f.seek(a)
+            return f.read(b - a, dtype='float32', always_2d=True), sr
+
+    piped = _ffmpeg_region(path, start, end)
+    if piped is not None:
+        return piped
+
+    import librosa
+    offset = max(0.0, float(start or 0.0))
+    duration = None if end is None else max(0.0, float(end) - offset)
+    y, sr = librosa.load(str(path), sr=None, mono=False, offset=offset, duration=duration)
+    return np.ascontiguousarray(np.atleast_2d(y).T, dtype=np.float32), int(sr)
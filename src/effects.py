@@ -1,124 +1,673 @@
-import librosa
 import numpy as np
+import scipy.ndimage
 import scipy.signal
 from pathlib import Path
 import soundfile as sf
 import os
+import json
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def apply_audio_effects(stems_data, output_path):
-    print(f"--- Starting Render Mix ({len(stems_data)} tracks) ---")
-    master_audio = None
-    master_sr = 44100 # Default
+from . import executor, vocoder
+from .audio_cache import load_audio, file_digest, CACHE_ROOT, NpyCache
 
-    root_dir = Path(os.getcwd())
+# Số frame mỗi block khi stream mixdown; bộ nhớ đỉnh tỉ lệ với block, không phụ thuộc độ dài track
+BLOCK_SIZE = int(os.environ.get("MIX_BLOCK_SIZE", 65536))
+RENDER_DIR = CACHE_ROOT / "render"
+# Cache output của từng stage trong chuỗi hiệu ứng (memmap .npy, LRU theo ngân sách dung lượng):
+# đổi một tham số chỉ tính lại các stage phía sau nó, đổi volume/pan chỉ cộng lại master bus
+EFFECT_CACHE_DIR = CACHE_ROOT / "effects"
+EFFECT_CACHE_BYTES = int(os.environ.get("EFFECT_CACHE_BYTES", 1024 ** 3))
+EFFECT_CACHE_VERSION = 1  # tăng khi thuật toán của một stage thay đổi output
+# Mix stream: block nhỏ để audio đầu tiên ra sớm, limiter thay cho chuẩn hoá theo peak cả mix
+STREAM_BLOCK_SIZE = int(os.environ.get("MIX_STREAM_BLOCK_SIZE", 4096))
+LIMITER_CEILING = 0.95
+LIMITER_LOOKAHEAD = 0.005  # giây
+LIMITER_RELEASE = 0.05     # giây giữ gain trước khi hồi
+# Số worker render track song song khi gọi trực tiếp apply_audio_effects
+MIX_WORKERS = int(os.environ.get("MIX_WORKERS", os.cpu_count() or 1))
 
-    for i, stem in enumerate(stems_data):
-        raw_url = stem.get('url', '')
-        if not raw_url:
-            print(f"Track {i}: No URL provided, skipping.")
-            continue
-            
-        # Fix path
-        rel_path = raw_url.lstrip('/')
-        file_path = root_dir / rel_path
-        
-        print(f"Track {i}: Loading {file_path}")
-        if not file_path.exists():
-            print(f"ERROR: File NOT FOUND at {file_path}")
+
+# --- Nguồn audio theo block ---
+
+class _ArraySource:
+    """Đọc theo block từ mảng (channels, n) - memmap từ decoded cache hoặc cache stage"""
+
+    def __init__(self, y, sr, path=None):
+        self._y = y if y.ndim > 1 else y[np.newaxis, :]
+        # File .npy phía sau (memmap) nếu có - worker trả path này thay vì cả mảng
+        self.path = path or getattr(y, "filename", None)
+        self.samplerate = sr
+        self.frames = self._y.shape[1]
+        self._pos = 0
+
+    def read(self, n):
+        block = np.asarray(self._y[:, self._pos:self._pos + n], dtype=np.float32)
+        self._pos += block.shape[1]
+        return _to_stereo(block)
+
+    def close(self):
+        self._y = None
+
+
+def _to_stereo(block):
+    if block.shape[0] == 1:
+        return np.vstack((block, block))
+    return block[:2]
+
+
+def _open_source(file_path, target_sr=None):
+    """
+    Mở stem để đọc theo block: memmap bản canonical của decoded cache (view, không copy),
+    hoặc bản resample về sample rate của master (cũng là memmap, không giữ trong RAM).
+    """
+    y, sr = load_audio(file_path, sr=target_sr, mono=False)
+    return _ArraySource(y, sr)
+
+
+# --- Các hiệu ứng có trạng thái giữa các block ---
+
+class _Distortion:
+    def __init__(self, amount):
+        self.drive = 1 + amount * 5
+
+    def process(self, x):
+        return np.tanh(x * self.drive)
+
+
+class _FeedforwardDelay:
+    """y[n] = x[n] + gain * x[n - delay]; delay line giữ `delay` mẫu cuối giữa các block"""
+
+    def __init__(self, delay, gain, channels=2):
+        self.delay = int(delay)
+        self.gain = gain
+        self._history = np.zeros((channels, self.delay), dtype=np.float32)
+
+    def process(self, x):
+        if self.delay <= 0:
+            return x * (1 + self.gain)
+        buf = np.concatenate((self._history, x), axis=1)
+        delayed = buf[:, :x.shape[1]]
+        self._history = buf[:, buf.shape[1] - self.delay:]
+        return x + delayed * self.gain
+
+
+class _ButterFilter:
+    """
+    Butterworth bậc 4 dạng SOS với trạng thái zi giữ qua các block.
+    Áp dụng hai lần để có cùng đáp ứng biên độ với filtfilt (|H|^2), nhưng causal.
+    """
+
+    def __init__(self, cutoff, btype, sr, channels=2):
+        sos = scipy.signal.butter(4, cutoff, btype=btype, fs=sr, output='sos')
+        self.sos = np.vstack((sos, sos))
+        self._zi = np.zeros((self.sos.shape[0], channels, 2))
+
+    def process(self, x):
+        y, self._zi = scipy.signal.sosfilt(self.sos, x, axis=-1, zi=self._zi)
+        return y.astype(np.float32)
+
+
+class _Gain:
+    def __init__(self, left, right):
+        self.gains = np.array([[left], [right]], dtype=np.float32)
+
+    def process(self, x):
+        return x * self.gains
+
+
+class _LookaheadLimiter:
+    """
+    Limiter look-ahead cho master bus khi stream (không biết trước peak của cả mix để chuẩn hoá).
+
+    Gain cần thiết r[n] = min(1, ceiling / peak[n]) -> giữ min trong `hold` mẫu gần nhất ->
+    trung bình trượt `lookahead` mẫu; audio bị trễ lookahead - 1 mẫu nên gain đã hạ đủ trước khi
+    đỉnh tới (|output| <= ceiling) và hồi lại tuyến tính sau hold. Trạng thái giữ qua các block
+    nên kết quả không phụ thuộc cách chia block; finish() xả phần audio còn trễ.
+    """
+
+    def __init__(self, sr, ceiling=LIMITER_CEILING, lookahead=LIMITER_LOOKAHEAD, release=LIMITER_RELEASE,
+                 channels=2):
+        self.ceiling = float(ceiling)
+        self.lookahead = max(1, int(sr * lookahead))
+        self.hold = self.lookahead + int(sr * release)
+        self.delay = self.lookahead - 1
+        self._req = np.ones(self.hold - 1, dtype=np.float32)
+        self._held = np.ones(self.lookahead - 1, dtype=np.float32)
+        self._audio = np.zeros((channels, self.delay), dtype=np.float32)
+        self._skip = self.delay  # bỏ phần trễ ở đầu để output thẳng hàng với input
+
+    def process(self, x):
+        n = x.shape[1]
+        peak = np.max(np.abs(x), axis=0)
+        req = np.minimum(1.0, self.ceiling / np.maximum(peak, 1e-12)).astype(np.float32)
+
+        # min của r trên cửa sổ [n - hold + 1, n]
+        buf = np.concatenate((self._req, req))
+        held = scipy.ndimage.minimum_filter1d(buf, self.hold, mode='nearest')[self.hold // 2:self.hold // 2 + n]
+        self._req = buf[n:]
+
+        # Trung bình trượt lookahead mẫu (cumsum float64 để không trôi số)
+        hbuf = np.concatenate((self._held, held))
+        csum = np.concatenate(([0.0], np.cumsum(hbuf, dtype=np.float64)))
+        gain = ((csum[self.lookahead:] - csum[:-self.lookahead]) / self.lookahead).astype(np.float32)
+        self._held = hbuf[n:]
+
+        audio = np.concatenate((self._audio, x), axis=1)
+        self._audio = audio[:, n:]
+        out = audio[:, :n] * gain
+        skip = min(self._skip, n)
+        self._skip -= skip
+        return out[:, skip:]
+
+    def finish(self):
+        """Xả `delay` mẫu cuối còn nằm trong đường trễ"""
+        if self.delay == 0:
+            return np.zeros((self._audio.shape[0], 0), dtype=np.float32)
+        return self.process(np.zeros_like(self._audio))
+
+
+def _stage_specs(stem):
+    """
+    Các stage trước volume/pan theo đúng thứ tự render cũ. Mỗi spec là (tên, tham số...) đã
+    chuẩn hoá (stage tắt thì không có mặt) và là một phần của khoá cache.
+    """
+    specs = []
+
+    # 1-2. Speed + Pitch (cần cả track, không stream được)
+    speed = float(stem.get('speed', 1.0))
+    pitch = float(stem.get('pitch', 0))
+    if abs(speed - 1.0) > 0.01 or abs(pitch) > 0.1:
+        specs.append(("time_pitch", speed if abs(speed - 1.0) > 0.01 else 1.0,
+                      pitch if abs(pitch) > 0.1 else 0.0, stem.get('time_pitch_mode', 'phase')))
+
+    # 3. Distortion
+    dist = float(stem.get('distortion', 0))
+    if dist > 0.01:
+        specs.append(("distortion", dist))
+
+    # 4. Echo
+    echo = float(stem.get('echo', 0))
+    if echo > 0.01:
+        specs.append(("echo", echo))
+
+    # 5. Filters
+    lpf = float(stem.get('lpf', 20000))
+    if lpf < 19500:
+        specs.append(("lpf", lpf))
+
+    hpf = float(stem.get('hpf', 20))
+    if hpf > 30:
+        specs.append(("hpf", hpf))
+
+    # 6. Reverb
+    reverb = float(stem.get('reverb', 0))
+    if reverb > 0.01:
+        specs.append(("reverb", reverb))
+    return specs
+
+
+def _make_effect(spec, sr):
+    """Hiệu ứng stream được (có trạng thái giữa các block) cho một spec"""
+    name, value = spec
+    print(f"  Effect: {name} {value}")
+    if name == "distortion":
+        return _Distortion(value)
+    if name == "echo":
+        return _FeedforwardDelay(int(sr * 0.3), 0.5 * value)
+    if name == "lpf":
+        return _ButterFilter(min(value, sr/2-1), 'low', sr)
+    if name == "hpf":
+        return _ButterFilter(min(value, sr/2-1), 'high', sr)
+    if name == "reverb":
+        return _FeedforwardDelay(int(sr * 0.05), 0.4 * value)
+    raise ValueError(f"Unknown effect stage '{name}'")
+
+
+def _track_gains(stem):
+    """7. Volume & Pan -> (gain trái, gain phải), áp dụng lúc cộng vào master bus"""
+    vol = float(stem.get('volume', 1.0))
+    pan = float(stem.get('pan', 0.0))
+    return vol * (1.0 - max(0, pan)), vol * (1.0 - max(0, -pan))
+
+
+# --- Cache từng stage của chuỗi hiệu ứng ---
+
+_effect_cache = None
+_effect_cache_lock = threading.Lock()
+
+
+def get_effect_cache():
+    global _effect_cache
+    with _effect_cache_lock:
+        if _effect_cache is None:
+            _effect_cache = NpyCache(EFFECT_CACHE_DIR, EFFECT_CACHE_BYTES)
+        return _effect_cache
+
+
+def _stage_key(digest, sr, specs):
+    """Khoá của output sau stage cuối trong specs: (hash stem, sr, toàn bộ tham số từ đầu chuỗi)"""
+    payload = json.dumps([EFFECT_CACHE_VERSION, digest, int(sr), specs], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:40]
+
+
+def _time_pitch(file_path, sr, speed, pitch, mode):
+    y, sr = load_audio(file_path, sr=sr, mono=False)
+    print(f"  Effect: Speed {speed}x, Pitch {pitch} semitones ({mode})")
+    # Speed + pitch trong một lượt, stereo dùng chung pha (không resample riêng sau stretch)
+    y = vocoder.time_pitch(y, sr, speed=speed, semitones=pitch, mode=mode)
+    return _to_stereo(y), {"sr": int(sr)}
+
+
+def _stream_stages(cache, source, specs, keys, block_size):
+    """
+    Chạy source qua các stage stream được, ghi output của từng stage vào cache trong cùng một
+    lượt đọc theo block. Trả về memmap output của stage cuối - giữ chính mapping đã ghi (không
+    mở lại theo tên), nên vẫn đọc được dù process khác evict entry ngay sau commit.
+    """
+    sr = source.samplerate
+    effects = [_make_effect(spec, sr) for spec in specs]
+    pending = []
+    try:
+        for key in keys:
+            pending.append(cache.create(key, (2, source.frames)))
+        for start in range(0, source.frames, block_size):
+            block = source.read(min(block_size, source.frames - start))
+            for effect, entry in zip(effects, pending):
+                block = effect.process(block)
+                entry.array[:, start:start + block.shape[1]] = block
+        result = pending[-1].array
+        for entry in pending:
+            entry.commit({"sr": int(sr)})
+    except BaseException:
+        for entry in pending:
+            entry.abort()
+        raise
+    return result
+
+
+def _render_stages(file_path, stem, master_sr, block_size=BLOCK_SIZE, live=False):
+    """
+    Output trước volume/pan của một track: source (không có stage nào), hoặc memmap trong
+    cache stage. Chỉ các stage sau prefix dài nhất đã có trong cache mới được tính lại.
+
+    live=True (mix stream): các stage stream được chưa có trong cache không ghi vào cache mà
+    trả về dưới dạng chuỗi hiệu ứng chạy theo từng block lúc đọc.
+
+    Returns:
+        (source, chain)
+    """
+    specs = _stage_specs(stem)
+    if not specs:
+        return _open_source(file_path, master_sr), []
+
+    cache = get_effect_cache()
+    sr = master_sr or _native_samplerate(file_path)
+    digest = file_digest(file_path)
+    keys = [_stage_key(digest, sr, specs[:k + 1]) for k in range(len(specs))]
+
+    done, y = 0, None
+    for k in range(len(specs), 0, -1):
+        hit = cache.get(keys[k - 1])
+        if hit is not None:
+            done, y = k, hit[0]
+            break
+    print(f"  Effect cache: {done}/{len(specs)} stages reused")
+
+    if done == 0 and specs[0][0] == "time_pitch":
+        _, speed, pitch, mode = specs[0]
+        y, _ = cache.get_or_compute(keys[0], lambda: _time_pitch(file_path, sr, speed, pitch, mode))
+        done = 1
+    if done == len(specs):
+        return _ArraySource(y, sr), []
+
+    source = _ArraySource(y, sr) if y is not None else _open_source(file_path, sr)
+    if live:
+        return source, [_make_effect(spec, sr) for spec in specs[done:]]
+    try:
+        y = _stream_stages(cache, source, specs[done:], keys[done:], block_size)
+    finally:
+        source.close()
+    return _ArraySource(y, sr, path=cache.data_path(keys[-1])), []
+
+
+def _native_samplerate(file_path):
+    try:
+        return sf.info(str(file_path)).samplerate
+    except RuntimeError:
+        return load_audio(file_path, sr=None, mono=False)[1]
+
+
+class _Track:
+    def __init__(self, index, source, chain):
+        self.index = index
+        self.source = source
+        self.chain = chain
+        self.frames = source.frames
+
+    def read(self, n):
+        block = self.source.read(n)
+        for effect in self.chain:
+            block = effect.process(block)
+        return block
+
+    def close(self):
+        self.source.close()
+
+
+def _open_track(i, stem, root_dir, master_sr, block_size=BLOCK_SIZE, live=False):
+    """Track = output trước volume/pan (qua cache stage) + gain áp dụng lúc cộng"""
+    raw_url = stem.get('url', '')
+    if not raw_url:
+        print(f"Track {i}: No URL provided, skipping.")
+        return None
+
+    # Fix path
+    rel_path = raw_url.lstrip('/')
+    file_path = root_dir / rel_path
+
+    print(f"Track {i}: Loading {file_path}")
+    if not file_path.exists():
+        print(f"ERROR: File NOT FOUND at {file_path}")
+        return None
+
+    try:
+        source, chain = _render_stages(file_path, stem, master_sr, block_size, live)
+        print(f"  Opened successfully. Duration: {source.frames/source.samplerate:.2f}s, SR: {source.samplerate}")
+    except OSError:
+        # Lỗi đĩa / cache stage: báo lỗi cả mix, không bỏ track trong im lặng
+        raise
+    except Exception as e:
+        print(f"ERROR: Failed to load {file_path}: {e}")
+        return None
+
+    return _Track(i, source, chain + [_Gain(*_track_gains(stem))])
+
+
+def master_samplerate(stems_data, root_dir=None):
+    """Sample rate của master = sample rate gốc của track hợp lệ đầu tiên (None nếu không có)"""
+    root_dir = Path(root_dir or os.getcwd())
+    for stem in stems_data:
+        file_path = root_dir / stem.get('url', '').lstrip('/')
+        if not stem.get('url') or not file_path.exists():
             continue
+        try:
+            return sf.info(str(file_path)).samplerate
+        except RuntimeError:
+            try:
+                return load_audio(file_path, sr=None, mono=False)[1]
+            except Exception:
+                continue
+    return None
+
+
+def _private_render(source):
+    """
+    File .npy riêng trong RENDER_DIR cho output của track: link cứng tới entry cache stage (không
+    copy), nên render của track khác có evict entry đó thì mix_rendered vẫn mở được file này.
+    Entry đã bị evict / khác filesystem / cache không ghi được: ghi lại từ mảng đang mở.
+    """
+    RENDER_DIR.mkdir(parents=True, exist_ok=True)
+    path = RENDER_DIR / f"track_{uuid.uuid4().hex}.npy"
+    try:
+        if source.path is None:
+            raise OSError("no cache file")
+        os.link(source.path, path)
+    except OSError:
+        np.save(path, source.read(source.frames))
+    return str(path)
+
+
+def render_track(i, stem, master_sr, block_size=BLOCK_SIZE, root_dir=None):
+    """
+    Render chuỗi hiệu ứng (trước volume/pan) của một track vào cache stage (chạy trong worker
+    process; kết quả trả về qua memmap thay vì pickle cả mảng). Đọc/xử lý theo đúng ranh giới
+    block như khi mix tuần tự nên kết quả giống hệt từng bit.
+
+    Returns:
+        {"index", "path", "frames", "sr", "gains"} hoặc None nếu track không dùng được.
+        path là file gốc khi track không có stage nào, ngược lại là file riêng của lần mix này
+        (_private_render, temp=True - discard_rendered / mix_rendered xoá sau khi mix).
+    """
+    root_dir = Path(root_dir or os.getcwd())
+    track = _open_track(i, stem, root_dir, master_sr, block_size)
+    if track is None:
+        return None
+    try:
+        source = track.source
+        temp = False
+        if not _stage_specs(stem):
+            # Memmap của decoded cache có layout (n, channels): trả file gốc, worker mở lại qua cache
+            path = str(root_dir / stem['url'].lstrip('/'))
+        else:
+            path = _private_render(source)
+            temp = True
+        return {"index": i, "path": path, "frames": track.frames, "sr": source.samplerate,
+                "gains": list(_track_gains(stem)), "temp": temp}
+    finally:
+        track.close()
+
+
+def discard_rendered(rendered):
+    """Xoá file tạm của các track đã render (file trong cache stage được giữ lại)"""
+    for item in rendered:
+        if isinstance(item, dict) and item.get("temp"):
+            Path(item["path"]).unlink(missing_ok=True)
+
+
+def _open_rendered(item):
+    if item["path"].endswith(".npy"):
+        source = _ArraySource(np.load(item["path"], mmap_mode='r'), item["sr"])
+    else:
+        source = _open_source(item["path"], item["sr"])
+    return _Track(item["index"], source, [_Gain(*item["gains"])])
+
+
+def _mix_sources(tracks, master_sr, output_path, block_size):
+    """
+    Cộng các track (đã sắp theo index) vào master bus theo block rồi chuẩn hoá 2 pass.
+    Thứ tự cộng cố định nên kết quả không phụ thuộc thứ tự các worker hoàn thành.
+    """
+    total_frames = max(t.frames for t in tracks)
+    master = np.zeros((2, block_size), dtype=np.float32)
+    peak = 0.0
+
+    # Pass 1: mix từng block vào file float tạm, theo dõi peak
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.stem}_{uuid.uuid4().hex[:8]}.tmp.wav")
+    with sf.SoundFile(str(tmp_path), 'w', samplerate=master_sr, channels=2, subtype='FLOAT') as tmp:
+        for start in range(0, total_frames, block_size):
+            n = min(block_size, total_frames - start)
+            bus = master[:, :n]
+            bus.fill(0.0)
+            for track in tracks:
+                if start >= track.frames:
+                    continue
+                block = track.read(n)
+                bus[:, :block.shape[1]] += block
+            peak = max(peak, float(np.max(np.abs(bus))))
+            tmp.write(bus.T)
 
+    # Pass 2: Final Norm, ghi ra WAV 16-bit
+    gain = 0.95 / peak if peak > 1e-4 else 1.0
+    try:
+        with sf.SoundFile(str(output_path), 'w', samplerate=master_sr, channels=2, subtype='PCM_16') as out:
+            for block in sf.blocks(str(tmp_path), blocksize=block_size, dtype='float32', always_2d=True):
+                out.write(block * gain)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    print(f"Successfully rendered mix to {output_path}")
+    return True
+
+
+def mix_rendered(rendered, output_path, block_size=BLOCK_SIZE):
+    """Mix các track đã render bởi render_track (bỏ qua None); volume/pan áp dụng ngay lúc cộng"""
+    items = sorted((r for r in rendered if r), key=lambda r: r["index"])
+    if not items:
+        print("ERROR: No audio tracks were successfully processed.")
+        return False
+    try:
+        tracks = [_open_rendered(r) for r in items]
+        try:
+            return _mix_sources(tracks, items[0]["sr"], output_path, block_size)
+        finally:
+            for track in tracks:
+                track.close()
+    finally:
+        discard_rendered(items)
+
+
+def _render_parallel(stems_data, master_sr, block_size, workers):
+    # Đã ở trong worker process (daemon) thì không tạo process con được -> dùng thread
+    pool_cls = ThreadPoolExecutor if executor.IN_WORKER else ProcessPoolExecutor
+    root_dir = os.getcwd()
+    with pool_cls(max_workers=workers) as pool:
+        futures = [pool.submit(render_track, i, stem, master_sr, block_size, root_dir)
+                   for i, stem in enumerate(stems_data)]
+    # Ra khỏi with là mọi future đã xong: một track lỗi thì dọn file của các track còn lại
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        discard_rendered(f.result() for f in futures if f.exception() is None)
+        raise errors[0]
+    return [f.result() for f in futures]
+
+
+def stream_mix(stems_data, block_size=STREAM_BLOCK_SIZE, root_dir=None):
+    """
+    Mix dạng stream cho preview: không chuẩn hoá 2 pass mà cho master bus qua limiter look-ahead,
+    mỗi block ra ngay sau khi cộng. Stage đã có trong cache được đọc lại, stage stream được còn
+    thiếu chạy trực tiếp theo block (speed/pitch vẫn phải render trước vì cần cả track).
+
+    Returns:
+        (sample_rate, total_frames, generator các block (n, 2) float32) hoặc None nếu không có track
+    """
+    root_dir = Path(root_dir or os.getcwd())
+    master_sr = None
+    tracks = []
+    try:
+        for i, stem in enumerate(stems_data):
+            track = _open_track(i, stem, root_dir, master_sr, block_size, live=True)
+            if track is None:
+                continue
+            master_sr = master_sr or track.source.samplerate
+            tracks.append(track)
+    except BaseException:
+        for track in tracks:
+            track.close()
+        raise
+    if not tracks:
+        print("ERROR: No audio tracks were successfully processed.")
+        return None
+
+    total_frames = max(t.frames for t in tracks)
+
+    def blocks():
+        limiter = _LookaheadLimiter(master_sr)
+        try:
+            for start in range(0, total_frames, block_size):
+                n = min(block_size, total_frames - start)
+                bus = np.zeros((2, n), dtype=np.float32)
+                for track in tracks:
+                    if start < track.frames:
+                        block = track.read(n)
+                        bus[:, :block.shape[1]] += block
+                out = limiter.process(bus)
+                if out.shape[1]:
+                    yield out.T
+            yield limiter.finish().T
+        finally:
+            for track in tracks:
+                track.close()
+
+    return master_sr, total_frames, blocks()
+
+
+def validate_tracks(stems_data, root_dir=None):
+    """
+    Kiểm tra danh sách track trước khi cấp mix stream (lỗi phải báo ở POST, không phải giữa stream):
+    mỗi track có url trỏ tới file nằm trong root_dir và tham số hiệu ứng đọc được.
+
+    Raises:
+        FileNotFoundError: file của track không tồn tại
+        ValueError: thiếu url, url ra ngoài root_dir hoặc tham số không hợp lệ
+    """
+    root_dir = Path(root_dir or os.getcwd()).resolve()
+    for i, stem in enumerate(stems_data):
+        if not isinstance(stem, dict) or not stem.get('url'):
+            raise ValueError(f"Track {i}: url is required")
+        file_path = (root_dir / str(stem['url']).lstrip('/')).resolve()
+        if not file_path.is_relative_to(root_dir):
+            raise ValueError(f"Track {i}: invalid url")
+        if not file_path.is_file():
+            raise FileNotFoundError(f"Track {i}: file not found: {stem['url']}")
         try:
-            y, sr = librosa.load(str(file_path), sr=None, mono=False)
-            if y.ndim == 1:
-                y = np.vstack((y, y))
-            master_sr = sr
-            print(f"  Loaded successfully. Duration: {y.shape[1]/sr:.2f}s, SR: {sr}")
-        except Exception as e:
-            print(f"ERROR: Failed to load {file_path}: {e}")
+            _stage_specs(stem)
+            _track_gains(stem)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Track {i}: invalid effect parameter ({e})")
+
+
+def prepare_stream_mix(stems_data, root_dir=None):
+    """
+    Chạy trong process pool trước khi phát mix stream: render speed/pitch (stage không stream được)
+    vào cache stage để lúc phát stream_mix chỉ còn đọc cache và chạy hiệu ứng nhẹ theo block.
+
+    Returns:
+        Số track mở được (0 = không có audio)
+    """
+    root_dir = Path(root_dir or os.getcwd())
+    master_sr = None
+    opened = 0
+    for i, stem in enumerate(stems_data):
+        track = _open_track(i, stem, root_dir, master_sr, live=True)
+        if track is None:
             continue
-        
-        # 1. Speed (Time Stretch)
-        speed = float(stem.get('speed', 1.0))
-        if abs(speed - 1.0) > 0.01:
-            print(f"  Effect: Speed {speed}x")
-            y_l = librosa.effects.time_stretch(y[0], rate=speed)
-            y_r = librosa.effects.time_stretch(y[1], rate=speed)
-            y = np.vstack((y_l, y_r))
-
-        # 2. Pitch Shift
-        pitch = float(stem.get('pitch', 0))
-        if abs(pitch) > 0.1:
-            print(f"  Effect: Pitch {pitch} semitones (Wait, this is slow CPU work...)")
-            y_l = librosa.effects.pitch_shift(y[0], sr=sr, n_steps=pitch)
-            y_r = librosa.effects.pitch_shift(y[1], sr=sr, n_steps=pitch)
-            y = np.vstack((y_l, y_r))
-
-        # 3. Distortion
-        dist = float(stem.get('distortion', 0))
-        if dist > 0.01:
-            print(f"  Effect: Distortion {dist}")
-            y = np.tanh(y * (1 + dist * 5))
-
-        # 4. Echo
-        echo = float(stem.get('echo', 0))
-        if echo > 0.01:
-            print(f"  Effect: Echo {echo}")
-            delay_samples = int(sr * 0.3)
-            decay = 0.5 * echo
-            echo_y = np.zeros_like(y)
-            if y.shape[1] > delay_samples:
-                echo_y[:, delay_samples:] = y[:, :-delay_samples] * decay
-                y = (y + echo_y)
-
-        # 5. Filters
-        lpf = float(stem.get('lpf', 20000))
-        if lpf < 19500:
-            print(f"  Effect: LPF {lpf}Hz")
-            b, a = scipy.signal.butter(4, min(lpf, sr/2-1), btype='low', fs=sr)
-            y = scipy.signal.filtfilt(b, a, y, axis=-1)
-        
-        hpf = float(stem.get('hpf', 20))
-        if hpf > 30:
-            print(f"  Effect: HPF {hpf}Hz")
-            b, a = scipy.signal.butter(4, min(hpf, sr/2-1), btype='high', fs=sr)
-            y = scipy.signal.filtfilt(b, a, y, axis=-1)
-
-        # 6. Reverb
-        reverb = float(stem.get('reverb', 0))
-        if reverb > 0.01:
-            print(f"  Effect: Reverb {reverb}")
-            delay = int(sr * 0.05)
-            y_padded = np.pad(y, ((0, 0), (0, delay)))
-            y = y_padded[:, :y.shape[1]] + y_padded[:, delay:] * (0.4 * reverb)
-
-        # 7. Volume & Pan
-        vol = float(stem.get('volume', 1.0))
-        pan = float(stem.get('pan', 0.0))
-        left_gain = vol * (1.0 - max(0, pan))
-        right_gain = vol * (1.0 - max(0, -pan))
-        y[0] *= left_gain
-        y[1] *= right_gain
-
-        # Add to master
-        if master_audio is None:
-            master_audio = y
-        else:
-            # Handle different lengths
-            new_len = max(master_audio.shape[1], y.shape[1])
-            combined = np.zeros((2, new_len), dtype=np.float32)
-            combined[:, :master_audio.shape[1]] += master_audio
-            combined[:, :y.shape[1]] += y
-            master_audio = combined
-
-    if master_audio is not None:
-        # Final Norm
-        peak = np.max(np.abs(master_audio))
-        if peak > 1e-4:
-            master_audio = master_audio / peak * 0.95
-        
-        sf.write(output_path, master_audio.T, master_sr)
-        print(f"Successfully rendered mix to {output_path}")
-        return True
-    
-    print("ERROR: No audio tracks were successfully processed.")
-    return False
+        master_sr = master_sr or track.source.samplerate
+        track.close()
+        opened += 1
+    return opened
+
+
+def apply_audio_effects(stems_data, output_path, block_size=BLOCK_SIZE, workers=None):
+    """
+    Render mix theo block: mỗi track đọc từng block, qua chuỗi hiệu ứng có trạng thái,
+    cộng vào master bus cấp phát sẵn rồi ghi dần ra file. Bộ nhớ đỉnh cố định theo
+    block_size, không tăng theo độ dài hay số lượng track.
+
+    workers > 1: chuỗi hiệu ứng của các track được render song song (render_track) ra file
+    memmap rồi mới cộng theo thứ tự track - kết quả giống hệt bản tuần tự.
+
+    Output của từng stage được giữ trong cache stage (get_effect_cache): render lại sau khi
+    đổi một tham số chỉ tính các stage phía sau tham số đó.
+    """
+    print(f"--- Starting Render Mix ({len(stems_data)} tracks) ---")
+    workers = min(len(stems_data), max(1, int(workers or MIX_WORKERS)))
+    if workers > 1:
+        master_sr = master_samplerate(stems_data)
+        rendered = _render_parallel(stems_data, master_sr, block_size, workers)
+        return mix_rendered(rendered, output_path, block_size)
+
+    master_sr = None
+    root_dir = Path(os.getcwd())
+
+    tracks = []
+    try:
+        for i, stem in enumerate(stems_data):
+            track = _open_track(i, stem, root_dir, master_sr, block_size)
+            if track is None:
+                continue
+            # Track đầu tiên quyết định sample rate của master, các track sau được resample theo
+            master_sr = master_sr or track.source.samplerate
+            tracks.append(track)
+
+        if not tracks:
+            print("ERROR: No audio tracks were successfully processed.")
+            return False
+
+        return _mix_sources(tracks, master_sr, output_path, block_size)
+    finally:
+        for track in tracks:
+            track.close()
@@ -0,0 +1,150 @@
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Số process phân tích chạy song song và số request được phép chờ thêm
+POOL_SIZE = int(os.environ.get("ANALYSIS_WORKERS", os.cpu_count() or 2))
+QUEUE_SIZE = int(os.environ.get("ANALYSIS_QUEUE_SIZE", POOL_SIZE * 4))
+RETRY_AFTER_SECONDS = int(os.environ.get("ANALYSIS_RETRY_AFTER", 5))
+
+# True bên trong worker process (các module khác dùng để tránh tạo pool lồng nhau)
+IN_WORKER = False
+# Số thread một tác vụ được dùng: cả máy khi gọi trực tiếp, phần chia đều theo số worker trong pool
+WORKER_THREADS = os.cpu_count() or 1
+
+
+class PoolBusyError(Exception):
+    """Hàng đợi phân tích đã đầy - endpoint trả về 503 kèm Retry-After"""
+
+    def __init__(self, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__("Analysis queue is full, please retry later")
+        self.retry_after = retry_after
+
+
+def _warm_worker(pool_size=None):
+    """
+    Initializer của mỗi worker: import librosa/scipy/matplotlib một lần
+    để các request sau không phải trả chi phí import (vài giây với librosa + numba).
+    pool_size: số worker chạy song song, để tác vụ trong worker không tạo quá cpu_count thread
+    """
+    global IN_WORKER, WORKER_THREADS
+    IN_WORKER = True
+    WORKER_THREADS = max(1, (os.cpu_count() or 1) // max(1, int(pool_size or POOL_SIZE)))
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import scipy.signal
+    import librosa
+    # librosa lazy-load các submodule, truy cập để load sẵn
+    _ = (librosa.feature, librosa.effects, librosa.beat, librosa.onset)
+    from . import voice_processing, analyzer, effects, isolator, render
+
+
+def call_processor(method, *args, **kwargs):
+    """Gọi một method của InstrumentVoiceProcessor trong worker (method phải picklable nên truyền theo tên)"""
+    from .voice_processing import InstrumentVoiceProcessor
+    return getattr(InstrumentVoiceProcessor(), method)(*args, **kwargs)
+
+
+class AnalysisPool:
+    """
+    Process pool có giới hạn cho các tác vụ CPU-bound (librosa, pyin, HPSS, matplotlib)
+
+    Tối đa max_workers tác vụ chạy cùng lúc và queue_size tác vụ chờ; khi vượt quá,
+    run() ném PoolBusyError ngay thay vì để request treo.
+    """
+
+    def __init__(self, max_workers=POOL_SIZE, queue_size=QUEUE_SIZE):
+        self.max_workers = max(1, int(max_workers))
+        self.queue_size = max(0, int(queue_size))
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_warm_worker,
+                    initargs=(self.max_workers,),
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Khởi động sẵn toàn bộ worker (gọi lúc server start)"""
+        executor = self._get_executor()
+        futures = [executor.submit(os.getpid) for _ in range(self.max_workers)]
+        return [f.result() for f in futures]
+
+    async def run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusyError()
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            try:
+                return await loop.run_in_executor(self._get_executor(), call)
+            except BrokenProcessPool:
+                # Một worker bị kill (OOM...) - dựng lại pool cho các request sau
+                print("WARNING executor: process pool broken, restarting")
+                self._reset()
+                raise
+        finally:
+            self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Gửi tác vụ từ một thread thường (job nền): chờ tới khi có chỗ thay vì ném PoolBusyError,
+        chỗ được trả khi tác vụ kết thúc.
+
+        Returns:
+            concurrent.futures.Future
+        """
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        def done(f):
+            self._slots.release()
+            if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+                print("WARNING executor: process pool broken, restarting")
+                self._reset()
+
+        future.add_done_callback(done)
+        return future
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_pool():
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = AnalysisPool()
+        return _default_pool
+
+
+async def run_in_pool(fn, *args, **kwargs):
+    """Chạy fn(*args, **kwargs) trong pool dùng chung, không chặn event loop"""
+    return await get_pool().run(fn, *args, **kwargs)
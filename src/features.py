@@ -0,0 +1,142 @@
+"""
+Mặt phẳng STFT dùng chung cho trích xuất đặc trưng
+
+Mỗi (nội dung file, sample rate, n_fft, hop) chỉ tính STFT một lần: phổ biên độ được lưu
+vào cache/stft dưới dạng .npy và memory-map lại ở các request sau (kể cả từ process khác
+trong pool). Energy, ZCR, centroid, bandwidth, rolloff, MFCC, chroma, onset envelope và
+spectrogram dB đều suy ra từ mặt phẳng này; framing miền thời gian là strided view, không copy.
+"""
+
+from functools import cached_property
+
+import librosa
+import numpy as np
+
+from .audio_cache import CACHE_ROOT, MAX_CACHE_BYTES, NpyCache, file_digest, load_audio, load_region
+
+STFT_DIR = CACHE_ROOT / "stft"
+DEFAULT_N_FFT = 2048
+DEFAULT_HOP = 512
+
+
+class SpectralPlane:
+    """
+    Tín hiệu mono + phổ biên độ |STFT| (1 + n_fft/2, n_frames) với các đặc trưng suy ra từ đó.
+    Tham số STFT giống mặc định của librosa (hann, center=True) nên kết quả khớp với
+    các hàm librosa.feature.* gọi trực tiếp trên y.
+    """
+
+    def __init__(self, y, sr, magnitude, n_fft=DEFAULT_N_FFT, hop_length=DEFAULT_HOP):
+        self.y = y
+        self.sr = int(sr)
+        self.magnitude = magnitude
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+    @classmethod
+    def from_signal(cls, y, sr, n_fft=DEFAULT_N_FFT, hop_length=DEFAULT_HOP):
+        return cls(y, sr, compute_magnitude(y, n_fft, hop_length), n_fft, hop_length)
+
+    # --- Miền thời gian (strided view) ---
+
+    def frames(self, frame_length, hop_length=None, center=True):
+        """
+        View (n_frames, frame_length) trên tín hiệu.
+        center=True: pad frame_length//2 hai đầu kiểu 'edge' như librosa.feature.zero_crossing_rate.
+        center=False: frame bắt đầu tại 0, giữ cả các frame cuối bị thiếu (pad 0).
+        """
+        hop_length = hop_length or self.hop_length
+        y = np.asarray(self.y)
+        if center:
+            y = np.pad(y, frame_length // 2, mode='edge')
+            n_frames = 1 + (len(y) - frame_length) // hop_length
+        else:
+            n_frames = -(-len(y) // hop_length)
+            y = np.pad(y, (0, frame_length))
+        return np.lib.stride_tricks.sliding_window_view(y, frame_length)[::hop_length][:n_frames]
+
+    def short_time_energy(self, frame_length=1024, hop_length=None):
+        frames = self.frames(frame_length, hop_length, center=False)
+        return np.einsum('ij,ij->i', frames, frames, dtype=np.float64)
+
+    def zero_crossing_rate(self, frame_length=2048, hop_length=None):
+        frames = self.frames(frame_length, hop_length, center=True)
+        crossings = librosa.zero_crossings(frames, pad=False, axis=-1)
+        return np.mean(crossings, axis=-1)
+
+    # --- Miền tần số (từ |STFT| đã cache) ---
+
+    @cached_property
+    def power(self):
+        return np.square(self.magnitude, dtype=np.float32)
+
+    @cached_property
+    def mel(self):
+        return librosa.feature.melspectrogram(S=self.power, sr=self.sr, n_fft=self.n_fft,
+                                              hop_length=self.hop_length)
+
+    @cached_property
+    def log_mel(self):
+        return librosa.power_to_db(self.mel)
+
+    def spectral_centroid(self):
+        return librosa.feature.spectral_centroid(S=self.magnitude, sr=self.sr, n_fft=self.n_fft)[0]
+
+    def spectral_bandwidth(self):
+        return librosa.feature.spectral_bandwidth(S=self.magnitude, sr=self.sr, n_fft=self.n_fft)[0]
+
+    def spectral_rolloff(self, roll_percent=0.85):
+        return librosa.feature.spectral_rolloff(S=self.magnitude, sr=self.sr, n_fft=self.n_fft,
+                                                roll_percent=roll_percent)[0]
+
+    def mfcc(self, n_mfcc=13):
+        return librosa.feature.mfcc(S=self.log_mel, sr=self.sr, n_mfcc=n_mfcc)
+
+    def chroma(self):
+        return librosa.feature.chroma_stft(S=self.power, sr=self.sr, n_fft=self.n_fft)
+
+    def onset_strength(self):
+        return librosa.onset.onset_strength(S=self.log_mel, sr=self.sr)
+
+    def db(self, ref=np.max):
+        return librosa.amplitude_to_db(self.magnitude, ref=ref)
+
+
+def compute_magnitude(y, n_fft=DEFAULT_N_FFT, hop_length=DEFAULT_HOP):
+    S = librosa.stft(np.asarray(y, dtype=np.float32), n_fft=n_fft, hop_length=hop_length)
+    return np.abs(S).astype(np.float32)
+
+
+_stft_cache = None
+
+
+def get_stft_cache():
+    global _stft_cache
+    if _stft_cache is None:
+        _stft_cache = NpyCache(STFT_DIR, MAX_CACHE_BYTES)
+    return _stft_cache
+
+
+def set_stft_cache(cache):
+    """Thay STFT cache dùng chung của process (vd. worker batch dùng thư mục riêng)"""
+    global _stft_cache
+    _stft_cache = cache
+
+
+def get_plane(audio_path, sr=None, n_fft=DEFAULT_N_FFT, hop_length=DEFAULT_HOP, start=None, end=None):
+    """
+    Mặt phẳng STFT của file (mono) qua decoded cache + STFT cache.
+    Với đoạn [start, end) giây: chỉ đọc đoạn đó, STFT tính trực tiếp (không cache).
+    """
+    if start is not None or end is not None:
+        y, fs = load_region(audio_path, start, end, sr=sr, mono=True)
+        return SpectralPlane.from_signal(y, fs, n_fft, hop_length)
+    y, fs = load_audio(audio_path, sr=sr, mono=True)
+    rate = "native" if sr is None else str(int(sr))
+    key = f"{file_digest(audio_path)}_{rate}_{n_fft}_{hop_length}"
+
+    def compute():
+        return compute_magnitude(y, n_fft, hop_length), {"sr": int(fs), "n_fft": n_fft, "hop_length": hop_length}
+
+    magnitude, _ = get_stft_cache().get_or_compute(key, compute)
+    return SpectralPlane(y, fs, magnitude, n_fft, hop_length)
@@ -0,0 +1,95 @@
+"""
+Lưu file upload theo hash nội dung (content-addressed)
+
+Body được copy theo chunk trong thread riêng (không chặn event loop), SHA-256 tính ngay
+trong lúc ghi ra file tạm. File được lưu một lần dưới tên uploads/<sha256><ext>; upload
+trùng nội dung (dù client gửi đuôi khác, vd. .mp3 / .MP3 / .mpeg) chỉ tốn một lượt hash,
+file tạm bị xoá và trả về file đã có - không có bản copy (và lượt decode) thứ hai.
+Tên này là id ổn định cho các lời gọi /analyze/* sau đó (re-upload không ghi đè file khác).
+
+Sau khi lưu, prepare_upload (chạy nền trong worker) transcode file sang bản canonical của
+decoded cache (float32 memmap, xem src/decoder.py) và dựng kim tự tháp peak, nên các
+endpoint nhẹ (/analyze/cutoff, /analyze/vad...) không phải decode MP3 lần nào nữa.
+"""
+
+import os
+import re
+import uuid
+import hashlib
+import asyncio
+from pathlib import Path
+
+from .audio_cache import load_frames, remember_digest
+from .peaks import ensure_peaks
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_EXTENSION = ".bin"
+_EXT_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+def safe_extension(filename):
+    """Phần mở rộng (lowercase) của tên file client, chỉ giữ ký tự an toàn"""
+    ext = Path(filename or "").suffix.lower()
+    return ext if _EXT_RE.match(ext) else DEFAULT_EXTENSION
+
+
+def find_stored(upload_dir, digest):
+    """File đã lưu của nội dung digest (bất kể đuôi), None nếu chưa có"""
+    matches = sorted(Path(upload_dir).glob(f"{digest}.*"))
+    return matches[0] if matches else None
+
+
+def store_stream(src, upload_dir, original_filename):
+    """
+    Copy file-like src vào upload_dir theo chunk, vừa ghi vừa hash.
+
+    Returns:
+        dict gồm file_id (sha256), filename (<sha256><ext>, dùng cho /analyze/*),
+        original_filename, size và duplicate (True nếu nội dung đã có sẵn)
+    """
+    upload_dir = Path(upload_dir)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = upload_dir / f".incoming-{uuid.uuid4().hex}.part"
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        digest = h.hexdigest()
+        existing = find_stored(upload_dir, digest)
+        duplicate = existing is not None
+        final_path = existing or upload_dir / f"{digest}{safe_extension(original_filename)}"
+        if duplicate:
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    # Các lần file_digest sau (cache decode, STFT, peaks...) không phải đọc lại file
+    remember_digest(final_path, digest)
+    return {
+        "file_id": digest,
+        "filename": final_path.name,
+        "original_filename": original_filename,
+        "size": size,
+        "duplicate": duplicate,
+    }
+
+
+async def store_upload(upload, upload_dir):
+    """Lưu UploadFile của FastAPI (copy + hash chạy trong thread, không chặn event loop)"""
+    await upload.seek(0)
+    return await asyncio.to_thread(store_stream, upload.file, upload_dir, upload.filename)
+
+
+def prepare_upload(path):
+    """Transcode sang bản canonical rồi dựng peak (đọc lại từ canonical, không decode lần hai)"""
+    frames, sr = load_frames(path)
+    ensure_peaks(path)
+    return {"sr": sr, "frames": len(frames), "channels": frames.shape[1]}
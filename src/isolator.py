@@ -1,134 +1,452 @@
+import os
+import re
+import importlib.util
 import subprocess
 import shutil
+import uuid
+from concurrent.futures import CancelledError
 import librosa
 import numpy as np
 import scipy.signal
 import soundfile as sf
 from pathlib import Path
 
-def isolate_rock_instruments(file_path, upload_dir):
+from . import executor
+from .audio_cache import file_digest, load_frames
+from .jobs import NULL_JOB, FileJobContext, JobCancelled
+from .separation_worker import DEMUCS_MODEL, DEMUCS_SHIFTS, SeparationCancelled, get_worker
+from .stem_store import StemStore, make_key
+
+# Dòng tiến độ tqdm của Demucs, ví dụ " 45%|████▌     | 52.6/117.0"
+_DEMUCS_PROGRESS_RE = re.compile(r"(\d{1,3})%\|")
+
+def isolate_rock_instruments(file_path, upload_dir, job=NULL_JOB):
     """
     Main entry point: Tries AI isolation first, falls back to DSP if AI fails.
+    Kết quả được lưu trong stem store (upload_dir/stems/) theo hash nội dung + separator +
+    model + settings; tách lại cùng file với cùng cấu hình trả ngay URL đã lưu.
+
+    job: JobContext (src/jobs.py) để báo tiến độ và hỗ trợ huỷ; mặc định không theo dõi.
     """
     print(f"Starting Isolation for: {file_path}")
-    
+    store = StemStore(Path(upload_dir) / "stems", "/uploads/stems")
+    digest = file_digest(file_path)
+
     # 1. Try AI (Demucs)
-    try:
-        stems = _isolate_ai_demucs(file_path, upload_dir)
-        if stems and len(stems) > 0:
-            print("AI Isolation successful.")
-            return stems
-    except Exception as e:
-        print(f"AI Isolation failed: {e}. Falling back to DSP...")
+    demucs_key = make_key(digest, "demucs", *_demucs_config())
+    stems = store.lookup(demucs_key)
+    if stems:
+        print("Stem store hit (demucs).")
+        job.report(1.0, "Stems đã có sẵn")
+        return stems
+    if importlib.util.find_spec("demucs") is not None:
+        job.report(0.0, "Đang chạy Demucs")
+        try:
+            stems = _isolate_ai_demucs(file_path, store, demucs_key, digest, job)
+            if stems and len(stems) > 0:
+                print("AI Isolation successful.")
+                return stems
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"AI Isolation failed: {e}. Falling back to DSP...")
+    else:
+        print("Demucs is not installed. Falling back to DSP...")
+
+    job.raise_if_cancelled()
 
     # 2. Fallback to DSP
+    dsp_key = make_key(digest, "dsp", None, DSP_SETTINGS)
+    stems = store.lookup(dsp_key)
+    if stems:
+        print("Stem store hit (dsp).")
+        job.report(1.0, "Stems đã có sẵn")
+        return stems
     print("Executing high-quality DSP fallback...")
-    return _isolate_dsp_fallback(file_path, upload_dir)
+    return _isolate_dsp_fallback(file_path, store, dsp_key, digest, job)
 
-def _isolate_ai_demucs(file_path, upload_dir):
-    filename = Path(file_path).name
-    stem_dir = upload_dir / f"stems_{filename}"
-    stem_dir.mkdir(exist_ok=True)
-    
-    tmp_demucs_dir = upload_dir / "demucs_tmp"
-    if tmp_demucs_dir.exists():
-        shutil.rmtree(tmp_demucs_dir, ignore_errors=True)
-    tmp_demucs_dir.mkdir(exist_ok=True)
+def _run_demucs(cmd, job):
+    """
+    Chạy Demucs như subprocess, đọc tiến độ tqdm từ stderr và báo về job.
+    Đăng ký process với job để cancel có thể kill ngay.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    job.attach_process(proc)
+    tail = []
+    try:
+        buf = ""
+        while True:
+            # os.read trả về ngay phần đã có trong pipe, không chờ đủ buffer
+            chunk = os.read(proc.stderr.fileno(), 4096)
+            if not chunk:
+                break
+            buf += chunk.decode("utf-8", errors="replace")
+            # tqdm cập nhật bằng \r, log thường bằng \n
+            parts = re.split(r"[\r\n]", buf)
+            buf = parts.pop()
+            for line in parts:
+                if not line.strip():
+                    continue
+                tail = (tail + [line])[-20:]
+                match = _DEMUCS_PROGRESS_RE.search(line)
+                if match:
+                    job.report(0.9 * int(match.group(1)) / 100, "Demucs đang tách nhạc cụ")
+        proc.wait()
+    finally:
+        job.detach_process()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stderr.close()
 
-    print("Running Demucs engine...")
+    job.raise_if_cancelled()
+    return proc.returncode, "\n".join(tail)
+
+# "resident": process Demucs thường trú (src/separation_worker.py), load model một lần
+# "subprocess": chạy `python -m demucs.separate` cho mỗi request như trước
+DEMUCS_MODE = os.environ.get("DEMUCS_MODE", "resident")
+
+DEMUCS_STEM_LABELS = {
+    "vocals.wav": "Vocals",
+    "drums.wav": "Drums",
+    "bass.wav": "Bass",
+    "other.wav": "Guitar / Sync"
+}
+
+class _ResidentJobHandle:
+    """Giả lập interface Popen (poll/kill) để JobContext.cancel() huỷ được job trên worker thường trú"""
+
+    def __init__(self, worker, job_id):
+        self.worker = worker
+        self.job_id = job_id
+        self.finished = False
+
+    def poll(self):
+        return 0 if self.finished else None
+
+    def kill(self):
+        self.worker.cancel(self.job_id)
+
+def _separate_resident(file_path, out_dir, job):
+    """Tách bằng worker thường trú; trả về dict {tên file stem: đường dẫn}"""
+    worker = get_worker()
+    job_id = out_dir.name
+    handle = _ResidentJobHandle(worker, job_id)
+    future = worker.submit(
+        file_path, out_dir, job_id,
+        on_progress=lambda fraction: job.report(0.9 * fraction, "Demucs đang tách nhạc cụ")
+    )
+    job.attach_process(handle)
+    try:
+        return future.result()
+    except SeparationCancelled:
+        job.raise_if_cancelled()
+        raise
+    finally:
+        handle.finished = True
+        job.detach_process()
+
+def _separate_subprocess(file_path, out_dir, job, model_name="htdemucs"):
+    """Tách bằng một process Demucs mới (cold start: import torch + load weights mỗi lần)"""
     # Use standard demucs for better stability
     cmd = [
         "python", "-m", "demucs.separate",
-        "-n", "htdemucs",
+        "-n", model_name,
         "--shifts", "1",
         "-j", "2",
-        "-o", str(tmp_demucs_dir),
+        "-o", str(out_dir),
         str(file_path)
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Demucs process error: {result.stderr}")
+    returncode, stderr_tail = _run_demucs(cmd, job)
+    if returncode != 0:
+        print(f"Demucs process error: {stderr_tail}")
         return {}
 
-    # Path detection
-    model_name = "htdemucs"
+    # Find the actual output folder (Demucs can name it differently based on file name)
+    track_folder = next((out_dir / model_name).iterdir())
+    return {p.name: str(p) for p in track_folder.glob("*.wav")}
+
+def _demucs_config():
+    """(model, settings) ảnh hưởng tới output của Demucs - một phần khoá của stem store"""
+    if DEMUCS_MODE == "resident":
+        return DEMUCS_MODEL, {"shifts": DEMUCS_SHIFTS}
+    return "htdemucs", {"shifts": 1}
+
+
+def _isolate_ai_demucs(file_path, store, key, digest, job=NULL_JOB):
+    # Mỗi lần tách dùng thư mục tạm riêng trong stem store (cùng filesystem) để các request
+    # đồng thời không ghi đè nhau và stem được dời vào entry thay vì copy
+    out_dir = store.staging_dir()
+
+    print(f"Running Demucs engine ({DEMUCS_MODE})...")
     try:
-        # Find the actual output folder (Demucs can name it differently based on file name)
-        output_base = tmp_demucs_dir / model_name
-        track_folder = next(output_base.iterdir())
-        
-        mapping = {
-            "vocals.wav": "Vocals",
-            "drums.wav": "Drums",
-            "bass.wav": "Bass",
-            "other.wav": "Guitar / Sync"
-        }
-
-        response_stems = {}
-        for src_file, label in mapping.items():
-            src = track_folder / src_file
-            if src.exists():
-                dest = stem_dir / src_file
-                shutil.copy2(str(src), str(dest))
-                response_stems[label] = f"/uploads/stems_{filename}/{src_file}"
-        
-        return response_stems
-    except Exception as e:
-        print(f"Error mapping AI stems: {e}")
-        return {}
+        if DEMUCS_MODE == "resident":
+            stem_paths = _separate_resident(file_path, out_dir, job)
+        else:
+            stem_paths = _separate_subprocess(file_path, out_dir, job)
+        if not stem_paths:
+            return {}
+        job.report(0.95, "Đang lưu stems")
+
+        found = {}
+        for src_file, label in DEMUCS_STEM_LABELS.items():
+            src = stem_paths.get(src_file)
+            if src and Path(src).exists():
+                found[label] = src
+        if not found:
+            return {}
+        model, settings = _demucs_config()
+        return store.put(key, found, {"digest": digest, "separator": "demucs", "model": model,
+                                      "settings": settings})
+    finally:
+        store.discard(out_dir)
+
+# DSP fallback xử lý theo cửa sổ chồng lấp: bộ nhớ đỉnh theo kích thước cửa sổ, không theo độ dài track
+DSP_WINDOW_SECONDS = float(os.environ.get("DSP_WINDOW_SECONDS", 20.0))
+DSP_CONTEXT_SECONDS = 2.0     # ngữ cảnh mỗi bên (median filter HPSS, frame STFT), tính xong bỏ đi
+DSP_CROSSFADE_SECONDS = 0.1   # đoạn chồng lấp giữa hai cửa sổ kề nhau, overlap-add cos^2 / sin^2
+DSP_N_FFT = 2048
+DSP_HOP_LENGTH = 512          # hop của STFT dùng chung, biên cửa sổ được căn theo hop này
+DSP_HPSS_KERNEL = 31
+DSP_HPSS_MARGIN = (1.0, 3.0)
+MEDIAN_BATCH_BYTES = 64 * 1024 ** 2
+DSP_STEM_LABELS = ("Drums", "Vocals", "Bass", "Guitar", "Keyboard / Sync")
+# "pool": job nền chạy DSP trong analysis pool (src/executor.py), không giữ GIL của API process
+# "inline": chạy ngay trong thread gọi
+DSP_MODE = os.environ.get("DSP_MODE", "pool")
+# Tham số ảnh hưởng tới output của DSP fallback - một phần khoá của stem store (đổi thuật toán thì tăng version)
+DSP_SETTINGS = {"version": 2, "n_fft": DSP_N_FFT, "hop_length": DSP_HOP_LENGTH,
+                "hpss_kernel": DSP_HPSS_KERNEL, "hpss_margin": list(DSP_HPSS_MARGIN)}
+
+
+def _median_filter(S, size, axis, batch_bytes=MEDIAN_BATCH_BYTES):
+    """
+    Median trượt `size` phần tử dọc theo `axis` (biên phản xạ như ndimage mode='reflect').
+    np.partition trên sliding window, chia lô theo trục còn lại để bộ nhớ tạm <= batch_bytes;
+    nhanh hơn scipy.ndimage.median_filter nhiều lần, kết quả giống hệt.
+    """
+    S = np.moveaxis(S, axis, -1)
+    half = size // 2
+    out = np.empty(S.shape, dtype=S.dtype)
+    rows = S.reshape(-1, S.shape[-1])
+    flat = out.reshape(-1, S.shape[-1])
+    step = max(1, batch_bytes // (S.shape[-1] * size * S.itemsize))
+    for r0 in range(0, len(rows), step):
+        padded = np.pad(rows[r0:r0 + step], ((0, 0), (half, size - 1 - half)), mode='symmetric')
+        windows = np.lib.stride_tricks.sliding_window_view(padded, size, axis=-1)
+        flat[r0:r0 + step] = np.partition(windows, half, axis=-1)[..., half]
+    return np.moveaxis(out, -1, axis)
+
+
+def _softmask(X, X_ref, power=2.0):
+    """librosa.util.softmask (split_zeros=False): X^p / (X^p + X_ref^p), 0 khi cả hai ~ 0"""
+    Z = np.maximum(X, X_ref)
+    bad = Z < np.finfo(np.float32).tiny
+    Z = np.where(bad, 1, Z)
+    mask = (X / Z) ** power
+    ref = (X_ref / Z) ** power
+    return np.where(bad, 0, mask / np.where(bad, 1, mask + ref)).astype(np.float32)
+
+
+def _filter_gain(sr, n_fft, cutoff, btype):
+    """|H(f)|^2 của Butterworth bậc 4 tại các bin rfft = đáp ứng biên độ của filtfilt"""
+    b, a = scipy.signal.butter(4, cutoff, btype=btype, fs=sr)
+    _, h = scipy.signal.freqz(b, a, worN=np.fft.rfftfreq(n_fft, 1 / sr), fs=sr)
+    return (np.abs(h) ** 2).astype(np.float32)[:, np.newaxis]
+
+
+def _dsp_separate(y, sr):
+    """
+    Tách một đoạn stereo (2, n) thành các stem (2, n) trên một STFT đa kênh duy nhất.
+
+    Các bước của thuật toán DSP gốc thành mask phổ: HPSS (median theo thời gian / tần số,
+    softmask margin (1, 3)), lowpass 150Hz cho bass và bandpass 200-4500Hz cho guitar (|H|^2
+    của Butterworth bậc 4 = đáp ứng biên độ của filtfilt), center mask cho vocals. Mỗi stem chỉ
+    cần một lần iSTFT đa kênh.
+    """
+    n = y.shape[-1]
+    X = librosa.stft(y, n_fft=DSP_N_FFT, hop_length=DSP_HOP_LENGTH)  # (2, bins, frames)
+    mag = np.abs(X)
+
+    # HPSS
+    harm = _median_filter(mag, DSP_HPSS_KERNEL, axis=-1)
+    perc = _median_filter(mag, DSP_HPSS_KERNEL, axis=-2)
+    X_harmonic = X * _softmask(harm, perc * DSP_HPSS_MARGIN[0])
+    X_percussive = X * _softmask(perc, harm * DSP_HPSS_MARGIN[1])
+    del mag, harm, perc
+
+    def istft(spec):
+        return librosa.istft(spec, hop_length=DSP_HOP_LENGTH, n_fft=DSP_N_FFT, length=n)
+
+    stems = {"Drums": istft(X_percussive)}
+    del X_percussive
 
-def _isolate_dsp_fallback(file_path, upload_dir):
-    y, sr = librosa.load(file_path, sr=None, mono=False)
-    if y.ndim == 1: y = np.vstack((y, y))
-    
-    # Simple High-Quality DSP Separation
-    y_harmonic, y_percussive = librosa.effects.hpss(y, margin=(1.0, 3.0))
-    
-    # Labels and filters
-    stems = {
-        "Drums": y_percussive,
-        "Vocals": None,
-        "Bass": None,
-        "Guitar": None,
-        "Keyboard / Sync": None
-    }
-    
     # 1. Bass
-    b_low, a_low = scipy.signal.butter(4, 150, btype='low', fs=sr)
-    stems["Bass"] = scipy.signal.filtfilt(b_low, a_low, y_harmonic, axis=-1)
-    
+    low = _filter_gain(sr, DSP_N_FFT, 150, 'low')
+    stems["Bass"] = istft(X_harmonic * low)
+
     # 2. Vocals (Center masking)
-    y_mid = y_harmonic - stems["Bass"]
-    stft_l = librosa.stft(y_mid[0])
-    stft_r = librosa.stft(y_mid[1])
-    center_mask = np.minimum(np.abs(stft_l), np.abs(stft_r)) / (np.maximum(np.abs(stft_l), np.abs(stft_r)) + 1e-10)
-    stft_voc = (stft_l + stft_r) / 2 * (center_mask ** 4)
-    y_voc = librosa.istft(stft_voc, length=y.shape[1])
+    X_mid = X_harmonic * (1 - low)
+    del X_harmonic
+    mag_l, mag_r = np.abs(X_mid[0]), np.abs(X_mid[1])
+    center_mask = np.minimum(mag_l, mag_r) / (np.maximum(mag_l, mag_r) + 1e-10)
+    X_voc = (X_mid[0] + X_mid[1]) / 2 * (center_mask ** 4)
+    y_voc = istft(X_voc)
     stems["Vocals"] = np.vstack((y_voc, y_voc))
-    
+
     # 3. Guitar vs Keyboard Separation (Frequency Banding)
-    y_inst = y_mid - stems["Vocals"]
-    
-    # Guitar Band: 200Hz - 4500Hz
-    bg, ag = scipy.signal.butter(4, [200, 4500], btype='bandpass', fs=sr)
-    stems["Guitar"] = scipy.signal.filtfilt(bg, ag, y_inst, axis=-1)
-    
-    # Keys: Remainder
-    stems["Keyboard / Sync"] = y_inst - stems["Guitar"]
+    X_inst = X_mid - X_voc
+    band = _filter_gain(sr, DSP_N_FFT, [200, 4500], 'bandpass')
+    stems["Guitar"] = istft(X_inst * band)
+    stems["Keyboard / Sync"] = istft(X_inst * (1 - band))
+    return {label: stems[label] for label in DSP_STEM_LABELS}
 
-    # Save
-    filename = Path(file_path).name
-    stem_dir = upload_dir / f"stems_{filename}"
-    stem_dir.mkdir(exist_ok=True)
-    
-    response = {}
-    for label, data in stems.items():
-        fname = label.lower().replace(" ", "_").replace("/", "") + ".wav"
-        out_path = stem_dir / fname
-        peak = np.max(np.abs(data))
-        if peak > 1e-4:
-            sf.write(out_path, (data / peak * 0.9).T, sr)
-            response[label] = f"/uploads/stems_{filename}/{fname}"
-            
-    return response
+
+class _SegmentReader:
+    """Đọc đoạn [start, stop) stereo float32 từ memmap canonical của decoded cache (seek tức thì)"""
+
+    def __init__(self, file_path):
+        self._frames, self.samplerate = load_frames(file_path)
+        self.frames = len(self._frames)
+
+    def read(self, start, stop):
+        seg = np.asarray(self._frames[start:stop], dtype=np.float32).T
+        return np.vstack((seg, seg)) if seg.shape[0] == 1 else seg[:2]
+
+    def close(self):
+        self._frames = None
+
+
+def _dsp_windows(n, window, crossfade):
+    """[(a, b)]: cửa sổ k giữ [a, b) với b = a_tiếp_theo + crossfade (trừ cửa sổ cuối)"""
+    starts = list(range(0, n, window))
+    return [(a, min(n, a + window + crossfade)) for a in starts]
+
+
+def separate_dsp_chunked(file_path, out_paths, window_seconds=DSP_WINDOW_SECONDS,
+                         context_seconds=DSP_CONTEXT_SECONDS, crossfade_seconds=DSP_CROSSFADE_SECONDS,
+                         job=NULL_JOB):
+    """
+    Tách DSP theo cửa sổ: mỗi cửa sổ đọc thêm context hai bên, chạy _dsp_separate rồi chỉ giữ
+    phần giữa; hai cửa sổ kề nhau chồng lấp crossfade mẫu và được overlap-add với trọng số
+    cos^2 + sin^2 = 1. Stem được ghi dần ra file float tạm (theo dõi peak), pass 2 chuẩn hoá
+    peak về 0.9 như bản gốc và ghi WAV 16-bit.
+
+    Args:
+        out_paths: {label: đường dẫn WAV output}
+
+    Returns:
+        {label: đường dẫn} của các stem có tín hiệu (peak > 1e-4)
+    """
+    reader = _SegmentReader(file_path)
+    sr, n = reader.samplerate, reader.frames
+    # Biên cửa sổ + context là bội của hop STFT: frame STFT của đoạn trùng với frame của cả track,
+    # mask HPSS / center mask ở phần giữa giống hệt khi xử lý nguyên file
+    window = max(1, int(window_seconds * sr) // DSP_HOP_LENGTH) * DSP_HOP_LENGTH
+    context = -(-int(context_seconds * sr) // DSP_HOP_LENGTH) * DSP_HOP_LENGTH
+    crossfade = min(int(crossfade_seconds * sr), window)
+    t = (np.arange(crossfade) + 0.5) / max(crossfade, 1)
+    fade_in = (np.sin(0.5 * np.pi * t) ** 2).astype(np.float32)
+    fade_out = 1.0 - fade_in
+
+    tmp_paths = {label: Path(path).with_name(f".{Path(path).stem}_{uuid.uuid4().hex[:8]}.tmp.wav")
+                 for label, path in out_paths.items()}
+    writers = {}
+    peaks = dict.fromkeys(out_paths, 0.0)
+    tails = dict.fromkeys(out_paths)
+    try:
+        for label in out_paths:
+            writers[label] = sf.SoundFile(str(tmp_paths[label]), 'w', samplerate=sr, channels=2, subtype='FLOAT')
+
+        windows = _dsp_windows(n, window, crossfade)
+        for k, (a, b) in enumerate(windows):
+            job.raise_if_cancelled()
+            job.report(0.05 + 0.8 * k / len(windows), f"DSP: cửa sổ {k + 1}/{len(windows)}")
+            s0, s1 = max(0, a - context), min(n, b + context)
+            stems = _dsp_separate(reader.read(s0, s1), sr)
+            has_next = k + 1 < len(windows)
+            for label in out_paths:
+                out = stems[label][:, a - s0:b - s0].astype(np.float32)
+                if tails[label] is not None:
+                    head = tails[label].shape[1]
+                    out[:, :head] = out[:, :head] * fade_in[:head] + tails[label]
+                if has_next:
+                    # [a + window, b) chồng với đầu cửa sổ sau
+                    tails[label] = out[:, window:] * fade_out[:b - a - window]
+                    out = out[:, :window]
+                peaks[label] = max(peaks[label], float(np.max(np.abs(out))) if out.size else 0.0)
+                writers[label].write(out.T)
+            del stems
+        for w in writers.values():
+            w.close()
+
+        # Pass 2: chuẩn hoá từng stem theo peak của cả track
+        job.raise_if_cancelled()
+        job.report(0.9, "DSP: đang lưu stems")
+        written = {}
+        for label, path in out_paths.items():
+            if peaks[label] <= 1e-4:
+                continue
+            gain = 0.9 / peaks[label]
+            with sf.SoundFile(str(path), 'w', samplerate=sr, channels=2) as out:
+                for block in sf.blocks(str(tmp_paths[label]), blocksize=1 << 16, dtype='float32', always_2d=True):
+                    out.write(block * gain)
+            written[label] = path
+        return written
+    finally:
+        reader.close()
+        for w in writers.values():
+            w.close()
+        for p in tmp_paths.values():
+            p.unlink(missing_ok=True)
+
+
+class _PoolJobHandle:
+    """
+    Giả lập interface Popen cho tác vụ DSP trong analysis pool: kill() bỏ tác vụ chưa chạy,
+    tác vụ đang chạy tự dừng ở cửa sổ kế tiếp khi thấy file cancel (JobContext.follow)
+    """
+
+    def __init__(self, future):
+        self.future = future
+
+    def poll(self):
+        return 0 if self.future.done() else None
+
+    def kill(self):
+        self.future.cancel()
+
+def _separate_dsp_pooled(file_path, out_paths, channel, job):
+    """separate_dsp_chunked trong một worker của analysis pool; trả về như separate_dsp_chunked"""
+    channel.mkdir()
+    future = executor.get_pool().submit(separate_dsp_chunked, file_path, out_paths, job=FileJobContext(channel))
+    job.attach_process(_PoolJobHandle(future))
+    try:
+        return job.follow(future, channel)
+    except CancelledError:
+        job.raise_if_cancelled()
+        raise
+    finally:
+        job.detach_process()
+
+
+def _isolate_dsp_fallback(file_path, store, key, digest, job=NULL_JOB):
+    out_dir = store.staging_dir()
+    try:
+        out_paths = {}
+        for label in DSP_STEM_LABELS:
+            fname = label.lower().replace(" ", "_").replace("/", "") + ".wav"
+            out_paths[label] = out_dir / fname
+
+        job.report(0.05, "DSP: đang đọc audio")
+        if DSP_MODE == "pool" and job.store is not None and not executor.IN_WORKER:
+            written = _separate_dsp_pooled(file_path, out_paths, out_dir / ".job", job)
+        else:
+            written = separate_dsp_chunked(file_path, out_paths, job=job)
+        if not written:
+            return {}
+        return store.put(key, written, {"digest": digest, "separator": "dsp", "model": None,
+                                        "settings": DSP_SETTINGS})
+    finally:
+        store.discard(out_dir)
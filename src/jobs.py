@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_DB_PATH = Path(os.environ.get("JOB_DB_PATH", "data/jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Job bị huỷ giữa chừng"""
+
+
+class JobStore:
+    """
+    Lưu trạng thái job trong SQLite để không mất khi server restart
+
+    Mỗi thao tác mở một connection riêng nên an toàn khi gọi từ nhiều thread.
+    """
+
+    def __init__(self, db_path=JOB_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    params TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(str(self.db_path), timeout=30)
+
+    def create(self, kind, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, progress, message, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, "Đang chờ xử lý", json.dumps(params), now, now),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def transition(self, job_id, expected, **fields):
+        """update() chỉ khi job đang ở trạng thái expected (một câu UPDATE, không có khe giữa đọc và ghi); True nếu đã đổi"""
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            cursor = conn.execute(f"UPDATE jobs SET {columns} WHERE id = ? AND status = ?",
+                                  (*fields.values(), job_id, expected))
+            return cursor.rowcount > 0
+
+    def unfinished(self):
+        """Các job còn dở (queued/running) - dùng để chạy lại sau khi restart"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, kind, params FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return [(job_id, kind, json.loads(params) if params else {}) for job_id, kind, params in rows]
+
+
+class JobContext:
+    """
+    Handle được truyền vào hàm xử lý để báo tiến độ và hỗ trợ huỷ
+
+    - report(fraction, message): cập nhật tiến độ 0..1
+    - raise_if_cancelled(): ném JobCancelled nếu người dùng đã huỷ
+    - attach_process(proc): đăng ký subprocess (Demucs) để cancel có thể kill
+    """
+
+    def __init__(self, store=None, job_id=None):
+        self.store = store
+        self.job_id = job_id
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._process = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def report(self, fraction, message=None):
+        if self.store is None:
+            return
+        fields = {"progress": float(min(max(fraction, 0.0), 1.0))}
+        if message is not None:
+            fields["message"] = message
+        self.store.update(self.job_id, **fields)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def attach_process(self, proc):
+        with self._lock:
+            self._process = proc
+            kill_now = self.cancelled
+        if kill_now:
+            proc.kill()
+
+    def detach_process(self):
+        with self._lock:
+            self._process = None
+
+    def kill_process(self):
+        with self._lock:
+            proc = self._process
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def cancel(self):
+        self._cancelled.set()
+        self.kill_process()
+
+    def follow(self, future, channel, interval=0.25):
+        """
+        Chờ future của một tác vụ chạy ở process khác với FileJobContext(channel): chuyển tiến độ
+        worker ghi về store, tạo file cancel khi job bị huỷ. Trả về / ném như future.result().
+        """
+        channel = Path(channel)
+        seen = None
+        while True:
+            if self.cancelled:
+                (channel / "cancel").touch()
+            try:
+                return future.result(timeout=interval)
+            except TimeoutError:
+                pass
+            try:
+                state = (channel / "progress.json").read_text()
+            except FileNotFoundError:
+                continue
+            if state != seen:
+                seen = state
+                self.report(*json.loads(state))
+
+
+class FileJobContext:
+    """
+    JobContext phía worker của analysis pool, giao tiếp qua thư mục channel của job: worker ghi
+    tiến độ vào progress.json, process chính tạo file cancel khi job bị huỷ (JobContext.follow).
+    Worker không mở SQLite - worker được fork từ process có thread đang giữ lock của sqlite.
+    """
+
+    def __init__(self, channel):
+        self.channel = Path(channel)
+
+    @property
+    def cancelled(self):
+        return (self.channel / "cancel").exists()
+
+    def report(self, fraction, message=None):
+        tmp = self.channel / f".progress-{uuid.uuid4().hex}"
+        tmp.write_text(json.dumps([fraction, message]))
+        os.replace(tmp, self.channel / "progress.json")
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(str(self.channel))
+
+
+# Context không gắn với job nào: dùng khi gọi isolator trực tiếp (endpoint đồng bộ, script)
+NULL_JOB = JobContext()
+
+
+class JobManager:
+    """
+    Chạy job nền bằng thread pool, trạng thái lưu trong JobStore
+
+    runners: dict kind -> hàm runner(params, job) trả về dict kết quả (JSON được)
+    """
+
+    def __init__(self, store, runners, max_workers=JOB_WORKERS):
+        self.store = store
+        self.runners = dict(runners)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="job")
+        self._active = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def submit(self, kind, params):
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = self.store.create(kind, params)
+        self._schedule(job_id, kind, params)
+        return job_id
+
+    def _schedule(self, job_id, kind, params):
+        ctx = JobContext(self.store, job_id)
+        with self._lock:
+            self._active[job_id] = ctx
+            self._futures[job_id] = self._executor.submit(self._run, job_id, kind, params, ctx)
+
+    def _run(self, job_id, kind, params, ctx):
+        # cancel() có thể ghi CANCELLED bất cứ lúc nào: mọi bước đổi trạng thái đều có điều kiện
+        # (queued -> running -> completed/cancelled/failed), không ghi đè lên job đã bị huỷ
+        try:
+            if ctx.cancelled or not self.store.transition(job_id, QUEUED, status=RUNNING, message="Đang xử lý"):
+                return
+            result = self.runners[kind](params, ctx)
+            ctx.raise_if_cancelled()
+            self.store.transition(job_id, RUNNING, status=COMPLETED, progress=1.0, message="Hoàn tất", result=result)
+        except JobCancelled:
+            if not self._stopping:
+                self.store.transition(job_id, RUNNING, status=CANCELLED, message="Đã huỷ")
+        except Exception as e:
+            if self._stopping:
+                # Server đang tắt: giữ trạng thái running để resume() chạy lại
+                pass
+            elif ctx.cancelled:
+                self.store.transition(job_id, RUNNING, status=CANCELLED, message="Đã huỷ")
+            else:
+                import traceback
+                traceback.print_exc()
+                self.store.transition(job_id, RUNNING, status=FAILED, message="Lỗi",
+                                      error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(job_id, None)
+                self._futures.pop(job_id, None)
+
+    def wait(self, job_id, timeout=None):
+        """Chờ job kết thúc (blocking) rồi trả về bản ghi job"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Huỷ job; trả về False nếu job không tồn tại hoặc đã kết thúc"""
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return False
+        with self._lock:
+            ctx = self._active.get(job_id)
+        if ctx is not None:
+            ctx.cancel()
+        # Job có thể vừa kết thúc sau khi đọc trạng thái ở trên: chỉ huỷ job còn queued/running
+        if any(self.store.transition(job_id, state, status=CANCELLED, message="Đã huỷ")
+               for state in (RUNNING, QUEUED)):
+            return True
+        # Thread của job có thể đã tự ghi CANCELLED ngay sau khi process bị kill
+        return self.store.get(job_id)["status"] == CANCELLED
+
+    def resume(self):
+        """Lên lịch lại các job chưa xong từ lần chạy trước (server bị restart giữa chừng)"""
+        resumed = []
+        for job_id, kind, params in self.store.unfinished():
+            if kind not in self.runners:
+                self.store.update(job_id, status=FAILED, error=f"Unknown job kind: {kind}")
+                continue
+            self.store.update(job_id, status=QUEUED, progress=0.0, message="Chạy lại sau khi server khởi động lại")
+            self._schedule(job_id, kind, params)
+            resumed.append(job_id)
+        return resumed
+
+    def shutdown(self):
+        """Kill các subprocess đang chạy; job giữ trạng thái running để resume() chạy lại"""
+        self._stopping = True
+        with self._lock:
+            contexts = list(self._active.values())
+        for ctx in contexts:
+            ctx._cancelled.set()
+            ctx.kill_process()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,147 @@
+"""
+Engine LPC / cepstrum vector hoá cho nhiều frame cùng lúc
+
+Tín hiệu được chia frame bằng strided view 2-D (n_frames, frame_length), không copy.
+Pre-emphasis, cửa sổ Hamming, autocorrelation (qua FFT), Levinson-Durbin và
+đệ quy LPC -> cepstrum đều chạy trên cả batch frame bằng phép toán mảng;
+vòng lặp Python chỉ còn theo bậc LPC / bậc cepstrum chứ không theo mẫu hay frame.
+"""
+
+import numpy as np
+
+
+def frame_signal(y, frame_length=1024, hop_length=512):
+    """View 2-D (n_frames, frame_length) trên y, không copy dữ liệu"""
+    y = np.asarray(y)
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    frames = np.lib.stride_tricks.sliding_window_view(y, frame_length)
+    return frames[::hop_length]
+
+
+def pre_emphasis(x, alpha=0.9):
+    """
+    y[n] = x[n] - alpha * x[n-1] theo trục cuối; mẫu đầu dùng chính nó (x[0] - alpha * x[0])
+    giống vòng lặp gốc trong InstrumentVoiceProcessor.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    y = np.empty_like(x)
+    y[..., 1:] = x[..., 1:] - alpha * x[..., :-1]
+    y[..., 0] = x[..., 0] - alpha * x[..., 0]
+    return y
+
+
+def hamming_window(N):
+    """w[n] = 0.54 - 0.46 cos(2 pi n / N) (chia cho N như code gốc, không phải N - 1)"""
+    n = np.arange(N)
+    return (0.54 - 0.46 * np.cos(2 * np.pi * n / N)).astype(np.float32)
+
+
+def autocorrelation(frames, max_lag):
+    """Autocorrelation (chưa chuẩn hoá) lag 0..max_lag-1 cho từng frame, tính qua FFT"""
+    frames = np.atleast_2d(frames)
+    N = frames.shape[-1]
+    n_fft = 1 << int(np.ceil(np.log2(2 * N - 1)))
+    spec = np.fft.rfft(frames, n=n_fft, axis=-1)
+    r = np.fft.irfft(spec.real ** 2 + spec.imag ** 2, n=n_fft, axis=-1)
+    return r[..., :max_lag]
+
+
+def levinson_durbin(r, order):
+    """
+    Levinson-Durbin batched: giải hệ Toeplitz cho mọi frame cùng lúc.
+
+    Args:
+        r: autocorrelation (n_frames, >= order + 1)
+    Returns:
+        a: (n_frames, order + 1), a[:, 0] = 1, A(z) = 1 + sum a_k z^-k (cùng quy ước librosa.lpc)
+        err: năng lượng lỗi dự đoán cuối cùng (n_frames,)
+    Frame im lặng (r[0] ~ 0) trả về a = [1, 0, ..., 0].
+    """
+    r = np.atleast_2d(np.asarray(r, dtype=np.float64))
+    n = r.shape[0]
+    a = np.zeros((n, order + 1))
+    a[:, 0] = 1.0
+    err = r[:, 0].copy()
+    valid = err > 1e-12 * max(float(np.max(err)), 1e-30)
+    safe_err = np.where(valid, err, 1.0)
+
+    for i in range(1, order + 1):
+        acc = r[:, i] + np.einsum('nj,nj->n', a[:, 1:i], r[:, i - 1:0:-1])
+        k = np.where(valid, -acc / safe_err, 0.0)
+        a[:, 1:i] = a[:, 1:i] + k[:, np.newaxis] * a[:, i - 1:0:-1]
+        a[:, i] = k
+        safe_err = safe_err * (1.0 - k ** 2)
+        # Chặn trường hợp |k| ~ 1 làm lỗi về 0 (tín hiệu gần như dự đoán hoàn hảo)
+        safe_err = np.maximum(safe_err, 1e-30)
+
+    return a, np.where(valid, safe_err, 0.0)
+
+
+def lpc_to_cepstrum(a, p, max_order=18):
+    """
+    Đệ quy LPC -> cepstrum cho nhiều frame:
+        c[m] = a[m] + sum_{k=1}^{m-1} (k/m) c[k] a[m-k],  a[j] = 0 với j > p
+
+    Args:
+        a: (n_frames, >= p + 1) hệ số dự đoán, cùng quy ước với compute_cepstral_coefficients
+    Returns:
+        c: (n_frames, max_order + 1), c[:, 0] = 0
+    """
+    a = np.atleast_2d(np.asarray(a, dtype=np.float64))
+    n = a.shape[0]
+    coeffs = np.zeros((n, max_order + 1))
+    coeffs[:, 1:min(p, max_order) + 1] = a[:, 1:min(p, max_order) + 1]
+
+    c = np.zeros((n, max_order + 1))
+    for m in range(1, max_order + 1):
+        k = np.arange(1, m)
+        # coeffs[:, m - k] cho k = 1..m-1
+        c[:, m] = coeffs[:, m] + (c[:, 1:m] * coeffs[:, m - 1:0:-1]) @ (k / m)
+    return c
+
+
+def lpc_trajectory(y, sr, order=20, frame_length=1024, hop_length=512, alpha=0.7,
+                   n_cepstra=30, max_lag=None, batch_frames=4096):
+    """
+    LPC + cepstrum theo thời gian trên toàn bộ tín hiệu.
+
+    Các frame được xử lý theo lô batch_frames để bộ nhớ tạm (frame đã nhân cửa sổ, phổ FFT)
+    không tăng theo độ dài file.
+
+    Returns:
+        dict gồm times (giây, tâm frame), lpc (n_frames, order + 1) theo quy ước
+        [-1, -a1, ..., -ap] giống lpc_analysis, cepstrum (n_frames, n_cepstra + 1),
+        autocorrelation (n_frames, max_lag), prediction_error và rms mỗi frame
+    """
+    frames = frame_signal(y, frame_length, hop_length)
+    window = hamming_window(frame_length)
+    max_lag = max_lag or order + 1
+    n_frames = len(frames)
+
+    lpc = np.empty((n_frames, order + 1))
+    cepstrum = np.empty((n_frames, n_cepstra + 1))
+    autocorr = np.empty((n_frames, max_lag))
+    err = np.empty(n_frames)
+    rms = np.empty(n_frames)
+
+    for start in range(0, n_frames, batch_frames):
+        batch = frames[start:start + batch_frames]
+        sl = slice(start, start + len(batch))
+        windowed = pre_emphasis(batch, alpha) * window
+        r = autocorrelation(windowed, max(max_lag, order + 1))
+        a, err[sl] = levinson_durbin(r, order)
+        lpc[sl] = -a
+        cepstrum[sl] = lpc_to_cepstrum(lpc[sl], order, n_cepstra)
+        autocorr[sl] = r[:, :max_lag]
+        rms[sl] = np.sqrt(np.mean(np.square(batch, dtype=np.float64), axis=-1))
+
+    times = (np.arange(n_frames) * hop_length + frame_length / 2) / sr
+    return {
+        "times": times,
+        "lpc": lpc,
+        "cepstrum": cepstrum,
+        "autocorrelation": autocorr,
+        "prediction_error": err,
+        "rms": rms,
+    }
@@ -0,0 +1,113 @@
+"""
+Mã hoá mix dạng stream cho HTTP (chunked response)
+
+- "wav": header RIFF viết trước (số frame đã biết vì limiter giữ nguyên độ dài mix), sau đó
+  là PCM 16-bit của từng block ngay khi block ra khỏi master bus.
+- "mp3" / "ogg": PCM float32 đi qua pipe ffmpeg (stdin do một thread ghi, stdout đọc theo chunk),
+  cần ffmpeg trong PATH.
+"""
+
+import shutil
+import struct
+import subprocess
+import threading
+
+import numpy as np
+
+# định dạng -> (media type, tham số encoder của ffmpeg; None = WAV tự ghi)
+FORMATS = {
+    "wav": ("audio/wav", None),
+    "mp3": ("audio/mpeg", ["-c:a", "libmp3lame", "-b:a", "192k", "-f", "mp3"]),
+    "ogg": ("audio/ogg", ["-c:a", "libopus", "-b:a", "128k", "-f", "ogg"]),
+}
+PIPE_CHUNK = 16384
+
+
+def media_type(fmt):
+    return FORMATS[fmt][0]
+
+
+def format_available(fmt):
+    """WAV luôn có; định dạng nén cần ffmpeg"""
+    if fmt not in FORMATS:
+        return False
+    return FORMATS[fmt][1] is None or shutil.which("ffmpeg") is not None
+
+
+def wav_header(sr, n_frames, channels=2):
+    """Header WAV PCM 16-bit (44 byte) cho n_frames frame; n_frames=None -> kích thước 0xFFFFFFFF (không rõ)"""
+    block_align = channels * 2
+    if n_frames is None:
+        data_size = riff_size = 0xFFFFFFFF
+    else:
+        data_size = n_frames * block_align
+        riff_size = min(36 + data_size, 0xFFFFFFFF)
+    return (b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sr, sr * block_align, block_align, 16)
+            + b"data" + struct.pack("<I", min(data_size, 0xFFFFFFFF)))
+
+
+def pcm16_bytes(block):
+    """Block (n, channels) float -> PCM 16-bit little-endian xen kẽ"""
+    return (np.clip(block, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+
+def _ffmpeg_encode(sr, blocks, encoder_args, channels=2):
+    proc = subprocess.Popen(
+        [shutil.which("ffmpeg"), "-nostdin", "-v", "error", "-f", "f32le", "-ar", str(sr), "-ac", str(channels),
+         "-i", "-"] + encoder_args + ["-"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    errors = []
+
+    def feed():
+        try:
+            for block in blocks:
+                proc.stdin.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        while True:
+            chunk = proc.stdout.read1(PIPE_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+        writer.join()
+        if errors:
+            raise errors[0]
+        if proc.wait() != 0:
+            raise RuntimeError("ffmpeg failed to encode the mix stream")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        # Client ngắt giữa chừng: ffmpeg đã bị kill nên thread ghi dừng ở lần ghi kế tiếp,
+        # sau đó mới đóng generator render để giải phóng track
+        writer.join()
+        if hasattr(blocks, "close"):
+            blocks.close()
+
+
+def encode_stream(sr, n_frames, blocks, fmt="wav"):
+    """Generator bytes của mix theo định dạng fmt, từ các block (n, 2) float32"""
+    encoder_args = FORMATS[fmt][1]
+    if encoder_args is not None:
+        yield from _ffmpeg_encode(sr, blocks, encoder_args)
+        return
+    try:
+        yield wav_header(sr, n_frames)
+        for block in blocks:
+            yield pcm16_bytes(block)
+    finally:
+        if hasattr(blocks, "close"):
+            blocks.close()
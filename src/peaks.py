@@ -0,0 +1,195 @@
+"""
+Kim tự tháp peak (min/max/RMS) cho hiển thị waveform ở mọi mức zoom
+
+Dựng một lần cho mỗi nội dung file (đọc stream theo block, không decode cả file vào RAM)
+và lưu thành sidecar nhị phân cache/peaks/<hash>.peaks, tương tự định dạng .dat của
+audiowaveform nhưng có nhiều level:
+
+    header  '<4sIIIQII'  magic b"WPK1", version, sample_rate, base_block, length (mẫu),
+                         n_levels, reserved
+    bảng    n_levels x '<QQ'  (offset byte, số block) của từng level
+    data    mỗi level là mảng int16 (min, max, rms) theo block; level k có block = base_block * 2^k
+
+Truy vấn (start, end, points) chọn level thô nhất có block <= số mẫu / điểm rồi chỉ đọc
+O(points) block qua memmap; khi zoom sâu hơn level 0 thì đọc thẳng đoạn mẫu gốc (< points * base_block mẫu).
+"""
+
+import os
+import struct
+import uuid
+
+import numpy as np
+
+from .audio_cache import CACHE_ROOT, file_digest, load_frames
+
+PEAKS_DIR = CACHE_ROOT / "peaks"
+MAGIC = b"WPK1"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQII")
+LEVEL_ENTRY = struct.Struct("<QQ")
+PEAK_DTYPE = np.dtype([("min", "<i2"), ("max", "<i2"), ("rms", "<i2")])
+BASE_BLOCK = 256
+READ_BLOCKS = 4096  # số block level 0 mỗi lần đọc khi dựng (~1M mẫu)
+SCALE = 32767.0
+
+
+def _to_int16(x):
+    return np.clip(np.rint(x * SCALE), -32768, 32767).astype(np.int16)
+
+
+def _reduce(y, edges):
+    """min/max/rms (float) của y trên các đoạn bắt đầu tại edges (đoạn cuối tới hết y)"""
+    edges = np.minimum(edges, max(len(y) - 1, 0))
+    counts = np.diff(np.append(edges, len(y)))
+    counts = np.where(counts > 0, counts, 1)
+    sq = np.add.reduceat(np.square(y, dtype=np.float64), edges)
+    return np.minimum.reduceat(y, edges), np.maximum.reduceat(y, edges), np.sqrt(sq / counts)
+
+
+def _iter_mono_blocks(audio_path, n):
+    """Đọc bản canonical (memmap) theo block n mẫu, downmix mono float32"""
+    frames, sr = load_frames(audio_path)
+    yield sr
+    for start in range(0, len(frames), n):
+        yield frames[start:start + n].mean(axis=1, dtype=np.float32)
+
+
+def _next_level(level):
+    """Gộp từng cặp block liền kề (block lẻ cuối cùng giữ nguyên)"""
+    n = len(level)
+    if n % 2:
+        level = np.concatenate((level, level[-1:]))
+    pairs = level.reshape(-1, 2)
+    out = np.empty(len(pairs), dtype=PEAK_DTYPE)
+    out["min"] = pairs["min"].min(axis=1)
+    out["max"] = pairs["max"].max(axis=1)
+    rms = pairs["rms"].astype(np.float64)
+    out["rms"] = np.rint(np.sqrt(np.mean(rms ** 2, axis=1)))
+    return out
+
+
+def build_peaks(audio_path, output_path, base_block=BASE_BLOCK):
+    """Dựng kim tự tháp peak cho audio_path và ghi (atomic) ra output_path"""
+    reader = _iter_mono_blocks(audio_path, base_block * READ_BLOCKS)
+    sr = next(reader)
+    chunks, length = [], 0
+    for y in reader:
+        if len(y) == 0:
+            continue
+        lo, hi, rms = _reduce(y, np.arange(0, len(y), base_block))
+        level0 = np.empty(len(lo), dtype=PEAK_DTYPE)
+        level0["min"], level0["max"], level0["rms"] = _to_int16(lo), _to_int16(hi), _to_int16(rms)
+        chunks.append(level0)
+        length += len(y)
+
+    levels = [np.concatenate(chunks) if chunks else np.zeros(0, dtype=PEAK_DTYPE)]
+    while len(levels[-1]) > 1:
+        levels.append(_next_level(levels[-1]))
+
+    offset = HEADER.size + LEVEL_ENTRY.size * len(levels)
+    table = []
+    for level in levels:
+        table.append((offset, len(level)))
+        offset += level.nbytes
+
+    output_path = os.fspath(output_path)
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, int(sr), base_block, length, len(levels), 0))
+        for entry in table:
+            f.write(LEVEL_ENTRY.pack(*entry))
+        for level in levels:
+            f.write(level.tobytes())
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class PeakPyramid:
+    """Đọc sidecar .peaks qua memmap; mỗi truy vấn chỉ chạm O(points) block"""
+
+    def __init__(self, path, audio_path=None):
+        self.path = path
+        self.audio_path = audio_path
+        with open(path, "rb") as f:
+            magic, version, sr, base, length, n_levels, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a peak file: {path}")
+            table = [LEVEL_ENTRY.unpack(f.read(LEVEL_ENTRY.size)) for _ in range(n_levels)]
+        self.sample_rate = sr
+        self.base_block = base
+        self.length = length
+        self.levels = [
+            np.memmap(path, dtype=PEAK_DTYPE, mode='r', offset=off, shape=(count,)) if count else
+            np.zeros(0, dtype=PEAK_DTYPE)
+            for off, count in table
+        ]
+
+    def _raw(self, s0, s1):
+        frames, _ = load_frames(self.audio_path)
+        return frames[s0:s1].mean(axis=1, dtype=np.float32)
+
+    def query(self, start=None, end=None, points=600):
+        """
+        min/max/rms (float trong [-1, 1]) cho `points` điểm chia đều đoạn [start, end) giây.
+
+        Returns:
+            dict gồm min, max, rms (list), start/end (giây), samples_per_point và level đã dùng
+            (-1 = đọc mẫu gốc)
+        """
+        sr = self.sample_rate
+        s0 = 0 if start is None else int(max(0.0, float(start)) * sr)
+        s1 = self.length if end is None else int(max(0.0, float(end)) * sr)
+        s0, s1 = min(s0, self.length), min(s1, self.length)
+        span = s1 - s0
+        points = int(max(0, min(int(points), span)))
+        if points == 0:
+            return {"min": [], "max": [], "rms": [], "start": s0 / sr, "end": s1 / sr,
+                    "samples_per_point": 0, "level": 0}
+
+        spp = span / points
+        # Vị trí mẫu bắt đầu của từng điểm
+        bounds = s0 + (np.arange(points) * span) // points
+
+        if spp < self.base_block and self.audio_path is not None:
+            y = self._raw(s0, s1)
+            lo, hi, rms = _reduce(y, bounds - s0)
+            level = -1
+        else:
+            level = min(max(int(np.log2(spp / self.base_block)), 0), len(self.levels) - 1)
+            block = self.base_block << level
+            b0, b1 = s0 // block, -(-s1 // block)
+            blocks = np.asarray(self.levels[level][b0:b1])
+            edges = bounds // block - b0
+            # Block chứa mẫu cuối của mỗi điểm có thể nằm vắt sang điểm sau: gộp thêm để envelope
+            # luôn bao trọn tín hiệu thật
+            last = (np.append(bounds[1:], s1) - 1) // block - b0
+            lo = np.minimum(np.minimum.reduceat(blocks["min"], edges), blocks["min"][last]) / SCALE
+            hi = np.maximum(np.maximum.reduceat(blocks["max"], edges), blocks["max"][last]) / SCALE
+            counts = np.diff(np.append(edges, len(blocks)))
+            counts = np.where(counts > 0, counts, 1)
+            sq = np.add.reduceat(blocks["rms"].astype(np.float64) ** 2, edges)
+            rms = np.sqrt(sq / counts) / SCALE
+
+        return {
+            "min": np.round(np.asarray(lo, dtype=np.float64), 5).tolist(),
+            "max": np.round(np.asarray(hi, dtype=np.float64), 5).tolist(),
+            "rms": np.round(np.asarray(rms, dtype=np.float64), 5).tolist(),
+            "start": s0 / sr,
+            "end": s1 / sr,
+            "samples_per_point": float(spp),
+            "level": level,
+        }
+
+
+def ensure_peaks(audio_path, peaks_dir=PEAKS_DIR):
+    """Đường dẫn sidecar .peaks của file, dựng nếu chưa có (gọi sau khi upload)"""
+    peaks_dir.mkdir(parents=True, exist_ok=True)
+    path = peaks_dir / f"{file_digest(audio_path)}.peaks"
+    if not path.exists():
+        build_peaks(audio_path, path)
+    return path
+
+
+def get_peaks(audio_path, peaks_dir=PEAKS_DIR):
+    """Kim tự tháp peak của file (dựng lần đầu, các lần sau chỉ mở sidecar)"""
+    return PeakPyramid(ensure_peaks(audio_path, peaks_dir), audio_path)
@@ -0,0 +1,203 @@
+"""
+Engine theo dõi pitch (f0) cho cả track
+
+Hai thuật toán:
+- "pyin": librosa.pyin (HMM + Viterbi), chính xác nhất nhưng chậm
+- "yin":  YIN vector hoá qua FFT (hàm hiệu từ tương quan chéo + tổng tích luỹ năng lượng),
+          nhanh hơn nhiều lần, voicing theo ngưỡng CMND + năng lượng frame
+
+Audio dài được chia thành các chunk (căn theo hop, frame giữ đúng vị trí toàn cục như
+center=True) chạy song song: thread khi đã ở trong worker của AnalysisPool (không tạo pool
+lồng nhau), process khi gọi trực tiếp. Với pyin, mỗi chunk lấy thêm overlap_seconds hai bên
+để Viterbi ổn định ở biên rồi chỉ giữ phần giữa; yin không phụ thuộc frame lân cận nên
+không cần overlap (kết quả giống hệt khi chạy cả file).
+
+Kết quả dạng gọn: mảng f0 đủ độ phân giải (None = không có pitch) với frame_period thay cho
+danh sách thời gian; max_points giảm số điểm phía server (median các frame có pitch trong nhóm).
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import librosa
+
+from . import executor
+
+ALGORITHMS = ("pyin", "yin")
+FMIN = 27.5       # A0 - nốt thấp nhất của piano
+FMAX = 4186.0     # C8 - nốt cao nhất của piano
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+CHUNK_SECONDS = 30.0
+OVERLAP_SECONDS = 2.0
+TROUGH_THRESHOLD = 0.1    # ngưỡng chọn đáy CMND đầu tiên (như librosa.yin)
+VOICING_THRESHOLD = 0.3   # CMND tại đáy đã chọn phải nhỏ hơn ngưỡng này mới coi là có pitch
+SILENCE_DB = -60.0        # frame có RMS thấp hơn mức này (dBFS) coi là im lặng
+YIN_BATCH_FRAMES = 1024
+
+
+def _segment(y, s0, s1):
+    """y[s0:s1] với phần nằm ngoài [0, len(y)) điền 0 (pad kiểu center=True, pad_mode='constant')"""
+    seg = np.zeros(s1 - s0, dtype=np.float32)
+    a, b = max(s0, 0), min(s1, len(y))
+    if b > a:
+        seg[a - s0:b - s0] = y[a:b]
+    return seg
+
+
+def yin_fft(y, sr, fmin=FMIN, fmax=FMAX, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+            trough_threshold=TROUGH_THRESHOLD, voicing_threshold=VOICING_THRESHOLD, silence_db=SILENCE_DB):
+    """
+    YIN trên các frame không center của y (1 + (len(y) - frame_length) // hop_length frame).
+
+    Returns:
+        f0 (NaN khi không có pitch), voiced_probability (1 - CMND tại đáy, cắt về [0, 1])
+    """
+    win_length = frame_length // 2
+    tau_min = max(1, int(np.floor(sr / fmax)))
+    tau_max = min(frame_length - win_length - 1, int(np.ceil(sr / fmin)))
+    if len(y) < frame_length:
+        return np.zeros(0), np.zeros(0)
+    frames = np.lib.stride_tricks.sliding_window_view(np.asarray(y, dtype=np.float32), frame_length)[::hop_length]
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + win_length)))
+    taus = np.arange(tau_max + 1)
+
+    f0 = np.full(len(frames), np.nan)
+    prob = np.zeros(len(frames))
+    for b0 in range(0, len(frames), YIN_BATCH_FRAMES):
+        x = frames[b0:b0 + YIN_BATCH_FRAMES].astype(np.float64)
+        # c(tau) = sum_j x[j] * x[j + tau], j < win_length
+        corr = np.fft.irfft(np.conj(np.fft.rfft(x[:, :win_length], n_fft)) * np.fft.rfft(x, n_fft), n_fft)
+        corr = corr[:, :tau_max + 1]
+        cs = np.concatenate((np.zeros((len(x), 1)), np.cumsum(x ** 2, axis=1)), axis=1)
+        energy = cs[:, taus + win_length] - cs[:, taus]
+        diff = np.maximum(cs[:, [win_length]] + energy - 2 * corr, 0.0)
+        diff[:, 0] = 0.0
+
+        # Cumulative mean normalized difference
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        cmnd = np.ones_like(diff)
+        cmnd[:, 1:] = diff[:, 1:] * taus[1:] / np.maximum(cumulative, 1e-12)
+
+        search = cmnd[:, tau_min:tau_max + 1]
+        local_min = np.zeros_like(search, dtype=bool)
+        local_min[:, 1:-1] = (search[:, 1:-1] <= search[:, :-2]) & (search[:, 1:-1] < search[:, 2:])
+        candidates = local_min & (search < trough_threshold)
+        has_trough = candidates.any(axis=1)
+        idx = np.where(has_trough, np.argmax(candidates, axis=1), np.argmin(search, axis=1))
+        tau = idx + tau_min
+
+        # Nội suy parabol quanh đáy
+        rows = np.arange(len(x))
+        left = cmnd[rows, np.maximum(tau - 1, 0)]
+        mid = cmnd[rows, tau]
+        right = cmnd[rows, np.minimum(tau + 1, tau_max)]
+        denom = left - 2 * mid + right
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+        period = tau + np.clip(shift, -1, 1)
+
+        rms = np.sqrt(np.mean(x ** 2, axis=1))
+        loud = 20 * np.log10(np.maximum(rms, 1e-10)) > silence_db
+        voiced = loud & (mid < voicing_threshold)
+        f0[b0:b0 + len(x)] = np.where(voiced, sr / period, np.nan)
+        prob[b0:b0 + len(x)] = np.where(loud, np.clip(1 - mid, 0, 1), 0.0)
+    return f0, prob
+
+
+def _track_segment(segment, sr, algorithm, fmin, fmax, frame_length, hop_length):
+    if algorithm == "pyin":
+        f0, _, prob = librosa.pyin(segment, fmin=fmin, fmax=fmax, sr=sr, frame_length=frame_length,
+                                   hop_length=hop_length, center=False)
+        return f0, prob
+    return yin_fft(segment, sr, fmin, fmax, frame_length, hop_length)
+
+
+def _plan_chunks(n_frames, frames_per_chunk, overlap_frames):
+    """[(a, b, keep_from, keep_to)]: tính frame [a, b), giữ [keep_from, keep_to)"""
+    plan = []
+    for f0 in range(0, n_frames, frames_per_chunk):
+        f1 = min(n_frames, f0 + frames_per_chunk)
+        plan.append((max(0, f0 - overlap_frames), min(n_frames, f1 + overlap_frames), f0, f1))
+    return plan
+
+
+def track(y, sr, algorithm="pyin", fmin=FMIN, fmax=FMAX, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+          chunk_seconds=CHUNK_SECONDS, overlap_seconds=None, workers=None):
+    """
+    f0 + xác suất có pitch cho từng frame (center=True: frame i ở thời điểm i * hop_length / sr)
+
+    Returns:
+        (f0, voiced_probability), mỗi mảng dài 1 + len(y) // hop_length
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown pitch algorithm '{algorithm}', expected one of {ALGORITHMS}")
+    if overlap_seconds is None:
+        overlap_seconds = OVERLAP_SECONDS if algorithm == "pyin" else 0.0
+
+    n_frames = 1 + len(y) // hop_length
+    # Trong worker của pool: chỉ phần cpu_count / số worker (pool_size worker cùng chạy pitch
+    # thì không tạo pool_size x cpu_count thread)
+    workers = max(1, int(workers or executor.WORKER_THREADS))
+    # Chunk không nhỏ hơn phần chia đều cho các worker: chạy 1 worker thì cả file là một chunk,
+    # không tốn công tính lại phần overlap
+    frames_per_chunk = max(int(chunk_seconds * sr / hop_length), -(-n_frames // workers), 1)
+    overlap_frames = int(np.ceil(overlap_seconds * sr / hop_length))
+    pad = frame_length // 2
+
+    plan = _plan_chunks(n_frames, frames_per_chunk, overlap_frames)
+    segments = [_segment(y, a * hop_length - pad, (b - 1) * hop_length - pad + frame_length)
+                for a, b, _, _ in plan]
+    args = (sr, algorithm, fmin, fmax, frame_length, hop_length)
+
+    workers = min(len(plan), workers)
+    if workers <= 1:
+        results = [_track_segment(seg, *args) for seg in segments]
+    else:
+        # Đã ở trong worker process (daemon) thì không tạo process con được -> dùng thread
+        pool_cls = ThreadPoolExecutor if executor.IN_WORKER else ProcessPoolExecutor
+        with pool_cls(max_workers=workers) as pool:
+            futures = [pool.submit(_track_segment, seg, *args) for seg in segments]
+            results = [f.result() for f in futures]
+
+    f0 = np.full(n_frames, np.nan)
+    prob = np.zeros(n_frames)
+    for (a, _, keep_from, keep_to), (chunk_f0, chunk_prob) in zip(plan, results):
+        f0[keep_from:keep_to] = chunk_f0[keep_from - a:keep_to - a]
+        prob[keep_from:keep_to] = chunk_prob[keep_from - a:keep_to - a]
+    return f0, prob
+
+
+def decimate(f0, factor):
+    """Median của các frame có pitch trong từng nhóm `factor` frame (NaN nếu cả nhóm không có pitch)"""
+    if factor <= 1:
+        return np.asarray(f0, dtype=np.float64)
+    n = -(-len(f0) // factor)
+    padded = np.full(n * factor, np.nan)
+    padded[:len(f0)] = f0
+    groups = padded.reshape(n, factor)
+    out = np.full(n, np.nan)
+    has = ~np.all(np.isnan(groups), axis=1)
+    out[has] = np.nanmedian(groups[has], axis=1)
+    return out
+
+
+def summarize(f0, sr, hop_length, algorithm, max_points=None):
+    """Kết quả gọn (JSON) từ track đủ độ phân giải"""
+    factor = 1 if not max_points else max(1, -(-len(f0) // int(max_points)))
+    reduced = decimate(f0, factor)
+    voiced = f0[~np.isnan(f0)]
+    return {
+        "algorithm": algorithm,
+        "sample_rate": int(sr),
+        "hop_length": hop_length,
+        "decimation": factor,
+        # Thời điểm của điểm i = i * frame_period (frame tâm tại i * hop_length * decimation)
+        "frame_period": hop_length * factor / sr,
+        "n_frames": int(len(f0)),
+        "f0": [None if np.isnan(v) else round(float(v), 2) for v in reduced],
+        "voiced_ratio": float(len(voiced) / len(f0)) if len(f0) else 0.0,
+        "f0_mean": float(np.mean(voiced)) if len(voiced) else 0.0,
+        "f0_median": float(np.median(voiced)) if len(voiced) else 0.0,
+        "f0_min": float(np.min(voiced)) if len(voiced) else 0.0,
+        "f0_max": float(np.max(voiced)) if len(voiced) else 0.0,
+    }
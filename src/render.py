@@ -0,0 +1,213 @@
+"""
+Render ảnh PNG cho spectrogram / waveform / đồ thị mà không dùng pyplot
+
+- Colormap dạng lookup table (256 x RGBA uint8), áp bằng numpy indexing
+- Spectrogram được resample sẵn về đúng lưới pixel của trục (tần số log qua bảng chỉ số),
+  nên Agg chỉ phải blit một ảnh RGBA thay vì vẽ hàng triệu ô pcolormesh
+- Figure / FigureCanvasAgg hướng đối tượng với layout cố định (không tight_layout,
+  không bbox_inches='tight'), an toàn khi chạy song song nhiều thread
+- encode_png: encoder PNG tối giản (zlib) cho ảnh thô không cần trục
+"""
+
+import struct
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from matplotlib.scale import SymmetricalLogTransform
+from matplotlib.ticker import FuncFormatter
+
+# Cùng tham số trục 'log' của librosa.display.specshow (symlog base 2, linthresh = C2)
+LOG_AXIS_LINTHRESH = 65.40639132514966
+LOG_AXIS_LINSCALE = 0.5
+DEFAULT_COLOR = "#1f77b4"
+
+
+# --- Colormap LUT + PNG encoder ---
+
+@lru_cache(maxsize=16)
+def colormap_lut(name, n=256):
+    """Bảng (n, 4) uint8 RGBA của colormap matplotlib"""
+    cmap = colormaps[name].resampled(n)
+    lut = (cmap(np.arange(n)) * 255 + 0.5).astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+def apply_colormap(data, cmap="magma", vmin=None, vmax=None):
+    """Ma trận giá trị -> ảnh RGBA uint8 (cùng shape + 4) qua LUT"""
+    data = np.asarray(data, dtype=np.float32)
+    vmin = float(np.nanmin(data)) if vmin is None else vmin
+    vmax = float(np.nanmax(data)) if vmax is None else vmax
+    lut = colormap_lut(cmap)
+    scale = (len(lut) - 1) / max(vmax - vmin, 1e-12)
+    idx = np.clip((data - vmin) * scale + 0.5, 0, len(lut) - 1)
+    return lut[np.nan_to_num(idx).astype(np.intp)]
+
+
+def _png_chunk(tag, payload):
+    return (struct.pack(">I", len(payload)) + tag + payload
+            + struct.pack(">I", zlib.crc32(tag + payload) & 0xffffffff))
+
+
+def encode_png(rgba, compress_level=6):
+    """Encode ảnh (H, W, 4) hoặc (H, W, 3) uint8 thành bytes PNG (hàng 0 ở trên cùng)"""
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    height, width, channels = rgba.shape
+    color_type = {3: 2, 4: 6}[channels]
+    # Mỗi scanline bắt đầu bằng byte filter 0 (None)
+    raw = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, -1)
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level))
+            + _png_chunk(b"IEND", b""))
+
+
+def write_png(path, rgba, compress_level=6):
+    with open(path, "wb") as f:
+        f.write(encode_png(rgba, compress_level))
+
+
+# --- Resample về lưới pixel ---
+
+def _log_axis_transform():
+    return SymmetricalLogTransform(base=2, linthresh=LOG_AXIS_LINTHRESH, linscale=LOG_AXIS_LINSCALE)
+
+
+def log_frequency_rows(n_bins, sr, n_rows):
+    """
+    Chỉ số bin STFT cho từng hàng pixel (hàng 0 ở dưới) khi trục tần số là symlog như specshow.
+    """
+    transform = _log_axis_transform()
+    nyquist = sr / 2.0
+    top = transform.transform(np.array([[nyquist]]))[0, 0]
+    centers = (np.arange(n_rows) + 0.5) / n_rows * top
+    freqs = transform.inverted().transform(centers[:, np.newaxis])[:, 0]
+    return np.clip(np.rint(freqs / nyquist * (n_bins - 1)), 0, n_bins - 1).astype(np.intp)
+
+
+def _column_index(n_frames, n_cols):
+    return np.minimum(((np.arange(n_cols) + 0.5) * n_frames / n_cols).astype(np.intp), n_frames - 1)
+
+
+def minmax_envelope(y, n_cols):
+    """Min/max của tín hiệu trên mỗi cột pixel (cột cuối có thể ngắn hơn)"""
+    y = np.asarray(y, dtype=np.float32)
+    if len(y) == 0:
+        return np.zeros(n_cols, np.float32), np.zeros(n_cols, np.float32)
+    n_cols = min(n_cols, len(y))
+    edges = (np.arange(n_cols) * len(y)) // n_cols
+    return np.minimum.reduceat(y, edges), np.maximum.reduceat(y, edges)
+
+
+# --- Figure hướng đối tượng ---
+
+def _figure(figsize, dpi=100):
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _axes_pixels(fig, ax):
+    width, height = fig.get_size_inches() * fig.dpi
+    pos = ax.get_position()
+    return max(1, int(round(pos.width * width))), max(1, int(round(pos.height * height)))
+
+
+def _time_formatter():
+    def fmt(x, pos=None):
+        minutes, seconds = divmod(max(x, 0.0), 60)
+        return f"{int(minutes)}:{seconds:02.0f}" if minutes else f"{seconds:.3g}"
+    return FuncFormatter(fmt)
+
+
+def render_spectrogram(D, sr, hop_length, output_path, title="Log-Frequency Spectrogram",
+                       figsize=(10, 4), dpi=100, cmap="magma", transparent=True):
+    """
+    Spectrogram dB (n_bins, n_frames) với trục tần số log + colorbar, thay cho
+    specshow(y_axis='log', x_axis='time') + colorbar + tight_layout.
+    """
+    n_bins, n_frames = D.shape
+    duration = n_frames * hop_length / sr
+    vmin, vmax = float(np.min(D)), float(np.max(D))
+
+    fig = _figure(figsize, dpi)
+    ax = fig.add_axes([0.08, 0.14, 0.76, 0.76])
+    cax = fig.add_axes([0.86, 0.14, 0.02, 0.76])
+
+    cols, rows = _axes_pixels(fig, ax)
+    grid = np.asarray(D)[log_frequency_rows(n_bins, sr, rows)][:, _column_index(n_frames, cols)]
+    image = apply_colormap(grid, cmap, vmin, vmax)
+
+    transform = _log_axis_transform()
+    top = transform.transform(np.array([[sr / 2.0]]))[0, 0]
+    ax.imshow(image, origin="lower", aspect="auto", interpolation="nearest",
+              extent=(0, duration, 0, top))
+
+    # Tick tại các lũy thừa của 2 (như LogHzFormatter của librosa), vị trí đã biến đổi symlog
+    ticks = np.array([0] + [2 ** k for k in range(6, 16) if 2 ** k < sr / 2])
+    ax.set_yticks(transform.transform(ticks[:, np.newaxis].astype(float))[:, 0])
+    ax.set_yticklabels([str(int(t)) for t in ticks])
+    ax.set_ylabel("Hz")
+    ax.xaxis.set_major_formatter(_time_formatter())
+    ax.set_xlabel("Time")
+    ax.set_title(title)
+
+    mappable = ScalarMappable(norm=Normalize(vmin, vmax), cmap=colormaps[cmap])
+    fig.colorbar(mappable, cax=cax, format="%+2.0f dB")
+    fig.savefig(output_path, transparent=transparent)
+    return output_path
+
+
+def render_waveform(y, sr, output_path, title="Waveform Envelope", figsize=(10, 3), dpi=100,
+                    alpha=0.5, color=DEFAULT_COLOR, transparent=True):
+    """Envelope min/max theo cột pixel, thay cho librosa.display.waveshow + tight_layout"""
+    duration = len(y) / sr if sr else 0.0
+    fig = _figure(figsize, dpi)
+    ax = fig.add_axes([0.07, 0.18, 0.9, 0.7])
+    cols, _ = _axes_pixels(fig, ax)
+    lo, hi = minmax_envelope(y, cols * 2)
+    x = np.linspace(0, duration, len(lo))
+    ax.fill_between(x, lo, hi, color=color, alpha=alpha, linewidth=0)
+    ax.set_xlim(0, duration)
+    ax.xaxis.set_major_formatter(_time_formatter())
+    ax.set_xlabel("Time")
+    ax.set_title(title)
+    fig.savefig(output_path, transparent=transparent)
+    return output_path
+
+
+def render_image(matrix, output_path, title, xlabel, ylabel, cmap="gray", figsize=(12, 6), dpi=150,
+                 vmin=None, vmax=None):
+    """Ma trận (hàng 0 ở dưới) vẽ như imshow(origin='lower', aspect='auto') với nhãn trục"""
+    matrix = np.asarray(matrix)
+    fig = _figure(figsize, dpi)
+    ax = fig.add_axes([0.07, 0.09, 0.91, 0.85])
+    ax.imshow(apply_colormap(matrix, cmap, vmin, vmax), origin="lower", aspect="auto",
+              interpolation="nearest", extent=(-0.5, matrix.shape[1] - 0.5, -0.5, matrix.shape[0] - 0.5))
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    fig.savefig(output_path)
+    return output_path
+
+
+def render_line(values, output_path, title, xlabel, ylabel, figsize=(10, 4), dpi=150,
+                color="#2196F3", linewidth=2, grid_alpha=0.3):
+    """Đồ thị đường đơn giản (autocorrelation...)"""
+    fig = _figure(figsize, dpi)
+    ax = fig.add_axes([0.1, 0.13, 0.87, 0.78])
+    ax.plot(np.asarray(values), linewidth=linewidth, color=color)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True, alpha=grid_alpha)
+    fig.savefig(output_path)
+    return output_path
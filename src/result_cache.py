@@ -0,0 +1,158 @@
+"""
+Cache kết quả phân tích, lưu bền trong SQLite
+
+Khoá = (hash nội dung file, tên method, tham số, phiên bản thuật toán). Giá trị là payload
+JSON cùng danh sách file artifact (PNG...) mà payload trỏ tới. Khi tổng dung lượng
+(payload + artifact) vượt max_bytes, các entry lâu không dùng nhất bị xoá cùng artifact.
+Entry có artifact đã mất (bị xoá tay...) được coi là miss.
+
+Khi sửa thuật toán của một method, tăng số phiên bản trong ALGORITHM_VERSIONS để các
+kết quả cũ tự động không còn được dùng.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+from .audio_cache import file_digest
+
+RESULT_DB_PATH = Path(os.environ.get("RESULT_CACHE_PATH", "data/results.sqlite3"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+# Phiên bản thuật toán theo method (mặc định 1)
+ALGORITHM_VERSIONS = {
+    "analyze_audio_features": 2,
+    "extract_acoustic_features": 3,
+    "analyze_cutoff": 2,
+    "lpc_analysis": 4,
+    "generate_waveform_data": 2,
+    "generate_detailed_spectrogram": 2,
+    "generate_autocorrelation_plot": 4,
+    "analyze_vad": 2,
+    "pitch_tracking": 3,
+}
+
+
+def algorithm_version(method):
+    return ALGORITHM_VERSIONS.get(method, 1)
+
+
+def make_key(digest, method, params=None):
+    payload = json.dumps(
+        {"digest": digest, "method": method, "params": params or {}, "version": algorithm_version(method)},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Store SQLite cho kết quả phân tích với LRU giới hạn dung lượng
+
+    Mỗi thao tác mở một connection riêng nên an toàn khi gọi từ nhiều thread.
+    """
+
+    def __init__(self, db_path=RESULT_DB_PATH, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.db_path = Path(db_path)
+        self.max_bytes = int(max_bytes)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._evict_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    artifacts TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(str(self.db_path), timeout=30)
+
+    def key_for(self, file_path, method, params=None):
+        return make_key(file_digest(file_path), method, params)
+
+    def get(self, key):
+        """Payload đã cache hoặc None (miss / artifact đã mất)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, artifacts FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, artifacts = row
+            if not all(Path(p).exists() for p in json.loads(artifacts)):
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(value)
+
+    def put(self, key, method, value, artifacts=()):
+        value_json = json.dumps(value, default=str)
+        artifacts = [str(p) for p in artifacts]
+        size = len(value_json) + sum(Path(p).stat().st_size for p in artifacts if Path(p).exists())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, method, value, artifacts, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, method, value_json, json.dumps(artifacts), size, now, now),
+            )
+        self.evict()
+
+    def size_bytes(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        """Xoá entry lâu không dùng nhất (kèm artifact) cho tới khi tổng <= max_bytes"""
+        with self._evict_lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute("SELECT key, artifacts, size FROM results ORDER BY last_used").fetchall()
+            for key, artifacts, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                for p in json.loads(artifacts):
+                    try:
+                        Path(p).unlink()
+                    except OSError:
+                        pass
+                total -= size
+
+    def cached(self, file_path, method, params, compute, artifacts=None):
+        """
+        Đồng bộ: trả về (value, cache_hit). compute() chỉ chạy khi miss;
+        artifacts(value) -> danh sách file mà value trỏ tới.
+        """
+        key = self.key_for(file_path, method, params)
+        hit = self.get(key)
+        if hit is not None:
+            return hit, True
+        value = compute()
+        self.put(key, method, value, artifacts(value) if artifacts else ())
+        return value, False
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
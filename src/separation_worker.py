@@ -0,0 +1,274 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+
+DEMUCS_MODEL = os.environ.get("DEMUCS_MODEL", "htdemucs")
+DEMUCS_DEVICE = os.environ.get("DEMUCS_DEVICE")  # None = tự chọn cuda/cpu
+DEMUCS_SHIFTS = int(os.environ.get("DEMUCS_SHIFTS", 1))
+# Thời gian chờ worker load model (giây)
+STARTUP_TIMEOUT = float(os.environ.get("DEMUCS_STARTUP_TIMEOUT", 300))
+# Sau khi khởi động thất bại (vd. chưa cài demucs), chờ bao lâu mới thử lại
+RESTART_COOLDOWN = float(os.environ.get("DEMUCS_RESTART_COOLDOWN", 300))
+
+
+class SeparationCancelled(Exception):
+    """Job bị huỷ trước hoặc trong khi worker đang tách"""
+
+
+def _worker_main(model_name, device, shifts, requests, results):
+    """
+    Vòng lặp của process Demucs thường trú: import torch + load weights một lần,
+    sau đó nhận job (job_id, audio_path, output_dir) từ requests cho tới khi nhận None.
+    Gửi về results các message ("ready"|"progress"|"done"|"error", job_id, payload).
+    """
+    try:
+        import types
+        import torch
+        import demucs.apply
+        from demucs.apply import apply_model
+        from demucs.audio import AudioFile, save_audio
+        from demucs.pretrained import get_model
+
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = get_model(model_name)
+        model.to(device)
+        model.eval()
+    except Exception as e:
+        results.put(("error", None, f"{type(e).__name__}: {e}"))
+        return
+
+    current = {"job_id": None}
+
+    def _progress_tqdm(iterable, *args, **kwargs):
+        # apply_model bọc các segment bằng tqdm.tqdm khi progress=True; chuyển tiến độ về server
+        items = list(iterable)
+        total = max(len(items), 1)
+        for i, item in enumerate(items):
+            yield item
+            results.put(("progress", current["job_id"], (i + 1) / total))
+
+    demucs.apply.tqdm = types.SimpleNamespace(tqdm=_progress_tqdm)
+
+    results.put(("ready", None, {"sources": list(model.sources), "samplerate": model.samplerate, "device": device}))
+
+    while True:
+        msg = requests.get()
+        if msg is None:
+            break
+        job_id, audio_path, output_dir = msg
+        current["job_id"] = job_id
+        try:
+            wav = AudioFile(audio_path).read(streams=0, samplerate=model.samplerate,
+                                             channels=model.audio_channels)
+            ref = wav.mean(0)
+            wav = (wav - ref.mean()) / ref.std()
+            with torch.no_grad():
+                sources = apply_model(model, wav[None], device=device, shifts=shifts,
+                                      split=True, overlap=0.25, progress=True)[0]
+            sources = sources * ref.std() + ref.mean()
+
+            out_dir = Path(output_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            paths = {}
+            for source, name in zip(sources, model.sources):
+                stem_path = out_dir / f"{name}.wav"
+                save_audio(source.cpu(), str(stem_path), samplerate=model.samplerate)
+                paths[f"{name}.wav"] = str(stem_path)
+            results.put(("done", job_id, paths))
+        except Exception as e:
+            results.put(("error", job_id, f"{type(e).__name__}: {e}"))
+        finally:
+            current["job_id"] = None
+
+
+class SeparationWorker:
+    """
+    Process Demucs thường trú: model chỉ load một lần, các job được xếp hàng phía server
+    và gửi lần lượt cho worker. Mỗi job ghi stems vào thư mục riêng nên các lần tách
+    đồng thời không ghi đè lên nhau.
+
+    Huỷ job đang chạy sẽ kill process worker; worker được khởi động lại ở job kế tiếp.
+    """
+
+    def __init__(self, model_name=DEMUCS_MODEL, device=DEMUCS_DEVICE, shifts=DEMUCS_SHIFTS):
+        self.model_name = model_name
+        self.device = device
+        self.shifts = shifts
+        self.info = None
+        self._mp = multiprocessing.get_context("spawn")
+        self._process = None
+        self._requests = None
+        self._results = None
+        self._pending = deque()
+        self._current = None
+        self._cond = threading.Condition()
+        self._proc_lock = threading.Lock()
+        self._start_error = None
+        self._dispatcher = None
+        self._closed = False
+
+    # --- quản lý process ---
+    def _ensure_process(self):
+        with self._proc_lock:
+            if self.is_alive():
+                return
+            if self._start_error is not None and time.time() - self._start_error[0] < RESTART_COOLDOWN:
+                raise RuntimeError(self._start_error[1])
+
+            self._requests = self._mp.Queue()
+            self._results = self._mp.Queue()
+            proc = self._mp.Process(
+                target=_worker_main,
+                args=(self.model_name, self.device, self.shifts, self._requests, self._results),
+                daemon=True,
+            )
+            proc.start()
+
+            deadline = time.time() + STARTUP_TIMEOUT
+            while True:
+                try:
+                    kind, _, payload = self._results.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    if not proc.is_alive():
+                        kind, payload = "error", f"exited with code {proc.exitcode}"
+                        break
+                    if time.time() > deadline:
+                        proc.kill()
+                        kind, payload = "error", "timed out loading model"
+                        break
+
+            if kind != "ready":
+                proc.join(timeout=5)
+                message = f"Demucs worker failed to start: {payload}"
+                self._start_error = (time.time(), message)
+                raise RuntimeError(message)
+
+            self._process = proc
+            self._start_error = None
+            self.info = payload
+            print(f"Demucs worker ready (pid={proc.pid}, device={payload['device']})")
+
+    def _kill_process(self):
+        proc, self._process = self._process, None
+        if proc is not None and proc.is_alive():
+            proc.kill()
+            proc.join(timeout=5)
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def _start_dispatcher(self):
+        with self._cond:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="demucs-dispatch", daemon=True)
+                self._dispatcher.start()
+
+    def warm_up(self):
+        """Khởi động process và load model trước (vd. lúc server start hoặc trong benchmark)"""
+        self._ensure_process()
+        return self.info
+
+    # --- API ---
+    def submit(self, audio_path, output_dir, job_id, on_progress=None):
+        """Xếp job vào hàng đợi; trả về Future với dict {tên file stem: đường dẫn}"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Separation worker is closed")
+            self._pending.append((job_id, str(audio_path), str(output_dir), future, on_progress))
+            self._cond.notify_all()
+        self._start_dispatcher()
+        return future
+
+    def separate(self, audio_path, output_dir, job_id, on_progress=None, timeout=None):
+        return self.submit(audio_path, output_dir, job_id, on_progress).result(timeout=timeout)
+
+    def cancel(self, job_id):
+        with self._cond:
+            for entry in list(self._pending):
+                if entry[0] == job_id:
+                    self._pending.remove(entry)
+                    entry[3].set_exception(SeparationCancelled(job_id))
+                    return True
+            if self._current is not None and self._current[0] == job_id:
+                # Không thể dừng apply_model giữa chừng: kill process, lần sau sẽ load lại model
+                self._kill_process()
+                return True
+        return False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._pending:
+                self._pending.popleft()[3].set_exception(SeparationCancelled("worker closed"))
+            self._cond.notify_all()
+        if self.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=10)
+        self._kill_process()
+
+    # --- điều phối ---
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._current = self._pending.popleft()
+            job_id, audio_path, output_dir, future, on_progress = self._current
+            try:
+                self._ensure_process()
+                self._requests.put((job_id, audio_path, output_dir))
+                future.set_result(self._wait_result(job_id, on_progress))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._current = None
+
+    def _wait_result(self, job_id, on_progress):
+        while True:
+            try:
+                kind, msg_job, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not self.is_alive():
+                    raise SeparationCancelled(job_id)
+                continue
+            if msg_job != job_id:
+                continue
+            if kind == "progress":
+                if on_progress is not None:
+                    on_progress(payload)
+            elif kind == "done":
+                return payload
+            else:
+                raise RuntimeError(f"Demucs worker error: {payload}")
+
+
+_default_worker = None
+_default_lock = threading.Lock()
+
+
+def get_worker():
+    global _default_worker
+    with _default_lock:
+        if _default_worker is None:
+            _default_worker = SeparationWorker()
+        return _default_worker
+
+
+def shutdown_worker():
+    global _default_worker
+    with _default_lock:
+        worker, _default_worker = _default_worker, None
+    if worker is not None:
+        worker.close()
@@ -0,0 +1,299 @@
+"""
+Tile server cho spectrogram toàn bộ track
+
+STFT của cả file được tính một lần (theo lô frame, không giữ cả ma trận phức trong RAM) vào
+ma trận dB memory-mapped (float16, layout (n_frames, n_bins) theo thời gian) cùng các level
+thu nhỏ theo thời gian (level k: max của 2^k frame liền nhau). Tile cố định TILE_SIZE x TILE_SIZE
+được cắt ra theo (zoom, tile thời gian, tile tần số), trả về PNG (colormap LUT) hoặc float32 thô,
+và giữ trong LRU tile cache để pan/zoom không phải đọc lại.
+
+    cache/tiles/<hash>_<n_fft>_<hop>/meta.json
+    cache/tiles/<hash>_<n_fft>_<hop>/level_<k>.npy
+
+Cả thư mục tile đi chung một ngân sách đĩa (TILES_MAX_BYTES): sau mỗi lần dựng, các bộ tile
+ít dùng nhất (mtime của meta.json, cập nhật khi mở) bị xoá nguyên bộ như LRU của NpyCache.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .audio_cache import CACHE_ROOT, file_digest, load_audio
+from .render import apply_colormap, encode_png
+
+TILES_DIR = CACHE_ROOT / "tiles"
+TILE_SIZE = 256
+N_FFT = 2048
+HOP_LENGTH = 512
+BATCH_FRAMES = 2048
+AMIN = 1e-5
+TOP_DB = 80.0
+TILE_CACHE_BYTES = int(os.environ.get("TILE_CACHE_BYTES", 64 * 1024 ** 2))
+TILES_MAX_BYTES = int(os.environ.get("TILES_MAX_BYTES", 2 * 1024 ** 3))
+
+
+def _hann(n):
+    # Giống scipy.signal.get_window('hann', n) (periodic) mà librosa.stft dùng
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)).astype(np.float32)
+
+
+def _stft_db_batches(y, n_fft, hop_length, batch_frames):
+    """
+    Sinh (f0, dB[f0:f1]) của |STFT| (center=True, pad 0 như librosa) theo lô frame;
+    chỉ đọc đoạn mẫu cần cho mỗi lô từ memmap.
+    """
+    n = len(y)
+    n_frames = 1 + n // hop_length
+    pad = n_fft // 2
+    window = _hann(n_fft)
+    for f0 in range(0, n_frames, batch_frames):
+        f1 = min(n_frames, f0 + batch_frames)
+        s0 = f0 * hop_length - pad
+        s1 = (f1 - 1) * hop_length - pad + n_fft
+        seg = np.zeros(s1 - s0, dtype=np.float32)
+        a, b = max(s0, 0), min(s1, n)
+        if b > a:
+            seg[a - s0:b - s0] = y[a:b]
+        frames = np.lib.stride_tricks.sliding_window_view(seg, n_fft)[::hop_length][:f1 - f0]
+        mag = np.abs(np.fft.rfft(frames * window, axis=1))
+        yield f0, 20.0 * np.log10(np.maximum(mag, AMIN))
+
+
+def _open_level(path, shape):
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.float16, shape=shape)
+
+
+def build_tiles(audio_path, out_dir, n_fft=N_FFT, hop_length=HOP_LENGTH, batch_frames=BATCH_FRAMES):
+    """Tính ma trận dB + các level thu nhỏ vào out_dir (ghi vào thư mục tạm rồi rename)"""
+    y, sr = load_audio(audio_path, sr=None, mono=True)
+    n_frames = 1 + len(y) // hop_length
+    n_bins = n_fft // 2 + 1
+
+    tmp_dir = out_dir.parent / f".{out_dir.name}.{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        level = _open_level(tmp_dir / "level_0.npy", (n_frames, n_bins))
+        max_db = -np.inf
+        for f0, db in _stft_db_batches(y, n_fft, hop_length, batch_frames):
+            level[f0:f0 + len(db)] = db
+            max_db = max(max_db, float(db.max()))
+        level.flush()
+        frames_per_level = [n_frames]
+
+        # Level k+1 = max của từng cặp frame ở level k (frame lẻ cuối giữ nguyên)
+        k = 0
+        while frames_per_level[-1] > TILE_SIZE:
+            prev = level
+            count = -(-len(prev) // 2)
+            level = _open_level(tmp_dir / f"level_{k + 1}.npy", (count, n_bins))
+            for i in range(0, count, batch_frames):
+                src = np.asarray(prev[2 * i:2 * (i + batch_frames)])
+                if len(src) % 2:
+                    src = np.concatenate((src, src[-1:]))
+                level[i:i + len(src) // 2] = np.maximum(src[0::2], src[1::2])
+            level.flush()
+            del prev
+            frames_per_level.append(count)
+            k += 1
+        del level
+
+        meta = {
+            "sample_rate": int(sr),
+            "n_fft": n_fft,
+            "hop_length": hop_length,
+            "n_bins": n_bins,
+            "duration": len(y) / sr,
+            "max_db": max_db,
+            "tile_size": TILE_SIZE,
+            "frames_per_level": frames_per_level,
+        }
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        try:
+            os.replace(tmp_dir, out_dir)
+        except OSError:
+            # Process khác đã dựng xong cùng nội dung
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return out_dir
+
+
+def tiles_dir_for(audio_path, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    return TILES_DIR / f"{file_digest(audio_path)}_{n_fft}_{hop_length}"
+
+
+def _touch(tiles_dir):
+    """Đánh dấu "vừa dùng" cho LRU trên đĩa"""
+    try:
+        os.utime(tiles_dir / "meta.json")
+    except OSError:
+        pass
+
+
+def evict_tilesets(tiles_root=TILES_DIR, max_bytes=TILES_MAX_BYTES, keep=None):
+    """Xoá nguyên bộ tile cũ nhất (theo mtime của meta.json) cho tới khi tổng dung lượng <= max_bytes"""
+    entries = []
+    for d in tiles_root.glob("*"):
+        if d.name.startswith(".") or not d.is_dir():
+            continue  # thư mục tạm đang dựng
+        try:
+            stamp = (d / "meta.json").stat().st_mtime
+            size = sum(p.stat().st_size for p in d.iterdir())
+        except OSError:
+            continue
+        entries.append((stamp, size, d))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, d in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and d.name == keep.name:
+            continue
+        # Process đang memory-map bộ tile này vẫn đọc được (Linux); lần sau sẽ dựng lại
+        shutil.rmtree(d, ignore_errors=True)
+        with _open_lock:
+            _open_tiles.pop(d, None)
+        total -= size
+
+
+class SpectrogramTiles:
+    """Đọc các level dB qua memmap và cắt tile"""
+
+    def __init__(self, tiles_dir):
+        self.tiles_dir = tiles_dir
+        with open(tiles_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.levels = [np.load(tiles_dir / f"level_{k}.npy", mmap_mode='r')
+                       for k in range(len(self.meta["frames_per_level"]))]
+
+    def describe(self):
+        """Metadata cho client: số tile mỗi zoom, số giây mỗi tile..."""
+        meta = self.meta
+        seconds_per_frame = meta["hop_length"] / meta["sample_rate"]
+        max_zoom = len(self.levels) - 1
+        return dict(meta, **{
+            "freq_tiles": -(-meta["n_bins"] // TILE_SIZE),
+            "hz_per_bin": meta["sample_rate"] / meta["n_fft"],
+            # zoom 0 = thô nhất (cả track trong ~1 tile), zoom max = độ phân giải đầy đủ
+            "zooms": [
+                {
+                    "zoom": z,
+                    "time_tiles": -(-self.levels[max_zoom - z].shape[0] // TILE_SIZE),
+                    "seconds_per_tile": TILE_SIZE * seconds_per_frame * 2 ** (max_zoom - z),
+                }
+                for z in range(max_zoom + 1)
+            ],
+        })
+
+    def tile_data(self, zoom, tx, fy):
+        """Tile float32 (TILE_SIZE bins, TILE_SIZE frames), hàng 0 = tần số thấp; ngoài biên là NaN"""
+        max_zoom = len(self.levels) - 1
+        if not 0 <= zoom <= max_zoom:
+            raise IndexError(f"zoom must be in [0, {max_zoom}]")
+        level = self.levels[max_zoom - zoom]
+        t0, b0 = tx * TILE_SIZE, fy * TILE_SIZE
+        if tx < 0 or fy < 0 or t0 >= level.shape[0] or b0 >= level.shape[1]:
+            raise IndexError("tile out of range")
+        block = np.asarray(level[t0:t0 + TILE_SIZE, b0:b0 + TILE_SIZE], dtype=np.float32)
+        tile = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+        tile[:block.shape[1], :block.shape[0]] = block.T
+        return tile
+
+    def tile_png(self, zoom, tx, fy, cmap="magma", top_db=TOP_DB):
+        tile = self.tile_data(zoom, tx, fy)
+        vmax = self.meta["max_db"]
+        rgba = apply_colormap(tile, cmap, vmax - top_db, vmax)
+        rgba[np.isnan(tile), 3] = 0
+        # PNG: hàng đầu tiên ở trên cùng -> tần số cao ở trên
+        return encode_png(rgba[::-1], compress_level=1)
+
+    def tile_raw(self, zoom, tx, fy):
+        return self.tile_data(zoom, tx, fy).astype('<f4').tobytes()
+
+
+class TileCache:
+    """LRU theo dung lượng cho tile đã encode (dùng chung giữa các request trong process)"""
+
+    def __init__(self, max_bytes=TILE_CACHE_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+
+_tile_cache = TileCache()
+_open_tiles = OrderedDict()
+_open_lock = threading.Lock()
+MAX_OPEN_TILESETS = 8
+
+
+def ensure_tiles(audio_path):
+    """Dựng tile pyramid nếu chưa có, trả về metadata (chạy trong process pool)"""
+    out_dir = tiles_dir_for(audio_path)
+    if not (out_dir / "meta.json").exists():
+        TILES_DIR.mkdir(parents=True, exist_ok=True)
+        build_tiles(audio_path, out_dir)
+        evict_tilesets(keep=out_dir)
+    else:
+        _touch(out_dir)
+    return SpectrogramTiles(out_dir).describe()
+
+
+def open_tiles(audio_path):
+    """SpectrogramTiles đã dựng của file, hoặc None nếu chưa gọi ensure_tiles"""
+    out_dir = tiles_dir_for(audio_path)
+    with _open_lock:
+        tiles = _open_tiles.get(out_dir)
+        if tiles is not None:
+            _open_tiles.move_to_end(out_dir)
+            return tiles
+    if not (out_dir / "meta.json").exists():
+        return None
+    tiles = SpectrogramTiles(out_dir)
+    _touch(out_dir)
+    with _open_lock:
+        _open_tiles[out_dir] = tiles
+        while len(_open_tiles) > MAX_OPEN_TILESETS:
+            _open_tiles.popitem(last=False)
+    return tiles
+
+
+def get_tile(audio_path, zoom, tx, fy, fmt="png"):
+    """
+    Bytes của tile (PNG hoặc float32 little-endian) qua LRU tile cache.
+    Ném LookupError nếu chưa dựng tile, IndexError nếu tile nằm ngoài phạm vi.
+    """
+    tiles = open_tiles(audio_path)
+    if tiles is None:
+        raise LookupError("Spectrogram tiles have not been built for this file")
+    key = (str(tiles.tiles_dir), zoom, tx, fy, fmt)
+    data = _tile_cache.get(key)
+    if data is None:
+        data = tiles.tile_png(zoom, tx, fy) if fmt == "png" else tiles.tile_raw(zoom, tx, fy)
+        _tile_cache.put(key, data)
+    return data
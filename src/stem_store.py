@@ -0,0 +1,124 @@
+"""
+Kho stem đã tách, lưu bền theo nội dung
+
+Khoá = (hash nội dung file, separator, model, settings). Mỗi entry là một thư mục
+<root>/<key>/ gồm các file stem và manifest.json (label -> tên file + thông tin khoá).
+Tách lại cùng file với cùng cấu hình thì trả ngay URL đã lưu, không chạy Demucs / DSP.
+
+Kết quả được chuyển vào kho bằng os.replace (cùng filesystem với thư mục tạm, không copy):
+file stem được dời vào thư mục staging, ghi manifest, rồi đổi tên cả thư mục thành entry -
+reader không bao giờ thấy entry dở dang. Với STEM_STORE_FORMAT=flac, stem WAV được chuyển
+sang FLAC (lossless, ~một nửa dung lượng) ngay trong staging.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from pathlib import Path
+
+import soundfile as sf
+
+STEM_STORE_FORMAT = os.environ.get("STEM_STORE_FORMAT", "wav")
+FORMATS = ("wav", "flac")
+MANIFEST_NAME = "manifest.json"
+TRANSCODE_BLOCK = 1 << 16
+
+
+def make_key(digest, separator, model=None, settings=None):
+    payload = json.dumps(
+        {"digest": digest, "separator": separator, "model": model, "settings": settings or {}},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _to_flac(src, dest):
+    """WAV -> FLAC theo block; FLAC không chứa được float nên float/24-bit ghi thành PCM_24"""
+    info = sf.info(str(src))
+    subtype = "PCM_16" if info.subtype in ("PCM_16", "PCM_U8", "PCM_S8") else "PCM_24"
+    with sf.SoundFile(str(dest), "w", samplerate=info.samplerate, channels=info.channels,
+                      format="FLAC", subtype=subtype) as out:
+        for block in sf.blocks(str(src), blocksize=TRANSCODE_BLOCK, dtype="float32", always_2d=True):
+            out.write(block)
+
+
+class StemStore:
+    """Thư mục entry stem + manifest; url_prefix là đường dẫn HTTP tương ứng với root"""
+
+    def __init__(self, root, url_prefix, fmt=STEM_STORE_FORMAT):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown stem format '{fmt}', expected one of {FORMATS}")
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.format = fmt
+
+    def staging_dir(self):
+        """Thư mục tạm trong root (cùng filesystem với entry) để separator ghi stem vào"""
+        path = self.root / f".staging-{uuid.uuid4().hex}"
+        path.mkdir(parents=True)
+        return path
+
+    def _urls(self, key, manifest):
+        return {label: f"{self.url_prefix}/{key}/{name}" for label, name in manifest["stems"].items()}
+
+    def lookup(self, key):
+        """{label: url} nếu entry tồn tại và đủ file, ngược lại None"""
+        entry = self.root / key
+        try:
+            with open(entry / MANIFEST_NAME, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not manifest.get("stems") or not all((entry / name).exists() for name in manifest["stems"].values()):
+            return None
+        return self._urls(key, manifest)
+
+    def put(self, key, stems, info=None):
+        """
+        Đưa các file stem vào kho (file nguồn bị dời đi, không copy).
+
+        Args:
+            stems: {label: đường dẫn file} - nên nằm cùng filesystem với root (vd. staging_dir())
+            info: thông tin ghi thêm vào manifest (digest, separator, model, settings...)
+
+        Returns:
+            {label: url}
+        """
+        staging = self.staging_dir()
+        try:
+            names = {}
+            for label, src in stems.items():
+                src = Path(src)
+                if self.format == "flac" and src.suffix.lower() == ".wav":
+                    name = src.stem + ".flac"
+                    _to_flac(src, staging / name)
+                    src.unlink()
+                else:
+                    name = src.name
+                    try:
+                        os.replace(src, staging / name)
+                    except OSError:
+                        # Khác filesystem: os.replace không dời được
+                        shutil.move(str(src), str(staging / name))
+                names[label] = name
+
+            manifest = dict(info or {}, key=key, format=self.format, created=time.time(), stems=names)
+            with open(staging / MANIFEST_NAME, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            try:
+                os.replace(staging, self.root / key)
+            except OSError:
+                # Entry đã được request khác ghi xong trước: dùng entry đó
+                existing = self.lookup(key)
+                if existing is None:
+                    raise
+                return existing
+            return self._urls(key, manifest)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def discard(self, path):
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,169 @@
+"""
+VAD dạng stream, bộ nhớ cố định
+
+Đọc file theo block (memmap canonical của decoded cache, hoặc decoder theo block với file
+chưa ingest), tính RMS theo frame như librosa.effects.split (frame 2048, hop 512, center)
+nhưng so với mức tham chiếu dB chạy (max RMS tới thời điểm hiện tại, không thấp hơn
+min_reference_db) thay vì max của cả file. Đoạn im lặng ngắn hơn hangover không cắt đoạn;
+mỗi đoạn được trả về ngay khi đóng nên client nhận đoạn đầu tiên mà không cần chờ hết file.
+
+Bộ nhớ chỉ gồm một block đọc + phần đuôi < frame_length mẫu, không phụ thuộc độ dài file.
+"""
+
+import numpy as np
+
+from .audio_cache import file_digest, get_cache
+from .decoder import open_blocks, sample_range
+
+TOP_DB = 25
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+HANGOVER = 0.25          # giây im lặng tối đa vẫn gộp vào đoạn đang mở
+MIN_REFERENCE_DB = -50.0  # mức tham chiếu tối thiểu (dBFS), tránh coi nhiễu nền đầu file là "to nhất"
+BLOCK_SIZE = 65536
+AMIN = 1e-5
+
+
+def stream_mono_blocks(audio_path, blocksize=BLOCK_SIZE, start=None, end=None):
+    """
+    Generator: phần tử đầu là sample rate, sau đó là các block mono float32.
+    File đã có bản canonical (đã ingest) thì đọc memmap; chưa có thì decode trực tiếp theo
+    block (soundfile -> pipe ffmpeg -> librosa) để đoạn đầu tiên không phải chờ decode cả file.
+    start, end (giây): chỉ đọc đoạn đó (cắt memmap, hoặc decoder seek tới start rồi vẫn đọc
+    theo block - bộ nhớ không phụ thuộc độ dài đoạn).
+    """
+    cached = get_cache().get(get_cache().frames_key(file_digest(audio_path)))
+    if cached is not None:
+        frames, meta = cached
+        sr = int(meta["sr"])
+        a, b = sample_range(start, end, sr, len(frames))
+        yield sr
+        for pos in range(a, b, blocksize):
+            yield frames[pos:min(pos + blocksize, b)].mean(axis=1, dtype=np.float32)
+        return
+
+    sr, _, blocks = open_blocks(audio_path, blocksize, start, end)
+    yield sr
+    for block in blocks:
+        yield block.mean(axis=1, dtype=np.float32)
+
+
+class StreamingVAD:
+    """
+    Bộ phát hiện hoạt động theo năng lượng, nhận tín hiệu từng block qua feed()
+
+    feed() / finish() trả về danh sách các đoạn vừa đóng dạng (start_sample, end_sample).
+    """
+
+    def __init__(self, sr, top_db=TOP_DB, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+                 hangover=HANGOVER, min_reference_db=MIN_REFERENCE_DB):
+        self.sr = sr
+        self.top_db = top_db
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.hangover_frames = int(round(hangover * sr / hop_length))
+        self.reference_db = float(min_reference_db)
+        # center=True: frame i phủ [i*hop - frame_length/2, i*hop + frame_length/2), pad 0 ở đầu
+        self._buffer = np.zeros(frame_length // 2, dtype=np.float32)
+        self._next_frame = 0      # chỉ số frame tiếp theo cần tính
+        self._samples = 0         # tổng số mẫu đã nhận
+        self._seg_start = None    # frame bắt đầu của đoạn đang mở
+        self._last_active = None  # frame hoạt động gần nhất trong đoạn đang mở
+
+    def _process_frames(self, frames_db):
+        closed = []
+        for db in frames_db:
+            i = self._next_frame
+            self._next_frame += 1
+            self.reference_db = max(self.reference_db, float(db))
+            if db > self.reference_db - self.top_db:
+                if self._seg_start is None:
+                    self._seg_start = i
+                self._last_active = i
+            elif self._seg_start is not None and i - self._last_active > self.hangover_frames:
+                closed.append(self._close())
+        return closed
+
+    def _close(self):
+        start = self._seg_start * self.hop_length
+        end = min((self._last_active + 1) * self.hop_length, self._samples)
+        self._seg_start = self._last_active = None
+        return start, end
+
+    def _frames_db(self, buf):
+        count = 1 + (len(buf) - self.frame_length) // self.hop_length if len(buf) >= self.frame_length else 0
+        if count <= 0:
+            return np.zeros(0), buf
+        frames = np.lib.stride_tricks.sliding_window_view(buf, self.frame_length)[::self.hop_length][:count]
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        return 20.0 * np.log10(np.maximum(rms, AMIN)), buf[count * self.hop_length:]
+
+    def feed(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self._samples += len(block)
+        buf = np.concatenate((self._buffer, block))
+        frames_db, self._buffer = self._frames_db(buf)
+        return self._process_frames(frames_db)
+
+    def finish(self):
+        """Pad 0 ở cuối (center=True) để tính nốt các frame còn lại và đóng đoạn đang mở"""
+        n_frames = 1 + self._samples // self.hop_length
+        closed = []
+        remaining = n_frames - self._next_frame
+        if remaining > 0:
+            pad = np.zeros(self.frame_length // 2 + self.hop_length, dtype=np.float32)
+            frames_db, _ = self._frames_db(np.concatenate((self._buffer, pad)))
+            closed += self._process_frames(frames_db[:remaining])
+        if self._seg_start is not None:
+            closed.append(self._close())
+        return closed
+
+
+def iter_vad_segments(audio_path, top_db=TOP_DB, hangover=HANGOVER, blocksize=BLOCK_SIZE, stop_event=None,
+                      start=None, end=None):
+    """
+    Generator các đoạn hoạt động (dict start/end/duration, giây) ngay khi đóng;
+    return value (StopIteration.value) là tổng quan {total_duration, sample_rate, reference_db}.
+    stop_event (threading.Event) cho phép dừng sớm khi client ngắt kết nối.
+    start, end: chỉ xét đoạn [start, end) giây; thời điểm các đoạn vẫn tính từ đầu file.
+    """
+    blocks = stream_mono_blocks(audio_path, blocksize, start, end)
+    sr = next(blocks)
+    vad = StreamingVAD(sr, top_db=top_db, hangover=hangover)
+    origin = 0 if start is None else int(round(max(0.0, float(start)) * sr))
+
+    def as_dict(seg):
+        a, b = seg
+        return {"start": (origin + a) / sr, "end": (origin + b) / sr, "duration": (b - a) / sr}
+
+    try:
+        for block in blocks:
+            if stop_event is not None and stop_event.is_set():
+                break
+            for seg in vad.feed(block):
+                yield as_dict(seg)
+        for seg in vad.finish():
+            yield as_dict(seg)
+    finally:
+        blocks.close()
+    return {"total_duration": vad._samples / sr, "sample_rate": sr, "reference_db": vad.reference_db}
+
+
+def analyze_vad(audio_path, top_db=TOP_DB, hangover=HANGOVER, start=None, end=None):
+    """Toàn bộ kết quả VAD (cùng định dạng với kết quả cũ dựa trên librosa.effects.split)"""
+    segments = []
+    gen = iter_vad_segments(audio_path, top_db=top_db, hangover=hangover, start=start, end=end)
+    while True:
+        try:
+            segments.append(next(gen))
+        except StopIteration as stop:
+            summary = stop.value
+            break
+    if summary["total_duration"] == 0:
+        raise ValueError("Tệp âm thanh không có dữ liệu (Empty audio)")
+    return {
+        "total_segments": len(segments),
+        "segments": segments,
+        "total_duration": float(summary["total_duration"]),
+        "reference_db": float(summary["reference_db"]),
+    }
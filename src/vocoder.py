@@ -0,0 +1,223 @@
+"""
+Time-stretch / pitch-shift đa kênh (stereo) cho effects
+
+- mode "phase": phase vocoder trên một STFT đa kênh (rfft theo lô frame cho mọi kênh).
+  Độ tăng pha được tính một lần từ tín hiệu mid (tổng các kênh) và dùng chung cho mọi kênh,
+  mỗi kênh chỉ giữ độ lệch pha của nó so với mid -> ảnh stereo không bị trôi pha giữa
+  hai kênh. Pitch shift = stretch theo ratio rồi resample, phần resample nằm luôn trong
+  iSTFT (frame tổng hợp dài n_fft / ratio) nên speed + pitch chỉ tốn một lượt
+  STFT -> vocoder -> iSTFT. Vòng lặp theo frame của librosa.phase_vocoder được thay bằng
+  cumsum pha theo lô, toàn bộ tính bằng float32 / complex64.
+- mode "wsola": WSOLA trong miền thời gian (tìm offset khớp nhất bằng tương quan FFT trên mid,
+  cùng offset cho mọi kênh), pitch bằng stretch + nội suy tuyến tính. Nhanh, dùng cho preview.
+
+Kết quả dài round(n / speed) mẫu như librosa.effects.time_stretch + pitch_shift.
+"""
+
+import numpy as np
+import scipy.signal
+
+MODES = ("phase", "wsola")
+N_FFT = 2048
+HOP_LENGTH = 512
+FRAME_BATCH = 512
+WSOLA_FRAME_SECONDS = 0.04
+WSOLA_TOLERANCE = 0.25  # khoảng tìm kiếm = tolerance * frame mẫu mỗi phía
+
+
+def _hann(n):
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)).astype(np.float32)
+
+
+def _fix_length(y, size):
+    if y.shape[-1] >= size:
+        return y[..., :size]
+    return np.pad(y, ((0, 0), (0, size - y.shape[-1])))
+
+
+def stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """STFT center=True (pad 0) cho mọi kênh: (C, n) -> (C, n_frames, n_fft // 2 + 1) complex64"""
+    y = np.atleast_2d(np.asarray(y, dtype=np.float32))
+    pad = n_fft // 2
+    padded = np.pad(y, ((0, 0), (pad, pad)))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft, axis=-1)[:, ::hop_length]
+    window = _hann(n_fft)
+    out = np.empty((y.shape[0], frames.shape[1], n_fft // 2 + 1), dtype=np.complex64)
+    for f0 in range(0, frames.shape[1], FRAME_BATCH):
+        out[:, f0:f0 + FRAME_BATCH] = np.fft.rfft(frames[:, f0:f0 + FRAME_BATCH] * window, axis=-1)
+    return out
+
+
+def phase_vocoder(D, rate=1.0, hop_length=HOP_LENGTH):
+    """
+    Phase vocoder đa kênh với pha dùng chung.
+
+    Args:
+        D: (C, n_frames, n_bins) complex
+        rate: số frame input cho mỗi frame output (> 1 nhanh hơn)
+
+    Yields:
+        các lô frame output (C, T, n_bins) complex64, theo thứ tự thời gian
+    """
+    n_ch, n_frames, n_bins = D.shape
+    steps = np.arange(0, n_frames, rate, dtype=np.float64)
+    D = np.concatenate((D, np.zeros((n_ch, 2, n_bins), dtype=np.complex64)), axis=1)
+
+    # Hop tổng hợp = hop phân tích nên độ tăng pha kỳ vọng (2*pi*k*hop/n_fft) + độ lệch đã unwrap
+    # trùng với hiệu pha giữa hai frame theo modulo 2*pi: không cần unwrap, chỉ cần giữ pha trong
+    # [-pi, pi) giữa các lô để float32 đủ chính xác
+    phase_acc = np.angle(D[:, 0].sum(axis=0)).astype(np.float32)
+    for t0 in range(0, len(steps), FRAME_BATCH):
+        s = steps[t0:t0 + FRAME_BATCH]
+        idx = s.astype(np.intp)
+        alpha = (s - idx).astype(np.float32)[:, np.newaxis]
+        c0, c1 = D[:, idx], D[:, idx + 1]
+        ref0, ref1 = c0.sum(axis=0), c1.sum(axis=0)
+
+        # Độ tăng pha mỗi frame của mid -> dùng chung cho mọi kênh
+        dphase = np.angle(ref1 * np.conj(ref0))
+        csum = np.cumsum(dphase, axis=0)
+        phase = np.empty_like(csum)
+        phase[0] = phase_acc
+        phase[1:] = phase_acc + csum[:-1]
+        phase_acc = np.mod(phase_acc + csum[-1] + np.pi, 2 * np.pi).astype(np.float32) - np.float32(np.pi)
+
+        # Q = e^{j*phase} / e^{j*arg(ref0)}: mỗi kênh giữ độ lệch pha của nó so với mid
+        abs_ref0 = np.abs(ref0)
+        q = (np.cos(phase) + 1j * np.sin(phase)).astype(np.complex64)
+        q *= np.conj(ref0) / np.where(abs_ref0 > 0, abs_ref0, 1)
+        q[abs_ref0 == 0] = 0
+
+        abs_c0 = np.abs(c0)
+        mag = (1 - alpha) * abs_c0 + alpha * np.abs(c1)
+        # mag * e^{j*arg(c0)} * Q
+        gain = mag / np.where(abs_c0 > 0, abs_c0, 1)
+        yield (c0 * gain) * q
+
+
+def grain_length(ratio, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Độ dài frame tổng hợp N' ~ n_fft / ratio, làm tròn tới bội của n_fft / hop_length để hop
+    output N' * hop_length / n_fft là số nguyên (pitch lệch tối đa vài cent so với ratio)
+    """
+    overlap = n_fft // hop_length
+    return max(overlap, overlap * int(round(n_fft / (overlap * ratio))))
+
+
+def istft_stream(batches, n_out_frames, n_channels, n_fft=N_FFT, hop_length=HOP_LENGTH, grain=None):
+    """
+    iSTFT overlap-add từ các lô frame (C, T, n_bins); trả về (C, n) float32 đã bỏ pad center.
+
+    grain != n_fft: mỗi frame được biến đổi ngược với độ dài grain (cắt / thêm bin 0 = resample
+    band-limited theo n_fft / grain) và đặt cách nhau grain * hop_length / n_fft mẫu -> resample
+    nằm luôn trong iSTFT thay vì một lượt riêng sau đó.
+    """
+    if n_fft % hop_length:
+        raise ValueError("n_fft must be a multiple of hop_length")
+    grain = grain or n_fft
+    overlap = n_fft // hop_length
+    hop = grain // overlap
+    window = _hann(grain)
+    scale = np.float32(grain / n_fft)
+    length = (n_out_frames - 1) * hop + grain
+    out = np.zeros((n_channels, length + grain), dtype=np.float32)
+    t0 = 0
+    for batch in batches:
+        frames = np.fft.irfft(batch, n=grain, axis=-1).astype(np.float32) * (window * scale)
+        n_t = frames.shape[1]
+        for r in range(overlap):
+            seg = frames[:, :, r * hop:(r + 1) * hop].reshape(n_channels, -1)
+            start = (t0 + r) * hop
+            out[:, start:start + seg.shape[1]] += seg
+        t0 += n_t
+
+    # Chuẩn hoá theo tổng window^2 (như librosa.istft)
+    env = np.zeros(length + grain, dtype=np.float32)
+    sq = window ** 2
+    for r in range(overlap):
+        seg = np.tile(sq[r * hop:(r + 1) * hop], n_out_frames)
+        env[r * hop:r * hop + len(seg)] += seg
+    out /= np.where(env > 1e-8, env, 1.0)
+    pad = grain // 2
+    return out[:, pad:length - pad]
+
+
+def _phase_time_pitch(y, speed, ratio, n_fft, hop_length):
+    """Stretch theo ratio / speed rồi resample theo 1 / ratio, cả hai trong một lượt STFT -> iSTFT"""
+    grain = grain_length(ratio, n_fft, hop_length)
+    rate = speed * grain / n_fft
+    D = stft(y, n_fft, hop_length)
+    n_out_frames = len(np.arange(0, D.shape[1], rate))
+    return istft_stream(phase_vocoder(D, rate, hop_length), n_out_frames, y.shape[0], n_fft, hop_length, grain)
+
+
+def wsola(y, speed, sr, frame_seconds=WSOLA_FRAME_SECONDS, tolerance=WSOLA_TOLERANCE):
+    """
+    WSOLA: mỗi frame output lấy frame input quanh vị trí danh nghĩa k * hop_in, dịch trong
+    [-tol, tol] để khớp nhất (tương quan trên mid) với phần tiếp nối tự nhiên của frame trước.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float32))
+    n_ch, n = y.shape
+    frame = max(64, int(sr * frame_seconds)) // 2 * 2
+    hop_out = frame // 2
+    hop_in = hop_out * speed
+    tol = int(frame * tolerance)
+    window = _hann(frame)
+    n_target = int(round(n / speed))
+    n_frames = n_target // hop_out + 2
+
+    half = frame // 2
+    pad = frame + tol
+    padded = np.pad(y, ((0, 0), (pad, pad + frame + int(2 * hop_in) + 1)))
+    mid = padded.mean(axis=0)
+    out = np.zeros((n_ch, (n_frames + 1) * hop_out + frame), dtype=np.float32)
+
+    prev = 0  # vị trí (trong padded) của frame input trước
+    for k in range(n_frames):
+        # Frame k căn giữa tại mẫu k * hop_in của input
+        nominal = pad + int(round(k * hop_in)) - half
+        if k == 0:
+            pos = nominal
+        else:
+            # Phần tiếp nối tự nhiên của frame trước trùng với nửa đầu của frame mới
+            template = mid[prev + hop_out:prev + frame]
+            region = mid[nominal - tol:nominal + tol + hop_out]
+            corr = scipy.signal.correlate(region, template, mode='valid', method='fft')
+            pos = nominal - tol + int(np.argmax(corr))
+        out[:, k * hop_out:k * hop_out + frame] += padded[:, pos:pos + frame] * window
+        prev = pos
+    # Hann periodic với overlap 50% có tổng bằng 1; mẫu 0 của output là tâm frame 0
+    return _fix_length(out[:, half:], n_target)
+
+
+def _resample_linear(y, ratio, size):
+    """Nén trục thời gian theo ratio (pitch * ratio) bằng nội suy tuyến tính"""
+    x = np.arange(size) * ratio
+    src = np.arange(y.shape[-1])
+    return np.stack([np.interp(x, src, ch, right=0.0) for ch in y]).astype(np.float32)
+
+
+def time_pitch(y, sr, speed=1.0, semitones=0.0, mode="phase", n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Đổi tốc độ và cao độ cho tín hiệu (C, n) hoặc (n,) trong một lượt.
+
+    Returns:
+        (C, round(n / speed)) float32
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown time/pitch mode '{mode}', expected one of {MODES}")
+    y = np.atleast_2d(np.asarray(y, dtype=np.float32))
+    n_target = int(round(y.shape[-1] / speed))
+    ratio = 2.0 ** (float(semitones) / 12.0)
+    if abs(speed - 1.0) < 1e-6 and abs(ratio - 1.0) < 1e-6:
+        return y.copy()
+
+    if mode == "phase":
+        out = _phase_time_pitch(y, speed, ratio, n_fft, hop_length)
+        return _fix_length(out, n_target)
+
+    # WSOLA: stretch thêm theo ratio rồi nén lại bằng nội suy -> cao độ * ratio, độ dài n / speed
+    stretched = wsola(y, speed / ratio, sr)
+    if abs(ratio - 1.0) < 1e-6:
+        return _fix_length(stretched, n_target)
+    return _resample_linear(stretched, ratio, n_target)
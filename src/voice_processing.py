@@ -1,13 +1,24 @@
 import numpy as np
 import librosa
 import soundfile as sf
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 from pathlib import Path
 import io
+import uuid
 import base64
 
+from .audio_cache import load_region
+from .features import get_plane
+from .peaks import get_peaks
+from . import lpc as lpc_engine
+from . import streaming_vad
+from . import pitch as pitch_engine
+from .render import render_image, render_line
+
+def _region_offset(start, sr):
+    """Thời điểm (giây, theo mẫu) của đầu đoạn phân tích"""
+    return 0.0 if start is None else round(max(0.0, float(start)) * sr) / sr
+
+
 class InstrumentVoiceProcessor:
     """
     Xử lý âm thanh nhạc cụ sử dụng kỹ thuật DSP từ xử lý tiếng nói
@@ -19,39 +30,37 @@ class InstrumentVoiceProcessor:
     - LPC order cao hơn cho cấu trúc phức tạp của nhạc cụ
     """
     
-    def __init__(self, sample_rate=22050):
+    def __init__(self, sample_rate=22050, resample_quality=None):
         """
         Args:
             sample_rate: Tần số lấy mẫu (mặc định 22050Hz cho nhạc cụ)
                         Speech thường dùng 16000Hz
                         Music thường dùng 22050Hz hoặc 44100Hz
+            resample_quality: mức resample về sample_rate ("hq" | "fast", xem src/audio_cache.py)
         """
         self.sample_rate = sample_rate
-        
-    def extract_frame(self, audio_path, start_index=50, frame_length=1024):
+        self.resample_quality = resample_quality
+
+    def load_at_rate(self, audio_path, start=None, end=None, quality=None):
         """
-        Trích xuất một frame từ file âm thanh
-        Tối ưu hóa đặc biệt cho MP3: dùng librosa để load và tự động bỏ qua khoảng lặng
+        Tín hiệu mono ở self.sample_rate: bản resample được audio cache dựng một lần cho mỗi
+        (file, sample rate, mức chất lượng) rồi dùng lại qua memmap
         """
-        print(f"DEBUG extract_frame: Loading {audio_path} via librosa...")
+        return load_region(audio_path, start, end, sr=self.sample_rate,
+                           quality=quality or self.resample_quality)
         
-        # Dùng librosa.load để hỗ trợ MP3 tốt hơn
-        # sr=None để giữ sample rate gốc của file
-        try:
-            y, fs = librosa.load(audio_path, sr=None, mono=True)
-            print(f"DEBUG extract_frame: Loaded {len(y)} samples at {fs}Hz")
-        except Exception as e:
-            print(f"ERROR extract_frame: Fails to load with librosa: {e}")
-            # Fallback sang soundfile nếu librosa lỗi
-            data, fs = sf.read(audio_path, dtype='float32')
-            y = data if len(data.shape) == 1 else data[:, 0]
-
+    def extract_frame(self, audio_path, start_index=50, frame_length=1024, start=None, end=None):
+        """
+        Trích xuất một frame từ file âm thanh (trong đoạn [start, end) giây nếu có)
+        Có start/end thì chỉ decode đoạn đó (seek) và bỏ khoảng lặng ở đầu ngay trong đoạn
+        """
+        y, fs = load_region(audio_path, start, end, mono=True)
         total_length = len(y)
-        
+        print(f"DEBUG extract_frame: Loaded {total_length} samples at {fs}Hz")
+
         # 1. Tự động "Trim" khoảng lặng ở đầu (Quan trọng cho MP3)
         # top_db=30 là ngưỡng nhạy để phát hiện âm thanh
-        yt, index = librosa.effects.trim(y, top_db=30)
-        start_trim = index[0]
+        start_trim = int(librosa.effects.trim(y, top_db=30)[1][0]) if total_length else 0
         
         if start_trim > 0:
             print(f"DEBUG extract_frame: Skipped {start_trim} samples of silence at the beginning")
@@ -62,7 +71,7 @@ class InstrumentVoiceProcessor:
         bat_dau = start_trim + offset_samples
         ket_thuc = bat_dau + frame_length
         
-        # Đảm bảo không vượt quá độ dài file
+        # Đảm bảo không vượt quá đoạn cần phân tích
         if bat_dau >= total_length - 256:
             bat_dau = max(0, total_length - frame_length)
             ket_thuc = total_length
@@ -73,7 +82,7 @@ class InstrumentVoiceProcessor:
         x = y[bat_dau:ket_thuc]
         
         # Kiểm tra năng lượng (RMS) lần cuối
-        rms = np.sqrt(np.mean(x**2))
+        rms = np.sqrt(np.mean(x**2)) if len(x) else 0.0
         print(f"DEBUG extract_frame: Final frame RMS: {rms:.6f}")
         
         if rms < 0.0001:
@@ -83,39 +92,29 @@ class InstrumentVoiceProcessor:
             if len(search_area) > frame_length:
                 # Tìm frame có RMS cao nhất
                 rms_frames = librosa.feature.rms(y=search_area, frame_length=frame_length, hop_length=frame_length//2)
-                best_frame_idx = np.argmax(rms_frames)
-                bat_dau = start_trim + (best_frame_idx * (frame_length // 2))
-                x = y[bat_dau : bat_dau + frame_length]
+                best_frame_idx = int(np.argmax(rms_frames))
+                offset = best_frame_idx * (frame_length // 2)
+                x = search_area[offset : offset + frame_length]
                 rms = np.sqrt(np.mean(x**2))
-                print(f"DEBUG extract_frame: Found stronger frame at {bat_dau}, RMS: {rms:.6f}")
+                print(f"DEBUG extract_frame: Found stronger frame at {start_trim + offset}, RMS: {rms:.6f}")
 
-        # Chuẩn hóa nếu cần (librosa load đã chuẩn hóa về -1..1)
+        # Chuẩn hóa nếu cần (decoder trả float trong -1..1)
         return x, fs
     
     def pre_emphasis(self, signal, alpha=0.9):
         """
-        Áp dụng pre-emphasis filter
+        Áp dụng pre-emphasis filter (vector hoá, nhận 1 frame hoặc mảng 2-D nhiều frame)
         """
-        N = len(signal)
-        y = np.zeros((N,), np.float32)
-        for n in range(N):
-            if n == 0:
-                y[n] = signal[n] - alpha * signal[n]
-            else:
-                y[n] = signal[n] - alpha * signal[n-1]
-        return y
+        return lpc_engine.pre_emphasis(signal, alpha)
     
     def apply_hamming_window(self, signal):
         """
-        Áp dụng cửa sổ Hamming
+        Áp dụng cửa sổ Hamming (theo trục cuối)
         """
-        N = len(signal)
-        w = np.zeros((N,), np.float32)
-        for n in range(N):
-            w[n] = 0.54 - 0.46 * np.cos(2 * np.pi * n / N)
-        return signal * w
+        return signal * lpc_engine.hamming_window(np.shape(signal)[-1])
     
-    def lpc_analysis(self, audio_path, order=20, start_index=50, frame_length=1024):
+    def lpc_analysis(self, audio_path, order=20, start_index=50, frame_length=1024, mode="frame",
+                     hop_length=512, max_frames=500, start=None, end=None):
         """
         Phân tích Linear Predictive Coding cho nhạc cụ
         
@@ -124,12 +123,18 @@ class InstrumentVoiceProcessor:
                    Order cao hơn để mô hình hóa cấu trúc harmonic phức tạp
             start_index: Vị trí bắt đầu (ms)
             frame_length: Độ dài frame (samples)
+            mode: "frame" - một frame như trước, "trajectory" - LPC/cepstrum theo thời gian
+                  trên toàn file (xem lpc_trajectory), "both" - frame kèm key 'trajectory'
+            start, end: chỉ phân tích đoạn [start, end) giây (mặc định cả file)
         
         Returns:
             dict: LPC coefficients, cepstral coefficients, autocorrelation
         """
+        if mode == "trajectory":
+            return self.lpc_trajectory(audio_path, order, frame_length, hop_length, max_frames, start, end)
+
         # Trích xuất frame
-        x, fs = self.extract_frame(audio_path, start_index, frame_length)
+        x, fs = self.extract_frame(audio_path, start_index, frame_length, start, end)
         
         print(f"DEBUG LPC: Frame length={len(x)}, Sample rate={fs}")
         print(f"DEBUG LPC: Signal range: min={np.min(x):.6f}, max={np.max(x):.6f}")
@@ -171,7 +176,7 @@ class InstrumentVoiceProcessor:
         # Tính cepstral coefficients
         c = self.compute_cepstral_coefficients(a, order, max_order=30)
         
-        return {
+        result = {
             'lpc_coefficients': a.tolist(),
             'cepstral_coefficients': c.tolist(),
             'autocorrelation': R.tolist(),
@@ -181,80 +186,83 @@ class InstrumentVoiceProcessor:
             'signal_rms': float(np.sqrt(np.mean(x**2))),
             'analysis_type': 'Musical Instrument (optimized)'
         }
+        if mode == "both":
+            result['trajectory'] = self.lpc_trajectory(audio_path, order, frame_length, hop_length, max_frames,
+                                                       start, end)
+        return result
+    
+    def lpc_trajectory(self, audio_path, order=20, frame_length=1024, hop_length=512, max_frames=500,
+                       start=None, end=None):
+        """
+        LPC và cepstrum theo thời gian trên toàn bộ file (Levinson-Durbin batched, src/lpc.py)
+
+        Args:
+            hop_length: Bước nhảy giữa các frame (samples)
+            max_frames: Số frame tối đa trả về (giảm mẫu đều theo thời gian), None = tất cả
+            start, end: đoạn cần phân tích (giây); times vẫn tính từ đầu file
+        """
+        y, fs = load_region(audio_path, start, end, mono=True)
+        if len(y) == 0:
+            raise ValueError("Empty audio file")
+
+        traj = lpc_engine.lpc_trajectory(y, fs, order=order, frame_length=frame_length,
+                                         hop_length=hop_length, alpha=0.7, n_cepstra=30)
+        num_frames = len(traj['times'])
+        step = 1 if not max_frames else max(1, -(-num_frames // int(max_frames)))
+
+        return {
+            'times': (traj['times'][::step] + _region_offset(start, fs)).tolist(),
+            'lpc_coefficients': traj['lpc'][::step].tolist(),
+            'cepstral_coefficients': traj['cepstrum'][::step].tolist(),
+            'rms': traj['rms'][::step].tolist(),
+            'order': order,
+            'sample_rate': int(fs),
+            'frame_length': frame_length,
+            'hop_length': hop_length * step,
+            'num_frames': num_frames,
+            'decimation': step
+        }
     
     def compute_cepstral_coefficients(self, a, p, max_order=18):
         """
-        Tính cepstral coefficients từ hệ số LPC
+        Tính cepstral coefficients từ hệ số LPC (đệ quy vector hoá, src/lpc.py)
         """
-        c = np.zeros((max_order + 1,), dtype=np.float32)
-        
-        m = 1
-        while m <= p:
-            c[m] = a[m]
-            k = 1
-            while k <= m - 1:
-                c[m] = c[m] + (k / m) * c[k] * a[m - k]
-                k = k + 1
-            m = m + 1
-            
-        m = p + 1
-        while m <= max_order:
-            c[m] = 0.0
-            k = 1
-            while k <= m - 1:
-                chi_so = m - k
-                if m - k > p:
-                    temp = 0.0
-                else:
-                    temp = a[m - k]
-                c[m] = c[m] + (k / m) * c[k] * temp
-                k = k + 1
-            m = m + 1
-            
-        return c
+        return lpc_engine.lpc_to_cepstrum(a, p, max_order)[0].astype(np.float32)
     
-    def generate_waveform_data(self, audio_path, num_points=600):
+    def generate_waveform_data(self, audio_path, num_points=600, start=None, end=None):
         """
-        Tạo dữ liệu waveform để hiển thị
+        Tạo dữ liệu waveform để hiển thị từ kim tự tháp peak (src/peaks.py)
+
+        Args:
+            num_points: số điểm trả về
+            start, end: đoạn cần xem (giây), mặc định cả file
+        Returns:
+            min/max/rms mỗi điểm (float trong [-1, 1]) và 'points' dạng cũ {'x', 'y'}
+            (y = đỉnh tuyệt đối lớn hơn, thang -150..150) cho UI
         """
-        data, fs = sf.read(audio_path, dtype='int16')
-        
-        # Handle mono/stereo
-        if len(data.shape) > 1:
-            data = data[:, 0]  # Take first channel if stereo
-        
-        L = len(data)
-        if L < num_points:
-            raise ValueError(f"Audio file too short. Need at least {num_points} samples, got {L}")
-        
-        N = L // num_points
-        
-        waveform_points = []
-        for i in range(num_points - 1):
-            x1 = data[i * N]
-            y1 = int((int(x1) + 32768) * 300 // 65535) - 150
-            waveform_points.append({
-                'x': i,
-                'y': y1
-            })
-        
-        return {
+        peaks = get_peaks(audio_path)
+        view = peaks.query(start, end, num_points)
+
+        lo, hi = np.array(view['min']), np.array(view['max'])
+        signed_peak = np.where(np.abs(hi) >= np.abs(lo), hi, lo)
+        y_px = np.clip(np.round(signed_peak * 32768.0), -32768, 32767).astype(np.int64)
+        y_px = (y_px + 32768) * 300 // 65535 - 150
+        waveform_points = [{'x': i, 'y': int(v)} for i, v in enumerate(y_px)]
+
+        return dict(view, **{
             'points': waveform_points,
-            'length': L,
-            'sample_rate': int(fs),
-            'num_segments': N
-        }
+            'length': int(peaks.length),
+            'sample_rate': int(peaks.sample_rate),
+            'num_segments': int(round(view['samples_per_point']))
+        })
     
-    def generate_detailed_spectrogram(self, audio_path, output_dir, start_index=27, end_index=37):
+    def generate_detailed_spectrogram(self, audio_path, output_dir, start_index=27, end_index=37,
+                                      start=None, end=None):
         """
         Tạo spectrogram chi tiết với FFT (Hỗ trợ MP3 tốt hơn qua librosa)
+        start, end: chỉ xét đoạn [start, end) giây (start_index/end_index tính trong đoạn đó)
         """
-        try:
-            y, fs = librosa.load(audio_path, sr=None, mono=True)
-        except Exception as e:
-            print(f"ERROR spectrogram: {e}")
-            data, fs = sf.read(audio_path, dtype='float32')
-            y = data if len(data.shape) == 1 else data[:, 0]
+        y, fs = load_region(audio_path, start, end, mono=True)
         
         total_length = len(y)
         
@@ -277,43 +285,25 @@ class InstrumentVoiceProcessor:
         L = len(data_temp)
         N = max(1, L // 600)
         
-        # Tạo spectrogram matrix
-        spectrogram_matrix = []
-        pad_zeros = np.zeros((112,), dtype='float32')
-        
+        # Tạo spectrogram matrix: các frame 400 mẫu (bước N) lấy một lần bằng chỉ số,
+        # pad 0 tới 512 rồi FFT theo lô (chỉ cần 257 bin đầu nên dùng rfft)
         num_frames = min(600, L // N)
-        for x in range(num_frames):
-            a = x * N
-            b = min(x * N + 400, L)
-            frame = data_temp[a:b]
-            
-            if len(frame) < 400:
-                frame = np.pad(frame, (0, 400 - len(frame)), 'constant')
-            
-            y_frame = np.hstack((frame, pad_zeros))
-            Y = np.fft.fft(y_frame, 512)
-            S = 200.0 * np.sqrt(Y.real**2 + Y.imag**2)
-            S = np.clip(S, 0.001, 400)
-            dark = -(S - 512) / 512 * 255
-            dark = dark[:257].astype(np.int32)
-            spectrogram_matrix.append(dark)
+        padded = np.concatenate((np.asarray(data_temp, dtype=np.float32), np.zeros(400, dtype=np.float32)))
+        frames = padded[np.arange(num_frames)[:, np.newaxis] * N + np.arange(400)]
+        Y = np.fft.rfft(frames, 512, axis=1)
+        S = 200.0 * np.abs(Y)
+        S = np.clip(S, 0.001, 400)
+        dark = -(S - 512) / 512 * 255
         
         # Vẽ spectrogram
-        fig, ax = plt.subplots(figsize=(12, 6))
-        spectrogram_array = np.array(spectrogram_matrix).T
-        ax.imshow(spectrogram_array, aspect='auto', origin='lower', cmap='gray')
-        ax.set_xlabel('Time Frame')
-        ax.set_ylabel('Frequency Bin')
-        ax.set_title('Detailed Spectrogram (MP3 Supported)')
-        
-        output_path = Path(output_dir) / f"detailed_spectrogram_{np.random.randint(1000, 9999)}.png"
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        spectrogram_array = dark.astype(np.int32).T
+        output_path = Path(output_dir) / f"detailed_spectrogram_{uuid.uuid4().hex}.png"
+        render_image(spectrogram_array, output_path, title='Detailed Spectrogram (MP3 Supported)',
+                     xlabel='Time Frame', ylabel='Frequency Bin', cmap='gray')
         
         return str(output_path.name)
     
-    def analyze_formants(self, audio_path, num_formants=8):
+    def analyze_formants(self, audio_path, num_formants=8, start=None, end=None, quality=None):
         """
         Phân tích harmonics/spectral peaks của nhạc cụ
         
@@ -323,11 +313,13 @@ class InstrumentVoiceProcessor:
         Args:
             num_formants: Số lượng harmonics cần phát hiện (8 cho instruments vs 4 cho speech)
                          Nhạc cụ có nhiều harmonics hơn giọng nói
+            start, end: chỉ phân tích đoạn [start, end) giây (mặc định cả file)
+            quality: mức resample ("hq" | "fast"), mặc định self.resample_quality
         
         Returns:
             list: Danh sách các harmonics với frequency và magnitude
         """
-        y, sr = librosa.load(audio_path, sr=self.sample_rate)
+        y, sr = self.load_at_rate(audio_path, start, end, quality)
         
         # Tính STFT với window size lớn hơn cho frequency resolution tốt hơn
         D = librosa.stft(y, n_fft=4096)  # 4096 vs 2048 mặc định
@@ -366,44 +358,38 @@ class InstrumentVoiceProcessor:
         
         return harmonics
     
-    def pitch_tracking(self, audio_path):
+    def pitch_tracking(self, audio_path, algorithm="pyin", max_points=None, start=None, end=None, quality=None):
         """
-        Theo dõi pitch (cao độ) của nhạc cụ theo thời gian
+        Theo dõi pitch (cao độ) của nhạc cụ theo thời gian (cả track, xem src/pitch.py)
         
         Range mở rộng cho nhạc cụ:
         - Speech: C2 (65Hz) - C7 (2093Hz)
         - Instruments: A0 (27.5Hz) - C8 (4186Hz)
+        
+        Args:
+            algorithm: "pyin" (chính xác) hoặc "yin" (FFT, nhanh)
+            max_points: giảm số điểm trả về phía server (None = đủ độ phân giải)
+            start, end: chỉ theo dõi đoạn [start, end) giây; điểm i ở thời điểm start_time + i * frame_period
+            quality: mức resample ("hq" | "fast"), mặc định self.resample_quality
         """
-        y, sr = librosa.load(audio_path, sr=self.sample_rate)
+        y, sr = self.load_at_rate(audio_path, start, end, quality)
         
-        # Sử dụng pYIN algorithm với range mở rộng
-        f0 = librosa.pyin(
-            y, 
+        f0, _ = pitch_engine.track(
+            y, sr, algorithm=algorithm,
             fmin=librosa.note_to_hz('A0'),  # 27.5 Hz - lowest piano note
             fmax=librosa.note_to_hz('C8'),  # 4186 Hz - highest piano note
-            sr=sr
         )
-        
-        # Lọc bỏ NaN values
-        times = librosa.times_like(f0[0], sr=sr)
-        valid_indices = ~np.isnan(f0[0])
-        
-        pitch_data = []
-        for i, (time, freq) in enumerate(zip(times[valid_indices], f0[0][valid_indices])):
-            pitch_data.append({
-                'time': float(time),
-                'frequency': float(freq),
-                'note': librosa.hz_to_note(freq),
-                'midi': int(librosa.hz_to_midi(freq))  # Thêm MIDI note number
-            })
-        
-        return pitch_data[:100]  # Giới hạn 100 điểm để tránh quá tải
+        result = pitch_engine.summarize(f0, sr, pitch_engine.HOP_LENGTH, algorithm, max_points)
+        result["start_time"] = _region_offset(start, sr)
+        if result["f0_median"]:
+            result["median_note"] = librosa.hz_to_note(result["f0_median"])
+        return result
     
-    def generate_autocorrelation_plot(self, audio_path, output_dir, max_lag=100):
+    def generate_autocorrelation_plot(self, audio_path, output_dir, max_lag=100, start=None, end=None):
         """
-        Vẽ đồ thị autocorrelation
+        Vẽ đồ thị autocorrelation (frame lấy trong đoạn [start, end) giây nếu có)
         """
-        x, fs = self.extract_frame(audio_path)
+        x, fs = self.extract_frame(audio_path, start=start, end=end)
         
         # Pre-emphasis và Hamming window
         y = self.pre_emphasis(x)
@@ -412,79 +398,34 @@ class InstrumentVoiceProcessor:
         # Tính autocorrelation
         R = librosa.autocorrelate(z, max_size=max_lag)
         
-        # Vẽ đồ thị
-        fig, ax = plt.subplots(figsize=(10, 4))
-        ax.plot(R, linewidth=2, color='#2196F3')
-        ax.set_xlabel('Lag')
-        ax.set_ylabel('Autocorrelation')
-        ax.set_title('Autocorrelation Function')
-        ax.grid(True, alpha=0.3)
-        
-        # Lưu file
-        output_path = Path(output_dir) / f"autocorrelation_{np.random.randint(1000, 9999)}.png"
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        # Vẽ đồ thị + lưu file
+        output_path = Path(output_dir) / f"autocorrelation_{uuid.uuid4().hex}.png"
+        render_line(R, output_path, title='Autocorrelation Function', xlabel='Lag', ylabel='Autocorrelation')
         
         return str(output_path.name)
 
-    def analyze_vad(self, audio_path):
+    def analyze_vad(self, audio_path, start=None, end=None):
         """
         Phân đoạn tín hiệu (VAD - Voice/Activity Activity Detection)
-        Sử dụng năng lượng để xác định các đoạn có âm thanh
+        Sử dụng năng lượng để xác định các đoạn có âm thanh; đọc file theo block
+        (bộ nhớ cố định, xem src/streaming_vad.py)
         """
-        # Load audio (use sr=None to get original sample rate)
-        try:
-            y, sr = librosa.load(str(audio_path), sr=None, mono=True)
-        except Exception as e:
-            print(f"DEBUG VAD: Error loading file with librosa: {e}")
-            # Fallback
-            import soundfile as sf
-            y, sr = sf.read(str(audio_path))
-            if len(y.shape) > 1: y = np.mean(y, axis=1) # Mono conversion
-            # Ensure float32
-            y = y.astype(np.float32)
-
-        if len(y) == 0:
-            raise ValueError("Tệp âm thanh không có dữ liệu (Empty audio)")
+        # top_db 25: nhạy hơn một chút nếu người dùng gặp lỗi không tìm thấy đoạn nào
+        return streaming_vad.analyze_vad(audio_path, top_db=25, start=start, end=end)
 
-        # Sử dụng librosa.effects.split để tìm các đoạn có âm thanh
-        # Giảm top_db xuống 25 để nhạy hơn một chút nếu người dùng gặp lỗi không tìm thấy đoạn nào
-        intervals = librosa.effects.split(y, top_db=25)
-        
-        segments = []
-        for start, end in intervals:
-            segments.append({
-                "start": float(start / sr),
-                "end": float(end / sr),
-                "duration": float((end - start) / sr)
-            })
-            
-        return {
-            "total_segments": len(segments),
-            "segments": segments,
-            "total_duration": float(len(y) / sr)
-        }
-
-    def analyze_cutoff(self, audio_path):
+    def analyze_cutoff(self, audio_path, start=None, end=None):
         """
         Xác định tần số cắt (Cutoff Frequency) của tín hiệu
         Sử dụng Spectral Rolloff (tần số mà 85% năng lượng nằm dưới)
         """
-        # Load audio
-        try:
-            y, sr = librosa.load(str(audio_path), sr=None, mono=True)
-        except Exception as e:
-            import soundfile as sf
-            y, sr = sf.read(str(audio_path))
-            if len(y.shape) > 1: y = np.mean(y, axis=1)
-            y = y.astype(np.float32)
+        # Load audio + STFT dùng chung (cache theo nội dung file; đoạn [start, end) thì tính riêng)
+        y, sr = load_region(audio_path, start, end, mono=True)
 
         if len(y) == 0:
             return {"average_cutoff": 0, "max_cutoff": 0, "unit": "Hz", "warning": "No signal detected"}
 
         # Spectral Rolloff
-        rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.85)[0]
+        rolloff = get_plane(audio_path, start=start, end=end).spectral_rolloff(roll_percent=0.85)
         
         if len(rolloff) == 0:
             return {"average_cutoff": 0, "max_cutoff": 0, "unit": "Hz", "warning": "Could not calculate rolloff"}
@@ -498,7 +439,7 @@ class InstrumentVoiceProcessor:
             "unit": "Hz"
         }
 
-    def extract_acoustic_features(self, audio_path):
+    def extract_acoustic_features(self, audio_path, start=None, end=None):
         """
         Extract Audio Features based on user request (Chapter 4 ref)
         4.1 Short-time energy
@@ -508,14 +449,8 @@ class InstrumentVoiceProcessor:
         4.6 Pitch extraction (Autocorrelation)
         4.7 Phonetic analysis (MFCCs)
         """
-        # Load audio
-        try:
-            y, sr = librosa.load(str(audio_path), sr=None, mono=True)
-        except Exception:
-            import soundfile as sf
-            y, sr = sf.read(str(audio_path))
-            if len(y.shape) > 1: y = np.mean(y, axis=1)
-            y = y.astype(np.float32)
+        # Load audio (cả file, hoặc đoạn [start, end) giây)
+        y, sr = load_region(audio_path, start, end, mono=True)
 
         if len(y) == 0:
             raise ValueError("Empty audio file")
@@ -524,15 +459,15 @@ class InstrumentVoiceProcessor:
         frame_length = 1024
         hop_length = 512
 
+        # Một lần STFT cho mọi đặc trưng phổ bên dưới; framing miền thời gian là view
+        plane = get_plane(audio_path, hop_length=hop_length, start=start, end=end)
+
         # 4.1 Short-time Energy
-        energy = np.array([
-            np.sum(np.abs(y[i:i+frame_length]**2))
-            for i in range(0, len(y), hop_length)
-        ])
+        energy = plane.short_time_energy(frame_length, hop_length)
         ste_mean = float(np.mean(energy))
 
         # 4.2 Zero-crossing rate
-        zcr = librosa.feature.zero_crossing_rate(y, frame_length=frame_length, hop_length=hop_length)
+        zcr = plane.zero_crossing_rate(frame_length, hop_length)
         zcr_mean = float(np.mean(zcr))
 
         # 4.3 Endpoint detection (Active Duration)
@@ -540,8 +475,8 @@ class InstrumentVoiceProcessor:
         active_duration = float(np.sum([end-start for start, end in intervals]) / sr) if len(intervals) > 0 else 0.0
         
         # 4.6 Pitch extraction (Autocorrelation method - YIN)
-        # YIN is improved autocorrelation
-        f0 = librosa.yin(y, fmin=50, fmax=2000, sr=sr)
+        # YIN is improved autocorrelation; engine FFT dùng chung với pitch_tracking, chỉ lấy frame có pitch
+        f0, _ = pitch_engine.track(y, sr, algorithm="yin", fmin=50, fmax=2000)
         pitch_mean = float(np.mean(f0[~np.isnan(f0)])) if np.any(~np.isnan(f0)) else 0.0
 
         # 4.5 Formant tracking (Simplified LPC estimate on central frame)
@@ -563,9 +498,14 @@ class InstrumentVoiceProcessor:
             f1, f2 = 0, 0
 
         # 4.7 Phonetic/Timbre Analysis (MFCCs)
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+        mfcc = plane.mfcc(n_mfcc=13)
         mfcc_mean = np.mean(mfcc, axis=1).tolist()
 
+        # Spectral shape (centroid / bandwidth / rolloff) từ cùng mặt phẳng STFT
+        centroid = float(np.mean(plane.spectral_centroid()))
+        bandwidth = float(np.mean(plane.spectral_bandwidth()))
+        rolloff = float(np.mean(plane.spectral_rolloff()))
+
         return {
             "ste": {
                 "val": ste_mean,
@@ -591,5 +531,11 @@ class InstrumentVoiceProcessor:
             "phonetic": {
                 "mfcc": mfcc_mean[:4], # First 4 coeffs
                 "label": "Phonetic Features (MFCC)"
+            },
+            "spectral": {
+                "centroid": centroid,
+                "bandwidth": bandwidth,
+                "rolloff": rolloff,
+                "label": "Spectral Shape (Hz)"
             }
         }
@@ -0,0 +1,144 @@
+"""
+Test cho decoded-audio cache (src/audio_cache.py)
+"""
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import audio_cache
+from src.audio_cache import DecodedAudioCache, file_digest
+
+
+def _write_tone(path, sr=22050, seconds=1.0, channels=2):
+    t = np.arange(int(sr * seconds)) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+    data = np.stack([tone] * channels, axis=1) if channels > 1 else tone
+    sf.write(path, data, sr)
+    return path
+
+
+def test_cache_hit_returns_same_pcm(tmp_path):
+    audio = _write_tone(tmp_path / "tone.wav")
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    y1, sr1 = cache.load(audio, sr=None, mono=True)
+    y2, sr2 = cache.load(audio, sr=None, mono=True)
+
+    assert sr1 == sr2 == 22050
+    assert isinstance(y2, np.memmap)
+    assert y2.dtype == np.float32
+    np.testing.assert_array_equal(np.asarray(y1), np.asarray(y2))
+    # bản canonical + bản downmix mono
+    assert len(list((tmp_path / "cache").glob("*.npy"))) == 2
+
+
+def test_key_separates_rate_and_layout(tmp_path):
+    audio = _write_tone(tmp_path / "tone.wav")
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    mono, _ = cache.load(audio, sr=None, mono=True)
+    stereo, _ = cache.load(audio, sr=None, mono=False)
+    resampled, sr = cache.load(audio, sr=11025, mono=True)
+
+    assert mono.ndim == 1
+    assert stereo.shape[0] == 2
+    assert sr == 11025 and abs(len(resampled) - len(mono) // 2) <= 1
+    # canonical, mono, mono 11025; bản stereo ở sr gốc là view của canonical
+    assert len(list((tmp_path / "cache").glob("*.npy"))) == 3
+
+
+def test_lru_eviction_respects_budget(tmp_path):
+    first = _write_tone(tmp_path / "a.wav", channels=1)
+    second = _write_tone(tmp_path / "b.wav", seconds=1.5, channels=1)
+    # Budget chỉ đủ cho một entry
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=22050 * 4 * 1.6)
+
+    cache.load(first, mono=True)
+    cache.load(second, mono=True)
+
+    remaining = [p.stem for p in (tmp_path / "cache").glob("*.npy")]
+    assert remaining == [cache.frames_key(file_digest(second))]
+
+
+def test_same_content_shares_entry(tmp_path):
+    a = _write_tone(tmp_path / "a.wav")
+    b = tmp_path / "copy_of_a.wav"
+    b.write_bytes(a.read_bytes())
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    cache.load(a)
+    cache.load(b)
+
+    assert file_digest(a) == file_digest(b)
+    assert len(list((tmp_path / "cache").glob("*.npy"))) == 2
+
+
+def test_matches_librosa_load(tmp_path):
+    import librosa
+
+    audio = _write_tone(tmp_path / "tone.wav", sr=44100)
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    for sr, mono in [(None, True), (None, False), (22050, True), (22050, False)]:
+        ours, fs = cache.load(audio, sr=sr, mono=mono)
+        ref, ref_fs = librosa.load(str(audio), sr=sr, mono=mono)
+        assert fs == ref_fs and ours.shape == ref.shape
+        np.testing.assert_allclose(ours, ref, atol=1e-6)
+
+    frames, fs = cache.frames(audio)
+    assert fs == 44100 and frames.shape == (44100, 2)
+    stereo, _ = cache.load(audio, sr=None, mono=False)
+    assert isinstance(stereo, np.memmap) and stereo.filename == frames.filename
+
+
+def test_region_with_and_without_canonical(tmp_path):
+    audio = _write_tone(tmp_path / "tone.wav", seconds=2.0)
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    # Chưa có bản canonical: decoder seek, không tạo entry nào
+    seek, sr = cache.region(audio, 0.5, 1.25)
+    assert sr == 22050 and len(seek) == int(0.75 * sr)
+    assert not list((tmp_path / "cache").glob("*.npy"))
+
+    full, _ = cache.load(audio)
+    sliced, _ = cache.region(audio, 0.5, 1.25)
+    np.testing.assert_array_equal(seek, sliced)
+    np.testing.assert_array_equal(sliced, full[int(0.5 * sr):int(1.25 * sr)])
+
+
+def test_resample_quality_tiers_are_cached_separately(tmp_path):
+    audio = _write_tone(tmp_path / "tone.wav", sr=44100)
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    hq, sr = cache.load(audio, sr=22050, quality="hq")
+    fast, _ = cache.load(audio, sr=22050, quality="fast")
+    again, _ = cache.load(audio, sr=22050, quality="fast")
+
+    assert sr == 22050 and len(hq) == len(fast) == 22050
+    assert not np.array_equal(np.asarray(hq), np.asarray(fast))
+    assert np.abs(np.asarray(hq) - np.asarray(fast))[1000:-1000].max() < 1e-2
+    assert again.filename == fast.filename
+    # canonical, mono 22050 hq (khoá cũ), mono 22050 fast
+    digest = file_digest(audio)
+    names = sorted(p.stem for p in (tmp_path / "cache").glob("*.npy"))
+    assert names == [f"{digest}_22050_mono", f"{digest}_22050_mono_fast", f"{digest}_frames"]
+
+    # Đoạn ở sample rate đã có trong cache được cắt thẳng từ bản đó
+    part, _ = cache.region(audio, 0.25, 0.5, sr=22050, quality="fast")
+    np.testing.assert_array_equal(part, np.asarray(fast)[5512:11025])
+
+
+def test_failed_decode_leaves_no_temp_file(tmp_path, monkeypatch):
+    audio = _write_tone(tmp_path / "tone.wav")
+    cache = DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+
+    def broken_decode(path, dest, blocksize=None):
+        dest.write_bytes(b"partial frames")
+        raise RuntimeError("Error decoding frame")
+
+    monkeypatch.setattr(audio_cache, "write_frames", broken_decode)
+    with pytest.raises(RuntimeError):
+        cache.frames(audio)
+    # evict() bỏ qua dotfile: file tạm viết dở không được ở lại
+    assert list((tmp_path / "cache").iterdir()) == []
@@ -0,0 +1,81 @@
+"""
+Test cho batch runner (src/batch.py)
+"""
+
+import json
+
+import numpy as np
+import soundfile as sf
+
+from src.batch import analyze_file, run_batch
+
+
+def _write_catalog(root, sr=22050):
+    root.mkdir()
+    (root / "album").mkdir()
+    t = np.arange(sr) / sr
+    sf.write(root / "a.wav", 0.3 * np.sin(2 * np.pi * 220 * t), sr)
+    sf.write(root / "album" / "b.wav", 0.3 * np.sin(2 * np.pi * 440 * t), sr)
+    (root / "broken.wav").write_bytes(b"not audio")
+    (root / "notes.txt").write_text("ignored")
+
+
+def _read(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_batch_writes_one_record_per_file_and_resumes(tmp_path):
+    root = tmp_path / "catalog"
+    _write_catalog(root)
+    output = tmp_path / "out.jsonl"
+
+    summary = run_batch(root, output, stages=["cutoff"], workers=2, timeout=60)
+    records = {r["path"]: r for r in _read(output)}
+
+    assert set(records) == {"a.wav", "album/b.wav", "broken.wav"}
+    assert summary["files"] == 3 and summary["failed"] == 1
+    assert records["a.wav"]["status"] == "ok"
+    assert records["a.wav"]["results"]["cutoff"]["unit"] == "Hz"
+    assert abs(records["a.wav"]["duration"] - 1.0) < 1e-6
+    assert records["broken.wav"]["status"] == "error"
+
+    # Giả lập crash khi đang ghi dòng cuối: dòng dở bị bỏ, file đó được phân tích lại
+    lines = output.read_text().splitlines()
+    output.write_text("\n".join(lines[:2]) + "\n" + lines[2][:10])
+    summary = run_batch(root, output, stages=["cutoff"], workers=1, timeout=60)
+
+    assert summary["files"] == 1
+    assert sorted(r["path"] for r in _read(output)) == ["a.wav", "album/b.wav", "broken.wav"]
+
+
+def test_timeout_is_reported_per_file(tmp_path, monkeypatch):
+    import time
+    from src import batch
+
+    audio = tmp_path / "a.wav"
+    sf.write(audio, np.zeros(2205), 22050)
+    monkeypatch.setitem(batch.STAGES, "slow", lambda path, options: time.sleep(5))
+
+    record = analyze_file(str(audio), "a.wav", ("slow",), timeout=1.0)
+
+    assert record["status"] == "timeout"
+    assert "slow" in record["error"]
+    # Stage bị ngắt trước khi sleep(5) kết thúc
+    assert "slow" not in record["stage_times"]
+    assert record["elapsed"] < 5
+
+
+def test_batch_uses_its_own_cache_dir(tmp_path):
+    from src.audio_cache import DECODED_DIR, file_digest
+
+    root = tmp_path / "catalog"
+    _write_catalog(root)
+    sf.write(root / "a.wav", np.linspace(-0.2, 0.2, 22050), 22050)
+    digest = file_digest(root / "a.wav")
+
+    run_batch(root, tmp_path / "out.jsonl", stages=["features"], workers=1, timeout=60,
+              cache_dir=tmp_path / "batch_cache")
+
+    assert list((tmp_path / "batch_cache" / "decoded").glob(f"{digest}_*.npy"))
+    assert list((tmp_path / "batch_cache" / "stft").glob(f"{digest}_*.npy"))
+    assert not list(DECODED_DIR.glob(f"{digest}_*"))
@@ -0,0 +1,187 @@
+"""
+Test cho engine mixdown theo block (src/effects.py)
+"""
+
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import effects, mix_stream
+from src.effects import apply_audio_effects
+
+
+def _write_stems(root, sr=22050):
+    rng = np.random.default_rng(0)
+    uploads = root / "uploads"
+    uploads.mkdir()
+    t = np.arange(int(sr * 2.5)) / sr
+    sf.write(uploads / "a.wav", np.stack([0.4 * np.sin(2 * np.pi * 220 * t)] * 2, axis=1), sr, subtype='FLOAT')
+    sf.write(uploads / "b.wav", 0.2 * rng.standard_normal(int(sr * 1.7)), sr, subtype='FLOAT')
+
+
+def _render(root, tracks, name, block_size, workers=1):
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        assert apply_audio_effects(tracks, root / name, block_size=block_size, workers=workers)
+    finally:
+        os.chdir(cwd)
+    data, sr = sf.read(root / name, dtype='float32')
+    return data, sr
+
+
+def test_block_size_does_not_change_output(tmp_path):
+    _write_stems(tmp_path)
+    tracks = [
+        {"url": "/uploads/a.wav", "echo": 0.6, "lpf": 3000, "reverb": 0.5, "pan": -0.4},
+        {"url": "/uploads/b.wav", "hpf": 500, "distortion": 0.3, "volume": 0.7},
+    ]
+    small, sr = _render(tmp_path, tracks, "small.wav", block_size=1000)
+    large, _ = _render(tmp_path, tracks, "large.wav", block_size=1 << 16)
+
+    assert sr == 22050
+    # Dài bằng track dài nhất
+    assert small.shape == (int(22050 * 2.5), 2)
+    np.testing.assert_allclose(small, large, atol=2 / 32768)
+    assert abs(np.max(np.abs(large)) - 0.95) < 1e-3
+
+
+def test_plain_mix_matches_sum(tmp_path):
+    _write_stems(tmp_path)
+    tracks = [{"url": "/uploads/a.wav"}, {"url": "/uploads/b.wav", "pan": 1.0}]
+    mixed, _ = _render(tmp_path, tracks, "mix.wav", block_size=4096)
+
+    a, _ = sf.read(tmp_path / "uploads" / "a.wav", dtype='float32')
+    b, _ = sf.read(tmp_path / "uploads" / "b.wav", dtype='float32')
+    expected = a.copy()
+    # pan = 1.0: kênh trái bị tắt, kênh phải giữ nguyên
+    expected[:len(b), 1] += b
+    expected *= 0.95 / np.max(np.abs(expected))
+    np.testing.assert_allclose(mixed, expected, atol=2 / 32768)
+
+
+def test_parallel_render_matches_serial(tmp_path):
+    _write_stems(tmp_path)
+    tracks = [
+        {"url": "/uploads/a.wav", "pitch": 2, "echo": 0.4, "lpf": 5000},
+        {"url": "/uploads/missing.wav"},
+        {"url": "/uploads/b.wav", "speed": 1.25, "hpf": 300, "pan": 0.5},
+    ]
+    serial, _ = _render(tmp_path, tracks, "serial.wav", block_size=3000, workers=1)
+    parallel, _ = _render(tmp_path, tracks, "parallel.wav", block_size=3000, workers=3)
+    # Cộng theo thứ tự track cố định -> giống hệt từng bit
+    np.testing.assert_array_equal(serial, parallel)
+    # Không còn file render tạm, output từng stage nằm trong cache stage
+    assert not list((tmp_path / "cache" / "render").glob("track_*.npy"))
+    assert list((tmp_path / "cache" / "effects").glob("*.npy"))
+
+
+def test_parallel_render_survives_stage_cache_eviction(tmp_path, monkeypatch):
+    _write_stems(tmp_path)
+    # Ngân sách nhỏ hơn một entry: render của track này evict output của track kia
+    monkeypatch.setattr(effects, "_effect_cache", effects.NpyCache(tmp_path / "cache" / "effects", 1))
+    tracks = [
+        {"url": "/uploads/a.wav", "echo": 0.4, "lpf": 5000},
+        {"url": "/uploads/b.wav", "echo": 0.3, "lpf": 3000},
+        {"url": "/uploads/a.wav", "hpf": 300},
+    ]
+    serial, _ = _render(tmp_path, tracks, "serial.wav", block_size=3000, workers=1)
+    parallel, _ = _render(tmp_path, tracks, "parallel.wav", block_size=3000, workers=3)
+    np.testing.assert_array_equal(serial, parallel)
+    assert not list((tmp_path / "cache" / "render").glob("track_*.npy"))
+
+def test_stage_cache_only_recomputes_downstream(tmp_path, monkeypatch):
+    _write_stems(tmp_path)
+    calls = []
+    make_effect = effects._make_effect
+    monkeypatch.setattr(effects, "_make_effect", lambda spec, sr: calls.append(spec[0]) or make_effect(spec, sr))
+    time_pitch = effects.vocoder.time_pitch
+    monkeypatch.setattr(effects.vocoder, "time_pitch", lambda *a, **k: calls.append("time_pitch") or time_pitch(*a, **k))
+
+    track = {"url": "/uploads/a.wav", "pitch": 2, "distortion": 0.3, "lpf": 4000, "hpf": 200}
+    first, _ = _render(tmp_path, [track], "first.wav", block_size=4096)
+    assert calls == ["time_pitch", "distortion", "lpf", "hpf"]
+
+    # Volume/pan: chỉ cộng lại, không stage nào chạy lại
+    calls.clear()
+    _render(tmp_path, [dict(track, volume=0.5, pan=0.3)], "gain.wav", block_size=4096)
+    assert calls == []
+
+    # Đổi lpf: time_pitch + distortion lấy từ cache
+    calls.clear()
+    changed, _ = _render(tmp_path, [dict(track, lpf=2000)], "lpf.wav", block_size=4096)
+    assert calls == ["lpf", "hpf"]
+
+    # Kết quả dùng cache giống hệt khi tính lại từ đầu
+    monkeypatch.setattr(effects, "EFFECT_CACHE_DIR", tmp_path / "fresh")
+    monkeypatch.setattr(effects, "_effect_cache", None)
+    fresh, _ = _render(tmp_path, [dict(track, lpf=2000)], "fresh.wav", block_size=4096)
+    np.testing.assert_array_equal(changed, fresh)
+    assert not np.array_equal(first, changed)
+
+
+def test_lookahead_limiter_is_block_invariant_and_bounded():
+    rng = np.random.default_rng(1)
+    x = (0.1 * rng.standard_normal((2, 30000))).astype(np.float32)
+    x[:, 10000:10020] *= 30
+
+    def run(block):
+        limiter = effects._LookaheadLimiter(22050)
+        out = [limiter.process(x[:, i:i + block]) for i in range(0, x.shape[1], block)]
+        return np.concatenate(out + [limiter.finish()], axis=1)
+
+    small, large = run(777), run(1 << 16)
+    np.testing.assert_array_equal(small, large)
+    assert small.shape == x.shape
+    assert np.max(np.abs(small)) <= effects.LIMITER_CEILING + 1e-6
+    # Xa đỉnh thì không đổi gì
+    np.testing.assert_allclose(small[:, :5000], x[:, :5000], atol=1e-6)
+
+
+def test_stream_mix_wav_matches_block_render(tmp_path):
+    _write_stems(tmp_path)
+    tracks = [{"url": "/uploads/a.wav", "echo": 0.5, "volume": 0.5}, {"url": "/uploads/b.wav", "lpf": 4000}]
+    sr, n_frames, blocks = effects.stream_mix(tracks, block_size=1000, root_dir=tmp_path)
+    path = tmp_path / "stream.wav"
+    path.write_bytes(b"".join(mix_stream.encode_stream(sr, n_frames, blocks, "wav")))
+
+    streamed, stream_sr = sf.read(path, dtype='float32')
+    assert stream_sr == sr == 22050 and streamed.shape == (n_frames, 2)
+    # Mix không chạm ngưỡng limiter -> giống bản render thường trước khi chuẩn hoá
+    rendered, _ = _render(tmp_path, tracks, "mix.wav", block_size=4096)
+    scale = np.max(np.abs(rendered)) / np.max(np.abs(streamed))
+    np.testing.assert_allclose(streamed * scale, rendered, atol=4 / 32768)
+
+
+def test_prepare_stream_mix_renders_time_pitch_before_streaming(tmp_path, monkeypatch):
+    _write_stems(tmp_path)
+    monkeypatch.setattr(effects, "_effect_cache", effects.NpyCache(tmp_path / "cache" / "effects", 1 << 30))
+    calls = []
+    time_pitch = effects.vocoder.time_pitch
+    monkeypatch.setattr(effects.vocoder, "time_pitch", lambda *a, **k: calls.append("time_pitch") or time_pitch(*a, **k))
+
+    tracks = [{"url": "/uploads/a.wav", "pitch": 2, "echo": 0.4}, {"url": "/uploads/b.wav"}]
+    assert effects.prepare_stream_mix(tracks, root_dir=tmp_path) == 2
+    assert calls == ["time_pitch"]
+
+    # Lúc phát chỉ đọc lại cache, không render speed/pitch lần nữa
+    _, n_frames, blocks = effects.stream_mix(tracks, root_dir=tmp_path)
+    assert sum(len(b) for b in blocks) == n_frames
+    assert calls == ["time_pitch"]
+
+
+def test_validate_tracks(tmp_path):
+    _write_stems(tmp_path)
+    effects.validate_tracks([{"url": "/uploads/a.wav", "speed": "1.2"}], root_dir=tmp_path)
+
+    for tracks, error in [
+        ([{"speed": 1.2}], ValueError),
+        ([{"url": "/uploads/a.wav", "echo": "loud"}], ValueError),
+        ([{"url": "/uploads/a.wav", "volume": None}], ValueError),
+        ([{"url": "/../outside.wav"}], ValueError),
+        ([{"url": "/uploads/a.wav"}, {"url": "/uploads/missing.wav"}], FileNotFoundError),
+    ]:
+        with pytest.raises(error):
+            effects.validate_tracks(tracks, root_dir=tmp_path)
@@ -0,0 +1,41 @@
+"""
+Test cho lớp thực thi process pool (src/executor.py)
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.executor import AnalysisPool, PoolBusyError
+
+
+def test_runs_in_separate_process():
+    pool = AnalysisPool(max_workers=1, queue_size=0)
+    try:
+        pid = asyncio.run(pool.run(os.getpid))
+        assert pid != os.getpid()
+    finally:
+        pool.shutdown()
+
+
+def test_full_queue_raises_pool_busy():
+    pool = AnalysisPool(max_workers=1, queue_size=0)
+    pool.warm_up()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolBusyError) as exc_info:
+            await pool.run(time.sleep, 0)
+        await running
+        # Slot được trả lại sau khi tác vụ đầu kết thúc
+        await pool.run(time.sleep, 0)
+        return exc_info.value
+
+    try:
+        err = asyncio.run(scenario())
+        assert err.retry_after > 0
+    finally:
+        pool.shutdown()
@@ -0,0 +1,57 @@
+"""
+Test cho mặt phẳng STFT dùng chung (src/features.py)
+So sánh với các hàm librosa gọi trực tiếp trên tín hiệu như code cũ
+"""
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from src import features
+from src.audio_cache import NpyCache
+from src.features import SpectralPlane, get_plane
+
+
+def _signal(sr=22050, seconds=2.0):
+    rng = np.random.default_rng(1)
+    t = np.arange(int(sr * seconds)) / sr
+    y = 0.4 * np.sin(2 * np.pi * 330 * t) + 0.05 * rng.standard_normal(len(t))
+    return y.astype(np.float32), sr
+
+
+def test_features_match_direct_librosa_calls():
+    y, sr = _signal()
+    plane = SpectralPlane.from_signal(y, sr)
+
+    energy = np.array([np.sum(np.abs(y[i:i+1024]**2)) for i in range(0, len(y), 512)])
+    np.testing.assert_allclose(plane.short_time_energy(1024, 512), energy, rtol=1e-5)
+
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=1024, hop_length=512)[0]
+    np.testing.assert_allclose(plane.zero_crossing_rate(1024, 512), zcr)
+
+    np.testing.assert_allclose(plane.mfcc(13), librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13), atol=1e-2)
+    np.testing.assert_allclose(plane.spectral_rolloff(),
+                               librosa.feature.spectral_rolloff(y=y, sr=sr)[0], rtol=1e-4)
+    np.testing.assert_allclose(plane.spectral_centroid(),
+                               librosa.feature.spectral_centroid(y=y, sr=sr)[0], rtol=1e-3)
+    np.testing.assert_allclose(plane.onset_strength(),
+                               librosa.onset.onset_strength(y=y, sr=sr), atol=1e-3)
+
+
+def test_plane_is_computed_once_per_file(tmp_path, monkeypatch):
+    y, sr = _signal()
+    audio = tmp_path / "tone.wav"
+    sf.write(audio, y, sr)
+    monkeypatch.setattr(features, "_stft_cache", NpyCache(tmp_path / "stft"))
+
+    calls = []
+    original = features.compute_magnitude
+    monkeypatch.setattr(features, "compute_magnitude", lambda *a: calls.append(a) or original(*a))
+
+    first = get_plane(audio)
+    second = get_plane(audio)
+    get_plane(audio, hop_length=256)
+
+    assert len(calls) == 2
+    assert isinstance(second.magnitude, np.memmap)
+    np.testing.assert_array_equal(first.magnitude, second.magnitude)
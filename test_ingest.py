@@ -0,0 +1,50 @@
+"""
+Test cho upload content-addressed (src/ingest.py)
+"""
+
+import hashlib
+import io
+
+from src import audio_cache
+from src.ingest import safe_extension, store_stream
+
+
+def test_same_content_is_stored_once(tmp_path):
+    payload = b"RIFF" + bytes(range(256)) * 5000
+    digest = hashlib.sha256(payload).hexdigest()
+
+    first = store_stream(io.BytesIO(payload), tmp_path, "My Song.WAV")
+    second = store_stream(io.BytesIO(payload), tmp_path, "renamed copy.wav")
+
+    assert first["file_id"] == second["file_id"] == digest
+    assert first["filename"] == second["filename"] == f"{digest}.wav"
+    assert not first["duplicate"] and second["duplicate"]
+    assert second["original_filename"] == "renamed copy.wav"
+    # Một file duy nhất, không còn file tạm
+    assert [p.name for p in tmp_path.iterdir()] == [f"{digest}.wav"]
+    assert (tmp_path / first["filename"]).read_bytes() == payload
+
+
+def test_same_content_with_other_extension_reuses_file(tmp_path):
+    payload = b"ID3" + bytes(range(256)) * 100
+    first = store_stream(io.BytesIO(payload), tmp_path, "song.mp3")
+    second = store_stream(io.BytesIO(payload), tmp_path, "SONG.MPEG")
+
+    assert second["duplicate"] and second["filename"] == first["filename"]
+    assert [p.name for p in tmp_path.iterdir()] == [first["filename"]]
+
+
+def test_digest_is_primed_for_caches(tmp_path, monkeypatch):
+    stored = store_stream(io.BytesIO(b"abc" * 1000), tmp_path, "a.mp3")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file should not be re-hashed")
+
+    monkeypatch.setattr(audio_cache.hashlib, "sha256", fail)
+    assert audio_cache.file_digest(tmp_path / stored["filename"]) == stored["file_id"]
+
+
+def test_client_filename_cannot_escape_upload_dir():
+    assert safe_extension("../../etc/passwd") == ".bin"
+    assert safe_extension("track.flac") == ".flac"
+    assert safe_extension("evil.wav/../x") == ".bin"
@@ -0,0 +1,151 @@
+"""
+Test cho job subsystem (src/jobs.py)
+"""
+
+import pickle
+import sys
+import time
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.jobs import JobStore, JobManager, JobContext, JobCancelled, FileJobContext, COMPLETED, CANCELLED, FAILED, QUEUED, RUNNING
+
+
+def _wait(store, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job["status"] in (COMPLETED, CANCELLED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_reports_progress_and_result(tmp_path):
+    def runner(params, job):
+        job.report(0.5, "half way")
+        return {"echo": params["value"]}
+
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    manager = JobManager(store, {"echo": runner})
+    job = _wait(store, manager.submit("echo", {"value": 42}))
+    manager.shutdown()
+
+    assert job["status"] == COMPLETED
+    assert job["progress"] == 1.0
+    assert job["result"] == {"echo": 42}
+
+
+def test_cancel_kills_attached_process(tmp_path):
+    started = []
+
+    def runner(params, job):
+        proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        job.attach_process(proc)
+        started.append(proc)
+        proc.wait()
+        job.raise_if_cancelled()
+        return {}
+
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    manager = JobManager(store, {"slow": runner})
+    job_id = manager.submit("slow", {})
+    while not started:
+        time.sleep(0.02)
+
+    assert manager.cancel(job_id)
+    job = _wait(store, job_id)
+    manager.shutdown()
+
+    assert job["status"] == CANCELLED
+    assert started[0].poll() is not None
+    assert not manager.cancel(job_id)
+
+
+def test_unfinished_jobs_survive_restart(tmp_path):
+    db = tmp_path / "jobs.sqlite3"
+    store = JobStore(db)
+    # Job được tạo nhưng server "chết" trước khi chạy
+    job_id = store.create("echo", {"value": 7})
+    assert store.get(job_id)["status"] == QUEUED
+
+    restarted = JobStore(db)
+    manager = JobManager(restarted, {"echo": lambda params, job: {"echo": params["value"]}})
+    assert manager.resume() == [job_id]
+    job = _wait(restarted, job_id)
+    manager.shutdown()
+
+    assert job["status"] == COMPLETED
+    assert job["result"] == {"echo": 7}
+
+
+def test_cancelled_before_start_never_runs(tmp_path):
+    calls = []
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    manager = JobManager(store, {"echo": lambda params, job: calls.append(params) or {}})
+    job_id = store.create("echo", {})
+    # cancel() ghi CANCELLED trước khi worker kịp chuyển sang running (context chưa bị huỷ)
+    store.update(job_id, status=CANCELLED)
+    manager._run(job_id, "echo", {}, JobContext(store, job_id))
+    manager.shutdown()
+
+    assert calls == []
+    assert store.get(job_id)["status"] == CANCELLED
+
+
+
+def test_file_context_relays_progress_and_cancel(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.create("dsp", {})
+    store.update(job_id, status=RUNNING)
+    ctx = JobContext(store, job_id)
+    channel = tmp_path / "channel"
+    channel.mkdir()
+    # Context gửi sang worker process chỉ mang đường dẫn channel
+    remote = pickle.loads(pickle.dumps(FileJobContext(channel)))
+
+    def work():
+        remote.report(0.4, "DSP: cửa sổ 2/5")
+        while not remote.cancelled:
+            time.sleep(0.01)
+        remote.raise_if_cancelled()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(work)
+        threading.Timer(0.6, ctx.cancel).start()
+        with pytest.raises(JobCancelled):
+            ctx.follow(future, channel, interval=0.05)
+
+    job = store.get(job_id)
+    assert job["progress"] == 0.4
+    assert job["message"] == "DSP: cửa sổ 2/5"
+
+
+def test_cancel_after_runner_returns_is_not_overwritten(tmp_path):
+    class CancelBeforeFinalWrite(JobStore):
+        """cancel() chen vào giữa lúc runner trả về và lúc ghi trạng thái cuối"""
+
+        def _intercept(self, job_id, fields):
+            if fields.get("status") == COMPLETED:
+                assert manager.cancel(job_id)
+
+        def update(self, job_id, **fields):
+            self._intercept(job_id, fields)
+            return super().update(job_id, **fields)
+
+        def transition(self, job_id, expected, **fields):
+            self._intercept(job_id, fields)
+            return super().transition(job_id, expected, **fields)
+
+    store = CancelBeforeFinalWrite(tmp_path / "jobs.sqlite3")
+    manager = JobManager(store, {"echo": lambda params, job: {"echo": 1}})
+    job_id = manager.submit("echo", {})
+    job = manager.wait(job_id, timeout=10)
+    manager.shutdown()
+
+    assert job["status"] == CANCELLED
+    assert job["result"] is None
+    assert not manager.cancel(job_id)
@@ -0,0 +1,100 @@
+"""
+Test cho engine LPC / cepstrum vector hoá (src/lpc.py)
+So sánh với các vòng lặp gốc của InstrumentVoiceProcessor
+"""
+
+import librosa
+import numpy as np
+import scipy.linalg
+import soundfile as sf
+
+from src import audio_cache, lpc
+from src.voice_processing import InstrumentVoiceProcessor
+
+
+def _loop_pre_emphasis(signal, alpha):
+    y = np.zeros((len(signal),), np.float32)
+    for n in range(len(signal)):
+        y[n] = signal[n] - alpha * signal[n if n == 0 else n - 1]
+    return y
+
+
+def _loop_hamming(signal):
+    N = len(signal)
+    w = np.array([0.54 - 0.46 * np.cos(2 * np.pi * n / N) for n in range(N)], dtype=np.float32)
+    return signal * w
+
+
+def _loop_cepstrum(a, p, max_order):
+    c = np.zeros((max_order + 1,))
+    for m in range(1, max_order + 1):
+        c[m] = a[m] if m <= p else 0.0
+        for k in range(1, m):
+            c[m] += (k / m) * c[k] * (a[m - k] if m - k <= p else 0.0)
+    return c
+
+
+def test_vectorized_matches_loops():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal(1024).astype(np.float32)
+    proc = InstrumentVoiceProcessor()
+
+    np.testing.assert_allclose(proc.pre_emphasis(x, 0.7), _loop_pre_emphasis(x, 0.7), rtol=1e-6)
+    np.testing.assert_allclose(proc.apply_hamming_window(x), _loop_hamming(x), rtol=1e-5, atol=1e-6)
+
+    a = np.concatenate(([-1.0], 0.3 * rng.standard_normal(20)))
+    np.testing.assert_allclose(proc.compute_cepstral_coefficients(a, 20, max_order=30),
+                               _loop_cepstrum(a, 20, 30), rtol=1e-4, atol=1e-6)
+
+
+def test_batched_levinson_solves_each_frame():
+    rng = np.random.default_rng(1)
+    frames = rng.standard_normal((6, 512)) * lpc.hamming_window(512)
+    r = lpc.autocorrelation(frames, 13)
+    a, _ = lpc.levinson_durbin(r, 12)
+    for i in range(len(frames)):
+        expected = scipy.linalg.solve_toeplitz(r[i, :12], -r[i, 1:13])
+        np.testing.assert_allclose(a[i, 1:], expected, rtol=1e-6, atol=1e-9)
+
+
+def test_silent_frames_do_not_produce_nan():
+    y = np.zeros(4096, dtype=np.float32)
+    y[2048:] = np.sin(np.arange(2048) * 0.1)
+    traj = lpc.lpc_trajectory(y, 22050, order=10, frame_length=512, hop_length=256, batch_frames=3)
+    assert np.all(np.isfinite(traj["lpc"]))
+    assert np.all(np.isfinite(traj["cepstrum"]))
+    np.testing.assert_array_equal(traj["lpc"][0], np.r_[-1.0, np.zeros(10)])
+
+
+def test_trajectory_mode_decimates(tmp_path):
+    sr = 22050
+    t = np.arange(sr * 3) / sr
+    path = tmp_path / "tone.wav"
+    sf.write(path, 0.5 * np.sin(2 * np.pi * 330 * t), sr)
+
+    result = InstrumentVoiceProcessor().lpc_analysis(path, mode="both", max_frames=50)
+    traj = result["trajectory"]
+    assert len(result["lpc_coefficients"]) == 21
+    assert len(traj["times"]) <= 50
+    assert len(traj["lpc_coefficients"][0]) == 21
+    assert len(traj["cepstral_coefficients"][0]) == 31
+    assert traj["num_frames"] > 50
+
+
+def test_extract_frame_trims_inside_region_only(tmp_path, monkeypatch):
+    cache = audio_cache.DecodedAudioCache(tmp_path / "cache", max_bytes=1 << 30)
+    monkeypatch.setattr(audio_cache, "_default_cache", cache)
+    sr = 22050
+    y = np.zeros(sr * 6, dtype=np.float32)
+    y[int(3.5 * sr):] = 0.5 * np.sin(np.arange(len(y) - int(3.5 * sr)) * 0.2)
+    path = tmp_path / "late.wav"
+    sf.write(path, y, sr, subtype='FLOAT')
+
+    x, fs = InstrumentVoiceProcessor().extract_frame(path, start=3.0, end=5.0)
+    region = y[3 * sr:5 * sr]
+    _, (trim, _) = librosa.effects.trim(region, top_db=30)
+    offset = trim + int(50 * sr / 1000)
+    assert fs == sr
+    np.testing.assert_array_equal(x, region[offset:offset + 1024])
+    # Chỉ đoạn được decode: không có bản canonical của cả file
+    assert cache.get(cache.frames_key(audio_cache.file_digest(path))) is None
@@ -0,0 +1,58 @@
+"""
+Test cho kim tự tháp peak waveform (src/peaks.py)
+"""
+
+import numpy as np
+import soundfile as sf
+
+from src.peaks import PeakPyramid, build_peaks
+
+
+def _brute_force(y, s0, s1, points):
+    bounds = s0 + (np.arange(points + 1) * (s1 - s0)) // points
+    segs = [y[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    return np.array([s.min() for s in segs]), np.array([s.max() for s in segs])
+
+
+def _make(tmp_path, seconds=30, sr=8000):
+    rng = np.random.default_rng(0)
+    y = (0.5 * rng.standard_normal(sr * seconds)).clip(-1, 1).astype(np.float32)
+    audio = tmp_path / "noise.wav"
+    sf.write(audio, y, sr, subtype='FLOAT')
+    build_peaks(audio, tmp_path / "noise.peaks", base_block=64)
+    return y, sr, PeakPyramid(tmp_path / "noise.peaks", audio)
+
+
+def test_levels_are_powers_of_two(tmp_path):
+    y, sr, peaks = _make(tmp_path)
+    assert peaks.length == len(y) and peaks.sample_rate == sr
+    assert len(peaks.levels[0]) == -(-len(y) // 64)
+    assert all(len(b) == -(-len(a) // 2) for a, b in zip(peaks.levels, peaks.levels[1:]))
+    assert len(peaks.levels[-1]) == 1
+    assert peaks.levels[-1]["max"][0] == np.round(y.max() * 32767)
+
+
+def test_query_matches_brute_force_envelope(tmp_path):
+    y, sr, peaks = _make(tmp_path)
+    # Điểm chia thẳng hàng với block của level -> khớp chính xác (sai số lượng tử int16)
+    view = peaks.query(0, len(y) / sr, points=len(y) // 512)
+    lo, hi = _brute_force(y, 0, len(y), len(y) // 512)
+    assert view["level"] == 3
+    np.testing.assert_allclose(view["min"], lo, atol=1e-4)
+    np.testing.assert_allclose(view["max"], hi, atol=1e-4)
+
+    # Đoạn bất kỳ: envelope của level luôn bao trọn envelope thật
+    view = peaks.query(3.21, 17.9, points=333)
+    lo, hi = _brute_force(y, int(3.21 * sr), int(17.9 * sr), 333)
+    assert len(view["max"]) == 333
+    assert np.all(np.array(view["max"]) >= hi - 1e-4)
+    assert np.all(np.array(view["min"]) <= lo + 1e-4)
+
+
+def test_deep_zoom_reads_raw_samples(tmp_path):
+    y, sr, peaks = _make(tmp_path)
+    view = peaks.query(10.0, 10.05, points=100)
+    lo, hi = _brute_force(y, 80000, 80400, 100)
+    assert view["level"] == -1
+    np.testing.assert_allclose(view["min"], lo, atol=1e-5)
+    np.testing.assert_allclose(view["max"], hi, atol=1e-5)
@@ -0,0 +1,76 @@
+"""
+Test cho engine pitch (src/pitch.py)
+"""
+
+import numpy as np
+import pytest
+
+from src import pitch
+
+SR = 22050
+
+
+def _tone(freq, seconds=3.0, silence=(1.0, 1.5)):
+    t = np.arange(int(seconds * SR)) / SR
+    y = sum(0.3 / k * np.sin(2 * np.pi * k * freq * t) for k in range(1, 5))
+    y[int(silence[0] * SR):int(silence[1] * SR)] = 0
+    return y.astype(np.float32)
+
+
+@pytest.mark.parametrize("freq", [55.0, 220.0, 1000.0])
+def test_yin_fft_tracks_steady_tone(freq):
+    f0, prob = pitch.track(_tone(freq), SR, algorithm="yin", workers=1)
+    assert len(f0) == 1 + int(3.0 * SR) // pitch.HOP_LENGTH
+    times = np.arange(len(f0)) * pitch.HOP_LENGTH / SR
+    steady = (times > 0.2) & (times < 0.8)
+    cents = 1200 * np.abs(np.log2(f0[steady] / freq))
+    assert np.all(cents < 5)
+    assert np.all(prob[steady] > 0.9)
+    # Đoạn lặng (trừ nửa frame ở biên) không có pitch
+    silent = (times > 1.1) & (times < 1.4)
+    assert np.all(np.isnan(f0[silent]))
+
+
+def test_chunking_matches_single_pass_for_yin():
+    y = _tone(330.0, seconds=6.0)
+    whole, _ = pitch.track(y, SR, algorithm="yin", workers=1)
+    chunked, _ = pitch.track(y, SR, algorithm="yin", workers=3, chunk_seconds=0.5)
+    np.testing.assert_array_equal(whole, chunked)
+
+
+def test_pyin_chunks_with_overlap():
+    y = _tone(220.0, seconds=3.0)
+    f0, _ = pitch.track(y, SR, algorithm="pyin", fmin=110, fmax=440, workers=2, chunk_seconds=1.0,
+                        overlap_seconds=0.5)
+    times = np.arange(len(f0)) * pitch.HOP_LENGTH / SR
+    steady = ((times > 0.2) & (times < 0.8)) | ((times > 1.7) & (times < 2.8))
+    assert np.nanmax(np.abs(1200 * np.log2(f0[steady] / 220.0))) < 20
+
+
+def test_pool_worker_uses_its_share_of_cores(monkeypatch):
+    from src import executor
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("pool created inside a worker with a one-thread share")
+
+    # Pool có số worker = số core: mỗi worker chạy pitch tuần tự
+    monkeypatch.setattr(executor, "IN_WORKER", True)
+    monkeypatch.setattr(executor, "WORKER_THREADS", 1)
+    monkeypatch.setattr(pitch, "ThreadPoolExecutor", no_pool)
+    y = _tone(330.0, seconds=6.0)
+    f0, _ = pitch.track(y, SR, algorithm="yin", chunk_seconds=0.5)
+    assert len(f0) == 1 + len(y) // pitch.HOP_LENGTH
+
+def test_summarize_decimates_and_keeps_gaps():
+    f0 = np.array([100.0, 102.0, np.nan, np.nan, 200.0, np.nan, 300.0])
+    result = pitch.summarize(f0, SR, 512, "yin", max_points=4)
+    assert result["decimation"] == 2
+    assert result["f0"] == [101.0, None, 200.0, 300.0]
+    assert result["frame_period"] == 2 * 512 / SR
+    assert result["voiced_ratio"] == 4 / 7
+
+    full = pitch.summarize(f0, SR, 512, "yin")
+    assert full["decimation"] == 1 and len(full["f0"]) == len(f0)
+
+    with pytest.raises(ValueError):
+        pitch.track(np.zeros(1000, np.float32), SR, algorithm="crepe")
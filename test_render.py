@@ -0,0 +1,47 @@
+"""
+Test cho renderer PNG không dùng pyplot (src/render.py)
+"""
+
+import matplotlib.image as mpimg
+import numpy as np
+from matplotlib import colormaps
+
+from src import render
+
+
+def test_encode_png_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, size=(7, 13, 4), dtype=np.uint8)
+    render.write_png(tmp_path / "x.png", rgba)
+
+    decoded = mpimg.imread(tmp_path / "x.png")
+    np.testing.assert_array_equal(np.rint(decoded * 255).astype(np.uint8), rgba)
+
+
+def test_colormap_lut_matches_matplotlib():
+    data = np.linspace(-80, 0, 256).reshape(16, 16)
+    image = render.apply_colormap(data, "magma", -80, 0)
+    expected = colormaps["magma"]((data + 80) / 80, bytes=True)
+    assert image.shape == (16, 16, 4)
+    assert np.max(np.abs(image.astype(int) - expected.astype(int))) <= 1
+
+
+def test_log_rows_are_monotonic_and_cover_range():
+    rows = render.log_frequency_rows(1025, 44100, 300)
+    # Tâm hàng pixel trên cùng nằm ngay dưới Nyquist (thang log)
+    assert rows[0] == 0 and rows[-1] >= 1000
+    assert np.all(np.diff(rows) >= 0)
+
+
+def test_render_spectrogram_and_waveform(tmp_path):
+    sr = 22050
+    y = np.sin(2 * np.pi * 440 * np.arange(sr) / sr).astype(np.float32)
+    D = np.random.default_rng(1).uniform(-80, 0, size=(1025, 44))
+
+    render.render_spectrogram(D, sr, 512, tmp_path / "spec.png")
+    render.render_waveform(y, sr, tmp_path / "wave.png")
+
+    assert mpimg.imread(tmp_path / "spec.png").shape == (400, 1000, 4)
+    assert mpimg.imread(tmp_path / "wave.png").shape == (300, 1000, 4)
+    lo, hi = render.minmax_envelope(y, 100)
+    assert len(lo) == 100 and np.all(lo <= hi) and hi.max() > 0.99
@@ -0,0 +1,89 @@
+"""
+Test cho cache kết quả phân tích (src/result_cache.py)
+"""
+
+from src import result_cache
+from src.result_cache import ResultCache
+
+
+def _audio(tmp_path, name="a.wav", content=b"fake audio"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return path
+
+
+def test_hit_after_first_call_and_params_in_key(tmp_path):
+    cache = ResultCache(tmp_path / "r.sqlite3")
+    audio = _audio(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.cached(audio, "analyze_cutoff", {}, compute) == ({"value": 1}, False)
+    assert cache.cached(audio, "analyze_cutoff", {}, compute) == ({"value": 1}, True)
+    # Tham số khác, hoặc cùng nội dung dưới tên file khác
+    assert cache.cached(audio, "analyze_cutoff", {"x": 1}, compute)[1] is False
+    copy = _audio(tmp_path, "b.wav")
+    assert cache.cached(copy, "analyze_cutoff", {}, compute) == ({"value": 1}, True)
+    assert len(calls) == 2
+
+
+def test_algorithm_version_invalidates(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "r.sqlite3")
+    audio = _audio(tmp_path)
+    cache.cached(audio, "pitch_tracking", {}, lambda: [1, 2, 3])
+
+    monkeypatch.setitem(result_cache.ALGORITHM_VERSIONS, "pitch_tracking", 99)
+    value, hit = cache.cached(audio, "pitch_tracking", {}, lambda: [4])
+    assert (value, hit) == ([4], False)
+
+
+def test_missing_artifact_is_a_miss_and_eviction_removes_artifacts(tmp_path):
+    cache = ResultCache(tmp_path / "r.sqlite3", max_bytes=3000)
+    audio = _audio(tmp_path)
+    plot = tmp_path / "plot.png"
+
+    def make_plot():
+        plot.write_bytes(b"x" * 2000)
+        return plot.name
+
+    cache.cached(audio, "generate_autocorrelation_plot", {}, make_plot, artifacts=lambda v: [tmp_path / v])
+    plot.unlink()
+    assert cache.cached(audio, "generate_autocorrelation_plot", {}, make_plot,
+                        artifacts=lambda v: [tmp_path / v])[1] is False
+
+    # Entry thứ hai làm vượt ngân sách -> entry cũ nhất bị xoá cùng file PNG
+    other = _audio(tmp_path, "c.wav", b"other audio")
+    cache.cached(other, "analyze_formants", {}, lambda: ["y" * 2000])
+    assert not plot.exists()
+    assert cache.size_bytes() <= 3000
+
+
+def test_plot_artifacts_of_different_entries_do_not_collide(tmp_path):
+    import numpy as np
+    import soundfile as sf
+    from src.voice_processing import InstrumentVoiceProcessor
+
+    sr = 22050
+    audio = tmp_path / "tone.wav"
+    sf.write(audio, 0.5 * np.sin(2 * np.pi * 330 * np.arange(sr * 2) / sr), sr)
+    cache = ResultCache(tmp_path / "r.sqlite3", max_bytes=1 << 30)
+    processor = InstrumentVoiceProcessor()
+    artifacts = lambda v: [tmp_path / v]
+
+    def plot(*args, **kwargs):
+        # Cùng trạng thái RNG toàn cục: tên file không được phụ thuộc vào np.random
+        np.random.seed(0)
+        return processor.generate_autocorrelation_plot(*args, **kwargs)
+
+    whole, _ = cache.cached(audio, "generate_autocorrelation_plot", {}, lambda: plot(audio, tmp_path),
+                            artifacts=artifacts)
+    region, _ = cache.cached(audio, "generate_autocorrelation_plot", {"start": 0.5},
+                             lambda: plot(audio, tmp_path, start=0.5), artifacts=artifacts)
+    # Mỗi entry có file PNG riêng: xoá entry này không làm mất ảnh của entry kia
+    assert whole != region
+    (tmp_path / whole).unlink()
+    assert cache.cached(audio, "generate_autocorrelation_plot", {"start": 0.5}, lambda: None,
+                        artifacts=artifacts) == (region, True)
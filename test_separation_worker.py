@@ -0,0 +1,48 @@
+"""
+Test cho Demucs worker thường trú (src/separation_worker.py)
+Các test cần demucs sẽ bị skip nếu chưa cài.
+"""
+
+import importlib.util
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.separation_worker import SeparationWorker
+
+HAS_DEMUCS = importlib.util.find_spec("demucs") is not None
+
+
+@pytest.mark.skipif(HAS_DEMUCS, reason="chỉ kiểm tra đường lỗi khi chưa cài demucs")
+def test_startup_failure_is_reported_and_not_retried():
+    worker = SeparationWorker()
+    try:
+        with pytest.raises(RuntimeError, match="failed to start"):
+            worker.warm_up()
+        # Trong thời gian cooldown không spawn lại process
+        with pytest.raises(RuntimeError, match="failed to start"):
+            worker.separate("missing.wav", "unused", "job-1", timeout=5)
+        assert not worker.is_alive()
+    finally:
+        worker.close()
+
+
+@pytest.mark.skipif(not HAS_DEMUCS, reason="demucs chưa được cài")
+def test_jobs_write_to_their_own_directories(tmp_path):
+    sr = 44100
+    t = np.arange(sr * 3) / sr
+    audio = tmp_path / "tone.wav"
+    sf.write(audio, np.stack([np.sin(2 * np.pi * 110 * t)] * 2, axis=1) * 0.3, sr)
+
+    worker = SeparationWorker()
+    try:
+        first = worker.submit(audio, tmp_path / "a", "a")
+        second = worker.submit(audio, tmp_path / "b", "b")
+        stems_a, stems_b = first.result(), second.result()
+    finally:
+        worker.close()
+
+    assert set(stems_a) == set(stems_b)
+    assert all(str(tmp_path / "a") in p for p in stems_a.values())
+    assert all(str(tmp_path / "b") in p for p in stems_b.values())
@@ -0,0 +1,83 @@
+"""
+Test cho tile server spectrogram (src/spectrogram_tiles.py)
+"""
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from src.spectrogram_tiles import TILE_SIZE, SpectrogramTiles, TileCache, build_tiles
+
+
+def _make(tmp_path, seconds=20, sr=8000):
+    rng = np.random.default_rng(0)
+    t = np.arange(sr * seconds) / sr
+    y = (0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+    audio = tmp_path / "tone.wav"
+    sf.write(audio, y, sr, subtype='FLOAT')
+    # batch nhỏ để đi qua nhiều lô frame
+    out = build_tiles(audio, tmp_path / "tiles", n_fft=512, hop_length=128, batch_frames=100)
+    return y, sr, SpectrogramTiles(out)
+
+
+def test_level0_matches_librosa_stft(tmp_path):
+    y, sr, tiles = _make(tmp_path)
+    ref = librosa.amplitude_to_db(np.abs(librosa.stft(y, n_fft=512, hop_length=128, pad_mode='constant')),
+                                  ref=1.0, amin=1e-5, top_db=None)
+    level0 = np.asarray(tiles.levels[0], dtype=np.float32)
+    assert level0.shape == ref.T.shape
+    # float16 ~ 3 chữ số có nghĩa
+    np.testing.assert_allclose(level0, ref.T, atol=0.1)
+
+
+def test_levels_max_pool_time(tmp_path):
+    _, _, tiles = _make(tmp_path)
+    frames = tiles.meta["frames_per_level"]
+    assert frames[-1] <= TILE_SIZE < frames[-2]
+    a, b = np.asarray(tiles.levels[0], np.float32), np.asarray(tiles.levels[1], np.float32)
+    np.testing.assert_array_equal(b[:len(a) // 2], np.maximum(a[0:len(a) // 2 * 2:2], a[1:len(a) // 2 * 2:2]))
+
+
+def test_tiles_shape_padding_and_png(tmp_path):
+    _, _, tiles = _make(tmp_path)
+    info = tiles.describe()
+    zoom = len(info["zooms"]) - 1
+    # Tile cuối theo thời gian + tần số bị pad NaN
+    last_x = info["zooms"][zoom]["time_tiles"] - 1
+    tile = tiles.tile_data(zoom, last_x, info["freq_tiles"] - 1)
+    assert tile.shape == (TILE_SIZE, TILE_SIZE)
+    assert np.isnan(tile).any() and not np.isnan(tile[0, 0])
+
+    # Bin 440 Hz (n_fft 512, sr 8000 -> bin ~28) nổi bật trong tile tần số đầu
+    tile = tiles.tile_data(zoom, 0, 0)
+    assert abs(int(np.nanargmax(np.nanmean(tile, axis=1))) - 28) <= 1
+
+    png = tiles.tile_png(zoom, 0, 0)
+    assert png.startswith(b"\x89PNG")
+    assert len(tiles.tile_raw(0, 0, 0)) == TILE_SIZE * TILE_SIZE * 4
+
+
+def test_tile_cache_evicts_by_bytes():
+    cache = TileCache(max_bytes=250)
+    for i in range(4):
+        cache.put(i, b"x" * 100)
+    assert cache.get(0) is None and cache.get(1) is None
+    assert cache.get(3) == b"x" * 100
+
+
+def test_evict_tilesets_keeps_budget_and_recent(tmp_path):
+    import os
+    from src.spectrogram_tiles import evict_tilesets
+
+    root = tmp_path / "tiles"
+    for i, name in enumerate(("old", "mid", "new")):
+        d = root / name
+        d.mkdir(parents=True)
+        (d / "level_0.npy").write_bytes(b"\0" * 1000)
+        (d / "meta.json").write_text("{}")
+        os.utime(d / "meta.json", (1000 + i, 1000 + i))
+    (root / ".building").mkdir()
+
+    evict_tilesets(root, max_bytes=2100, keep=root / "old")
+
+    assert sorted(p.name for p in root.iterdir()) == [".building", "new", "old"]
@@ -0,0 +1,62 @@
+"""
+Test cho kho stem (src/stem_store.py) và việc dùng lại stem khi tách lại cùng file
+"""
+
+import numpy as np
+import soundfile as sf
+
+from src import isolator
+from src.stem_store import StemStore, make_key
+
+SR = 22050
+
+
+def _wav(path, seconds=1.0, seed=0):
+    y = 0.3 * np.random.default_rng(seed).standard_normal((int(SR * seconds), 2))
+    sf.write(path, y, SR, subtype='PCM_16')
+    return sf.read(path, dtype='int16')[0]
+
+
+def test_put_moves_files_and_lookup_hits(tmp_path):
+    store = StemStore(tmp_path / "stems", "/uploads/stems")
+    key = make_key("abc", "dsp", None, {"version": 1})
+    assert store.lookup(key) is None
+
+    staging = store.staging_dir()
+    _wav(staging / "drums.wav")
+    urls = store.put(key, {"Drums": staging / "drums.wav"}, {"separator": "dsp"})
+    assert urls == {"Drums": f"/uploads/stems/{key}/drums.wav"}
+    # Dời chứ không copy
+    assert not (staging / "drums.wav").exists()
+    assert store.lookup(key) == urls
+    assert make_key("abc", "dsp", None, {"version": 2}) != key
+
+    # Entry thiếu file -> miss
+    (tmp_path / "stems" / key / "drums.wav").unlink()
+    assert store.lookup(key) is None
+
+
+def test_flac_is_lossless(tmp_path):
+    store = StemStore(tmp_path / "stems", "/uploads/stems", fmt="flac")
+    staging = store.staging_dir()
+    original = _wav(staging / "bass.wav")
+    urls = store.put("k", {"Bass": staging / "bass.wav"})
+    assert urls["Bass"].endswith("/k/bass.flac")
+    stored, sr = sf.read(tmp_path / "stems" / "k" / "bass.flac", dtype='int16')
+    assert sr == SR
+    np.testing.assert_array_equal(stored, original)
+
+
+def test_second_isolation_is_served_from_store(tmp_path, monkeypatch):
+    _wav(tmp_path / "song.wav", seconds=3.0)
+    calls = []
+    separate = isolator.separate_dsp_chunked
+    monkeypatch.setattr(isolator, "separate_dsp_chunked", lambda *a, **k: calls.append(1) or separate(*a, **k))
+    monkeypatch.setattr(isolator.importlib.util, "find_spec", lambda name: None)
+
+    first = isolator.isolate_rock_instruments(tmp_path / "song.wav", tmp_path)
+    second = isolator.isolate_rock_instruments(tmp_path / "song.wav", tmp_path)
+    assert first == second and len(calls) == 1
+    assert set(first) == set(isolator.DSP_STEM_LABELS)
+    # Không để lại thư mục staging
+    assert [p.name for p in (tmp_path / "stems").iterdir()] == [first["Drums"].split("/")[3]]
@@ -69,11 +69,11 @@ def test_voice_processing():
     print("TEST 4: Pitch Tracking")
     print("-" * 60)
     try:
-        pitch_data = processor.pitch_tracking(test_file)
-        print(f"✓ Tracked {len(pitch_data)} pitch points")
-        if len(pitch_data) > 0:
-            print(f"  First pitch: {pitch_data[0]['frequency']:.2f} Hz ({pitch_data[0]['note']})")
-            print(f"  Time: {pitch_data[0]['time']:.3f}s")
+        pitch_data = processor.pitch_tracking(test_file, algorithm="yin")
+        print(f"✓ Tracked {pitch_data['n_frames']} frames ({pitch_data['voiced_ratio']:.0%} voiced)")
+        if pitch_data['f0_median']:
+            print(f"  Median pitch: {pitch_data['f0_median']:.2f} Hz ({pitch_data['median_note']})")
+            print(f"  Frame period: {pitch_data['frame_period']:.3f}s")
     except Exception as e:
         print(f"✗ Error: {e}")
     